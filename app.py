@@ -1,34 +1,435 @@
+"""
+Command line entry point for the E*TRADE asset CLI.
+Each subcommand imports the modules it needs only when it runs, so `--help`
+and token maintenance never load Flask, NumPy or the strategies. Commands that
+query the API are handed to a warm daemon (`app.py daemon start`) when one is
+running, which keeps its sessions and response cache between invocations.
+The original flags (`--spy-strat`, `--strategy-ui`, ...) still work.
+"""
+
 import argparse
-from client import Client
-from spy_strategy import SpyStrategy
-from strategy_ui import StrategyWebUI
-
-parser = argparse.ArgumentParser(description="E*TRADE API Client")
-parser.add_argument('--new-token', action='store_true', help="Get new OAuth tokens")
-parser.add_argument('--refresh-token', action='store_true', help="Refresh the OAuth token")
-parser.add_argument('--spy-strat', action='store_true', help="Run SPY options strategy analysis")
-parser.add_argument('--strategy-ui', action='store_true', help="Launch SPY strategy web UI with auto-refresh")
-args = parser.parse_args()
-
-
-if args.new_token:
-    client = Client(skip_tokens=True)
-    client.get_tokens()
-    print("OAuth token retrieved successfully.")
-else:
-    client = Client()
+import contextlib
+import io
+import os
+import sys
+import time
+import traceback
+
+# Commands a running daemon can serve; the rest need the terminal or run once per process
+DAEMON_COMMANDS = ('spy', 'chain', 'scan', 'basket', 'quotes', 'portfolio')
+# daemon.STATE_FILE, checked here so runs without a daemon never import it
+DAEMON_STATE_FILE = '.etrade-daemon.json'
+# The original single-level flags, in the order they took precedence
+LEGACY_FLAGS = ('--new-token', '--replay', '--refresh-token', '--spy-strat', '--strategy-ui', '--basket',
+                '--full-chain', '--scan-expiries', '--portfolio', '--quotes')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Build the subcommand parser
+    """
+    parser = argparse.ArgumentParser(description="E*TRADE API Client")
+    parser.add_argument('--record', metavar='DIR', help="Record raw quote and option chain responses to DIR")
+    parser.add_argument('--no-daemon', action='store_true', help="Run in this process even if a daemon is running")
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
+
+    token = commands.add_parser('token', help="Get new OAuth tokens or refresh the current ones")
+    token.add_argument('action', choices=('new', 'refresh'))
+
+    spy = commands.add_parser('spy', help="Run SPY options strategy analysis")
+    spy.add_argument('--alerts', metavar='RULES', help="Evaluate the alert rules in the JSON file RULES on the result")
+
+    ui = commands.add_parser('ui', help="Launch the strategy web UI with auto-refresh")
+    ui.add_argument('--basket', metavar='SYMBOLS', help="Show one dashboard for a comma-separated list of underliers")
+    ui.add_argument('--history-dir', default='history', help="Directory where the web UI records tick history")
+    ui.add_argument('--orders', action='store_true', help="Add a live panel of open orders, fills and cancels")
+    ui.add_argument('--alerts', metavar='RULES', help="Evaluate the alert rules in the JSON file RULES on every tick")
+    ui.add_argument('--workers', type=int, metavar='N',
+                    help="Serve from N worker processes reading this process's shared snapshots "
+                         "(0 only publishes them, for `gunicorn 'wsgi:create_app()'`)")
+
+    chain = commands.add_parser('chain', help="Analyze SPY straddles for N strikes on each side of the money")
+    chain.add_argument('strikes', type=int, metavar='N')
+
+    scan = commands.add_parser('scan', help="Scan the ATM straddle across every expiry")
+    scan.add_argument('symbol', nargs='?', default='SPY')
+
+    basket = commands.add_parser('basket', help="Run the straddle strategy for a comma-separated list of underliers")
+    basket.add_argument('symbols', metavar='SYMBOLS')
+
+    portfolio = commands.add_parser('portfolio', help="Report net Greeks, P&L and buying power across every account")
+    portfolio.add_argument('--watch', type=float, metavar='SECONDS',
+                           help="Keep refreshing every SECONDS, repricing only moved underliers")
+
+    orders = commands.add_parser('orders', help="Tail fills, cancels and new orders across every account")
+    orders.add_argument('--interval', type=float, default=5.0, metavar='SECONDS', help="Seconds between polls")
+
+    snapshot = commands.add_parser('snapshot', help="Archive the full chain of every expiry of each underlier every round")
+    snapshot.add_argument('symbols', metavar='SYMBOLS')
+    snapshot.add_argument('--dir', default='archive', help="Root directory of the archive")
+    snapshot.add_argument('--interval', type=float, default=60.0, metavar='SECONDS', help="Seconds between rounds")
+    snapshot.add_argument('--rate', type=float, default=4.0, help="Requests per second the snapshotter may send")
+    snapshot.add_argument('--workers', type=int, metavar='N', help="Parsing processes (one per core by default)")
+    snapshot.add_argument('--rounds', type=int, metavar='N', help="Stop after N rounds")
+
+    quotes = commands.add_parser('quotes', help="Print quotes for a comma-separated list of symbols")
+    quotes.add_argument('symbols', metavar='SYMBOLS')
+
+    replay = commands.add_parser('replay', help="Backtest the SPY strategy over responses recorded in DIR")
+    replay.add_argument('directory', metavar='DIR')
+    replay.add_argument('--speed', type=float, default=0.0, help="Replay N times faster than real time (0 = full speed)")
+
+    daemon = commands.add_parser('daemon', help="Manage the warm background process that serves repeated commands")
+    daemon.add_argument('action', choices=('start', 'stop', 'status', 'run'))
+    return parser
+
+
+def translate_legacy_args(argv: list) -> list:
+    """
+    Rewrite the original flag-style arguments (e.g. --spy-strat) as the equivalent subcommand
+    """
+    if not any(arg.split('=', 1)[0] in LEGACY_FLAGS for arg in argv):
+        return argv
+
+    legacy = argparse.ArgumentParser(add_help=False)
+    legacy.add_argument('--new-token', action='store_true')
+    legacy.add_argument('--refresh-token', action='store_true')
+    legacy.add_argument('--spy-strat', action='store_true')
+    legacy.add_argument('--strategy-ui', action='store_true')
+    legacy.add_argument('--history-dir', default='history')
+    legacy.add_argument('--full-chain', type=int)
+    legacy.add_argument('--scan-expiries', nargs='?', const='SPY')
+    legacy.add_argument('--basket')
+    legacy.add_argument('--portfolio', action='store_true')
+    legacy.add_argument('--watch')
+    legacy.add_argument('--quotes')
+    legacy.add_argument('--record')
+    legacy.add_argument('--replay')
+    legacy.add_argument('--replay-speed', default='0')
+    legacy.add_argument('--no-daemon', action='store_true')
+    args = legacy.parse_args(argv)
+
+    prefix = (['--record', args.record] if args.record else []) + (['--no-daemon'] if args.no_daemon else [])
+    if args.new_token:
+        return ['token', 'new']
+    if args.replay:
+        return ['replay', args.replay, '--speed', args.replay_speed]
     if args.refresh_token:
-        client.renew_tokens()
+        return prefix + ['token', 'refresh']
+    if args.spy_strat:
+        return prefix + ['spy']
+    if args.strategy_ui:
+        return prefix + ['ui', '--history-dir', args.history_dir] + (['--basket', args.basket] if args.basket else [])
+    if args.basket:
+        return prefix + ['basket', args.basket]
+    if args.full_chain:
+        return prefix + ['chain', str(args.full_chain)]
+    if args.scan_expiries:
+        return prefix + ['scan', args.scan_expiries]
+    if args.portfolio:
+        return prefix + ['portfolio'] + (['--watch', args.watch] if args.watch else [])
+    return prefix + ['quotes', args.quotes]
+
+
+class CommandContext:
+    """
+    What a command runs against: the API client and any long-lived objects built on it.
+    A one-shot CLI process gets a fresh context; the daemon keeps one across commands
+    and rebuilds the client when .env changes (e.g. after `token refresh`).
+    """
+
+    def __init__(self, record_dir=None, persistent=False):
+        self.record_dir = record_dir
+        self.persistent = persistent
+        self._client = None
+        self._env_stamp = None
+        self._objects = {}
+
+    @staticmethod
+    def _stamp():
+        try:
+            return os.stat('.env').st_mtime_ns
+        except OSError:
+            return None
+
+    @property
+    def client(self):
+        stamp = self._stamp()
+        if self._client is None or (self.persistent and stamp != self._env_stamp):
+            from client import Client
+            self.close()
+            if self._client is not None:
+                self._client.tokens.stop()
+            self._client = Client()
+            self._env_stamp = stamp
+            if self.persistent:
+                # The daemon keeps its tokens active between commands
+                self._client.tokens.start()
+            if self.record_dir:
+                from replay import RecordingClient
+                self._client = RecordingClient(self._client, self.record_dir)
+        return self._client
+
+    def get(self, key, factory):
+        """
+        Get the object built for key, building it with factory(client) on first use
+        """
+        client = self.client
+        if key not in self._objects:
+            self._objects[key] = factory(client)
+        return self._objects[key]
+
+    def close(self):
+        """
+        Stop the worker threads of every object that has them
+        """
+        for value in self._objects.values():
+            if hasattr(value, 'close'):
+                value.close()
+            elif hasattr(value, 'shutdown'):
+                value.shutdown()
+        self._objects.clear()
+
+
+def run_token(args, context):
+    from client import Client
+    if args.action == 'new':
+        client = Client(skip_tokens=True)
+        client.get_tokens()
+        print("OAuth token retrieved successfully.")
+    else:
+        context.client.renew_tokens()
         print("OAuth token refreshed successfully.")
-    elif args.spy_strat:
-        spy_strategy = SpyStrategy(client)
-        spy_strategy.run_strategy()
-    elif args.strategy_ui:
-        print("Launching SPY Strategy Web UI...")
-        print("Data will refresh every 10 seconds")
-        print("Opening browser to http://localhost:5000/")
-        spy_strategy = SpyStrategy(client)
-        web_ui = StrategyWebUI(spy_strategy)
-        web_ui.start()
+
+
+def run_spy(args, context):
+    from spy_strategy import SpyStrategy
+    data = context.get('spy', SpyStrategy).run_strategy()
+    if args.alerts:
+        from alert_rules import load_engine
+        alert_engine = load_engine(args.alerts)
+        alert_engine.evaluate(data)
+        alert_engine.close()
+
+
+def run_ui(args, context):
+    from history_store import HistoryStore
+    from strategy_ui import StrategyWebUI
+    print("Launching SPY Strategy Web UI...")
+    print("Data refreshes every 10 seconds while the market is open, faster near the close")
+    print("Opening browser to http://localhost:5000/")
+    if args.basket:
+        from multi_underlier import MultiUnderlierRunner
+        strategy = MultiUnderlierRunner(context.client, args.basket.split(','))
     else:
+        from spy_strategy import SpyStrategy
+        strategy = SpyStrategy(context.client)
+    order_monitor = None
+    if args.orders:
+        from order_monitor import OrderMonitor
+        order_monitor = OrderMonitor(context.client)
+    alert_engine = None
+    if args.alerts:
+        from alert_rules import load_engine
+        alert_engine = load_engine(args.alerts)
+    web_ui = StrategyWebUI(strategy, history_store=HistoryStore(args.history_dir), order_monitor=order_monitor,
+                           alert_engine=alert_engine)
+    try:
+        if args.workers is None:
+            web_ui.start()
+        else:
+            web_ui.serve(workers=args.workers)
+    finally:
+        if order_monitor is not None:
+            order_monitor.close()
+        if alert_engine is not None:
+            alert_engine.close()
+
+
+def run_chain(args, context):
+    from chain_analytics import FullChainStrategy
+    context.get(('chain', args.strikes), lambda client: FullChainStrategy(client, strikes_per_side=args.strikes)).run_strategy()
+
+
+def run_scan(args, context):
+    from expiry_scanner import ExpiryScannerStrategy
+    context.get(('scan', args.symbol.upper()), lambda client: ExpiryScannerStrategy(client, symbol=args.symbol)).run_strategy()
+
+
+def run_basket(args, context):
+    from multi_underlier import MultiUnderlierRunner
+    symbols = args.symbols.split(',')
+    context.get(('basket', args.symbols.upper()), lambda client: MultiUnderlierRunner(client, symbols)).run_strategy()
+
+
+def run_portfolio(args, context):
+    from portfolio import PortfolioRiskAggregator
+    aggregator = context.get('portfolio', PortfolioRiskAggregator)
+    if args.watch:
+        context.client.tokens.start()
+    try:
+        aggregator.run_strategy()
+        while args.watch:
+            time.sleep(args.watch)
+            aggregator.run_strategy()
+    except KeyboardInterrupt:
+        pass
+
+
+def run_orders(args, context):
+    from order_monitor import OrderMonitor
+    order_monitor = OrderMonitor(context.client)
+    context.client.tokens.start()
+    try:
+        order_monitor.tail(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        order_monitor.close()
+
+
+def run_snapshot(args, context):
+    from snapshotter import ChainSnapshotter
+    snapshotter = ChainSnapshotter(context.client, args.symbols.split(','), base_dir=args.dir, rate=args.rate,
+                                   parse_workers=args.workers)
+    context.client.tokens.start()
+    try:
+        snapshotter.run(interval=args.interval, rounds=args.rounds)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        snapshotter.close()
+
+
+def run_quotes(args, context):
+    from quote_service import QuoteService
+    quote_service = context.get('quotes', QuoteService)
+    upstream_before = quote_service.upstream_requests
+    symbols = [symbol.strip() for symbol in args.symbols.split(',') if symbol.strip()]
+    quotes = quote_service.get_quotes(symbols)
+    print(f"{'Symbol':<8}{'Last':>12}{'Bid':>12}{'Ask':>12}{'Change %':>10}")
+    for symbol in symbols:
+        quote = quotes.get(symbol.upper())
+        if not quote:
+            print(f"{symbol.upper():<8}{'N/A':>12}")
+            continue
+        print(f"{quote['symbol']:<8}{quote['last_price'] or 'N/A':>12}{quote['bid'] or 'N/A':>12}"
+              f"{quote['ask'] or 'N/A':>12}{quote['change_percent'] or 'N/A':>10}")
+    print(f"Upstream quote requests: {quote_service.upstream_requests - upstream_before}")
+
+
+def run_replay(args, context):
+    from replay import Backtester, ReplayClient
+    backtester = Backtester(ReplayClient(args.directory, speed=args.speed))
+    snapshots = backtester.run()
+    for key, value in backtester.summary(snapshots).items():
+        print(f"{key}: {value}")
+
+
+def run_daemon(args, context):
+    import daemon
+    if args.action == 'run':
+        # Build the client up front so a missing token fails here rather than on the first command
+        context.persistent = True
+        context.client
+        daemon.DaemonServer(lambda argv: serve_command(argv, context)).serve()
+        return
+    if args.action == 'start':
+        try:
+            running = daemon.request({'command': 'status'}, timeout=5.0) is not None
+        except daemon.DaemonReplyError:
+            running = True  # busy with a command
+        if running:
+            print("Daemon is already running")
+            return
+        state = daemon.start_background([os.path.abspath(__file__), 'daemon', 'run'])
+        if state is None:
+            print(f"Daemon failed to start; see {daemon.LOG_FILE}")
+            return 1
+        print(f"Daemon started (pid {state['pid']})")
+        return
+    try:
+        reply = daemon.request({'command': args.action})
+    except daemon.DaemonReplyError as e:
+        print(e)
+        return 1
+    if reply is None:
+        print("Daemon is not running")
+        return 1
+    print(reply['output'], end='')
+
+
+COMMANDS = {
+    'token': run_token,
+    'spy': run_spy,
+    'ui': run_ui,
+    'chain': run_chain,
+    'scan': run_scan,
+    'basket': run_basket,
+    'portfolio': run_portfolio,
+    'orders': run_orders,
+    'snapshot': run_snapshot,
+    'quotes': run_quotes,
+    'replay': run_replay,
+    'daemon': run_daemon,
+}
+
+
+def serve_command(argv: list, context: CommandContext) -> dict:
+    """
+    Run one forwarded command inside the daemon, capturing what it prints
+    """
+    output = io.StringIO()
+    status = 0
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        try:
+            args = build_parser().parse_args(argv)
+            if args.command not in DAEMON_COMMANDS:
+                raise SystemExit(f"The daemon does not run '{args.command}' commands")
+            status = COMMANDS[args.command](args, context) or 0
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                print(e.code if isinstance(e.code, str) else '')
+                status = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            traceback.print_exc()
+            status = 1
+    return {'status': status, 'output': output.getvalue()}
+
+
+def _forwardable(args) -> bool:
+    return (args.command in DAEMON_COMMANDS and not args.no_daemon and not args.record
+            and not getattr(args, 'watch', None))
+
+
+def main(argv=None) -> int:
+    """
+    Parse the command line and run the command, through the daemon when one is running
+    """
+    argv = translate_legacy_args(list(sys.argv[1:] if argv is None else argv))
+    args = build_parser().parse_args(argv)
+    if args.command is None:
         print("No valid option provided. Use --help for more information.")
+        return 1
+
+    if _forwardable(args) and os.path.exists(DAEMON_STATE_FILE):
+        import daemon
+        try:
+            reply = daemon.request({'argv': argv})
+        except daemon.DaemonReplyError as e:
+            # The daemon has the command; running it here too would repeat its API calls
+            print(e)
+            return 1
+        if reply is not None:
+            sys.stdout.write(reply['output'])
+            return reply['status']
+
+    context = CommandContext(record_dir=args.record)
+    try:
+        return COMMANDS[args.command](args, context) or 0
+    finally:
+        context.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+This module implements an asyncio-native variant of the E*TRADE client.
+pyetrade is a blocking library, so every call runs on a bounded thread pool
+shared by all strategies awaiting it from the same event loop.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncClient:
+    """
+    An awaitable wrapper around Client
+    """
+
+    def __init__(self, client, max_workers: int = 8):
+        """
+        Initialize the async client
+
+        Args:
+            client: An instance of Client whose pooled sessions are reused
+            max_workers: Maximum number of API calls in flight at once
+        """
+        self.client = client
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='async-client')
+
+    async def _run(self, func, *args, **kwargs):
+        """
+        Run a blocking client method on the thread pool and await its result
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def get_account(self):
+        """
+        Get the accounts for the user
+        """
+        return await self._run(self.client.get_account)
+
+    async def get_account_balance(self, account_id_key):
+        """
+        Get the cash available for investment for the account
+        """
+        return await self._run(self.client.get_account_balance, account_id_key)
+
+    async def get_account_balance_details(self, account_id_key, account_type=None):
+        """
+        Get the full balance response for the account
+        """
+        return await self._run(self.client.get_account_balance_details, account_id_key, account_type)
+
+    async def get_positions(self, account_id_key, page_number=None):
+        """
+        Get one page of positions for the account
+        """
+        return await self._run(self.client.get_positions, account_id_key, page_number)
+
+    async def get_market_quote(self, symbols, resp_format='xml'):
+        """
+        Get the market quotes for the symbols
+        """
+        return await self._run(self.client.get_market_quote, symbols, resp_format=resp_format)
+
+    async def get_option_expire_dates(self, symbol):
+        """
+        List the option expiry dates for a symbol
+        """
+        return await self._run(self.client.get_option_expire_dates, symbol)
+
+    async def list_orders(self, account_id_key, marker=None, count=25, status=None, from_date=None, to_date=None):
+        """
+        List one page of orders for the account
+        """
+        return await self._run(self.client.list_orders, account_id_key, marker=marker, count=count,
+                               status=status, from_date=from_date, to_date=to_date)
+
+    async def get_option_chains(self, symbol, strike_price=None, expiry_date=None, no_of_strikes=1):
+        """
+        Get the option chains for a symbol
+        """
+        return await self._run(self.client.get_option_chains, symbol, strike_price=strike_price,
+                               expiry_date=expiry_date, no_of_strikes=no_of_strikes)
+
+    def close(self):
+        """
+        Stop the worker threads
+        """
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,180 @@
+"""
+This module benchmarks the quote -> chain -> straddle hot path against the local
+mock E*TRADE server and writes machine-readable results for regression checks.
+
+Usage:
+    python benchmark.py --ticks 200 --latency 0.02 --strikes 100
+    python benchmark.py --baseline benchmark_results.json --max-regression 0.2
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, Any, List
+
+from chain_analytics import FullChainStrategy
+from client import RATE_LIMITS, Client
+from mock_etrade import MockETradeServer
+from request_executor import RequestExecutor
+from spy_strategy import SpyStrategy
+from strategy_ui import StrategyWebUI
+
+# Requests per second allowed to each API group of the mock server
+MOCK_RATE_LIMIT = 10000.0
+# Ticks run under tracemalloc to measure allocations (kept short: tracing is slow)
+ALLOCATION_TICKS = 20
+
+
+def make_client(server: MockETradeServer, cache: bool) -> Client:
+    """
+    Build a Client pointed at the mock server with dummy OAuth credentials
+    """
+    client = Client(skip_tokens=True)
+    client.consumer_key = 'benchmarkKey'
+    client.consumer_secret = 'benchmarkSecret'
+    client.oauth_token = 'benchmarkToken'
+    client.oauth_token_secret = 'benchmarkTokenSecret'
+    client.base_url = server.url
+    client.reset_sessions()
+    # The mock enforces no rate limits, so the budgets do not throttle it
+    client.executor = RequestExecutor(dict.fromkeys(RATE_LIMITS, MOCK_RATE_LIMIT))
+    if not cache:
+        client.cache.ttls = {}
+    return client
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """
+    Get a percentile of the samples using the nearest-rank method
+    """
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def measure(tick: Callable[[], Any], ticks: int, server: MockETradeServer) -> Dict[str, Any]:
+    """
+    Time `ticks` calls of `tick` and measure upstream requests and allocations
+    """
+    latencies = []
+    requests_before = server.total_requests()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(ticks):
+            tick_started = time.perf_counter()
+            tick()
+            latencies.append(time.perf_counter() - tick_started)
+    elapsed = time.perf_counter() - started
+    requests = server.total_requests() - requests_before
+
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(ALLOCATION_TICKS):
+            tick()
+    _, peak = tracemalloc.get_traced_memory()
+    allocated_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+
+    return {
+        'ticks': ticks,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'ticks_per_second': round(ticks / elapsed, 2),
+        'requests_per_tick': round(requests / ticks, 3),
+        'alloc_peak_kib': round(peak / 1024, 1),
+        'live_blocks_after_ticks': allocated_blocks,
+    }
+
+
+def run_benchmarks(args) -> Dict[str, Any]:
+    """
+    Run every benchmark scenario against a fresh mock server
+    """
+    server = MockETradeServer(latency=args.latency, max_strikes=args.strikes, seed=1).start()
+    results = {}
+    try:
+        client = make_client(server, args.cache)
+
+        strategy = SpyStrategy(client)
+        results['strategy_sync'] = measure(strategy.run_strategy, args.ticks, server)
+
+        async_strategy = SpyStrategy(client)
+        loop = asyncio.new_event_loop()
+        results['strategy_async'] = measure(lambda: loop.run_until_complete(async_strategy.run_strategy_async()),
+                                            args.ticks, server)
+        loop.close()
+
+        full_chain = FullChainStrategy(client, strikes_per_side=args.strikes // 2)
+        results['full_chain'] = measure(full_chain.run_strategy, args.ticks, server)
+
+        web_strategy = SpyStrategy(client)
+        web_ui = StrategyWebUI(web_strategy)
+        with contextlib.redirect_stdout(io.StringIO()):
+            web_ui.broadcaster.publish(web_ui._format_data_for_json(web_strategy.run_strategy()))
+        web_client = web_ui.app.test_client()
+        results['web_strategy_data'] = measure(lambda: web_client.get('/api/strategy-data'), args.ticks * 5, server)
+
+        results['connection_stats'] = client.connection_stats()
+    finally:
+        server.stop()
+    return results
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """
+    List the scenarios whose p50 latency regressed by more than max_regression
+    """
+    regressions = []
+    for scenario, current in results.items():
+        previous = baseline.get('results', {}).get(scenario)
+        if not previous or 'p50_ms' not in current or not previous.get('p50_ms'):
+            continue
+        change = (current['p50_ms'] - previous['p50_ms']) / previous['p50_ms']
+        if change > max_regression:
+            regressions.append(f"{scenario}: p50 {previous['p50_ms']}ms -> {current['p50_ms']}ms (+{change:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the strategy hot path against a mock E*TRADE server")
+    parser.add_argument('--ticks', type=int, default=100, help="Strategy ticks per scenario")
+    parser.add_argument('--latency', type=float, default=0.0, help="Mock server latency per request in seconds")
+    parser.add_argument('--strikes', type=int, default=100, help="Strikes per chain in the full-chain scenario")
+    parser.add_argument('--cache', action='store_true', help="Keep the client response cache enabled")
+    parser.add_argument('--output', default='benchmark_results.json', help="Where to write the JSON results")
+    parser.add_argument('--baseline', help="Earlier results file to compare against")
+    parser.add_argument('--max-regression', type=float, default=0.2, help="Allowed p50 slowdown vs. the baseline")
+    args = parser.parse_args()
+
+    report = {
+        'timestamp': int(time.time()),
+        'python': platform.python_version(),
+        'config': {'ticks': args.ticks, 'latency': args.latency, 'strikes': args.strikes, 'cache': args.cache},
+        'results': run_benchmarks(args),
+    }
+    with open(args.output, 'w', encoding='utf-8') as output_file:
+        json.dump(report, output_file, indent=2)
+
+    for scenario, result in report['results'].items():
+        print(f"{scenario}: {result}")
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as baseline_file:
+            regressions = compare(report['results'], json.load(baseline_file), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
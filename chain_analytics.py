@@ -0,0 +1,228 @@
+"""
+This module implements the full-chain analytics mode.
+The OptionPair list of an option chain response is loaded once into columnar
+NumPy arrays, then straddles, break-evens, mid/spread and put-call parity are
+computed for every strike in a single vectorized pass.
+"""
+
+import datetime
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+import pricing
+from spy_strategy import SpyStrategy
+
+# Per-side columns loaded from each Call/Put entry: column suffix -> API field
+OPTION_FIELDS = {
+    'bid': 'bid',
+    'ask': 'ask',
+    'last': 'lastPrice',
+    'volume': 'volume',
+    'open_interest': 'openInterest',
+}
+GREEK_FIELDS = ('delta', 'gamma', 'theta', 'vega', 'iv')
+
+
+def _column(values: List[Any]) -> np.ndarray:
+    """
+    Convert a list of API values to a float64 array; missing or non-numeric values become NaN
+    """
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        column = np.full(len(values), np.nan)
+        for i, value in enumerate(values):
+            try:
+                column[i] = float(value)
+            except (TypeError, ValueError):
+                pass
+        return column
+
+
+def get_option_pairs(option_chains_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Get the OptionPair list from an option chain response
+    """
+    option_pair = option_chains_data.get('OptionChainResponse', {}).get('OptionPair', [])
+    if not isinstance(option_pair, list):
+        option_pair = [option_pair]
+    return option_pair
+
+
+def selected_expiry(option_chains_data: Dict[str, Any]) -> Optional[datetime.date]:
+    """
+    Get the expiry date (SelectedED) of an option chain response
+    """
+    selected_date = option_chains_data.get('OptionChainResponse', {}).get('SelectedED', {})
+    try:
+        return datetime.date(int(selected_date['year']), int(selected_date['month']), int(selected_date['day']))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def load_chain_arrays(option_chains_data: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """
+    Load an option chain response into columnar arrays sorted by strike
+
+    Args:
+        option_chains_data: The option chains data from API
+
+    Returns:
+        Dict of float64 arrays: strike, call_<field>, put_<field> and call_/put_ Greeks
+    """
+    pairs = get_option_pairs(option_chains_data)
+    calls = [pair.get('Call') or {} for pair in pairs]
+    puts = [pair.get('Put') or {} for pair in pairs]
+
+    strikes = [call.get('strikePrice', put.get('strikePrice')) for call, put in zip(calls, puts)]
+    chain = {'strike': _column(strikes)}
+
+    for prefix, side in (('call', calls), ('put', puts)):
+        for name, field in OPTION_FIELDS.items():
+            chain[f"{prefix}_{name}"] = _column([option.get(field) for option in side])
+        greeks = [option.get('OptionGreeks') or {} for option in side]
+        for greek in GREEK_FIELDS:
+            chain[f"{prefix}_{greek}"] = _column([values.get(greek) for values in greeks])
+
+    order = np.argsort(chain['strike'], kind='stable')
+    return {name: column[order] for name, column in chain.items()}
+
+
+def compute_straddles(chain: Dict[str, np.ndarray], spot: float,
+                      rate: float = 0.0, years_to_expiry: float = 0.0) -> Dict[str, np.ndarray]:
+    """
+    Compute straddle metrics for every strike of a chain in one vectorized pass
+
+    Args:
+        chain: Columnar arrays from load_chain_arrays
+        spot: The current underlier price
+        rate: Continuously compounded risk-free rate used for put-call parity
+        years_to_expiry: Time to expiry in years used for put-call parity
+
+    Returns:
+        Dict of arrays aligned with chain['strike']
+    """
+    strike = chain['strike']
+    call_mid = (chain['call_bid'] + chain['call_ask']) / 2
+    put_mid = (chain['put_bid'] + chain['put_ask']) / 2
+
+    straddle_last = chain['call_last'] + chain['put_last']
+    straddle_bid = chain['call_bid'] + chain['put_bid']
+    straddle_ask = chain['call_ask'] + chain['put_ask']
+    straddle_mid = call_mid + put_mid
+    straddle_spread = straddle_ask - straddle_bid
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spread_percent = np.where(straddle_mid > 0, straddle_spread / straddle_mid * 100, np.nan)
+
+    # C - P = S - K * e^(-rT); the residual is the parity violation per strike
+    parity_residual = (call_mid - put_mid) - (spot - strike * np.exp(-rate * years_to_expiry))
+
+    return {
+        'strike': strike,
+        'call_mid': call_mid,
+        'put_mid': put_mid,
+        'straddle_last': straddle_last,
+        'straddle_bid': straddle_bid,
+        'straddle_ask': straddle_ask,
+        'straddle_mid': straddle_mid,
+        'straddle_spread': straddle_spread,
+        'spread_percent': spread_percent,
+        'break_even_lower': strike - straddle_last,
+        'break_even_upper': strike + straddle_last,
+        'parity_residual': parity_residual,
+    }
+
+
+def atm_index(chain: Dict[str, np.ndarray], spot: float) -> int:
+    """
+    Get the index of the strike closest to the spot price
+    """
+    return int(np.argmin(np.abs(chain['strike'] - spot)))
+
+
+class FullChainStrategy(SpyStrategy):
+    """
+    A SPY strategy that analyzes N strikes on each side of the money
+    """
+
+    def __init__(self, client, strikes_per_side: int = 10):
+        """
+        Initialize the full-chain strategy
+
+        Args:
+            client: An instance of Client
+            strikes_per_side: Number of strikes fetched above and below the money
+        """
+        super().__init__(client)
+        self.strikes_per_side = strikes_per_side
+        self.chain = None
+        self.straddles = None
+
+    def run_strategy(self):
+        """
+        Execute the full-chain strategy:
+        1. Get current SPY price
+        2. Fetch the chain with N strikes on each side
+        3. Compute straddle metrics for every strike
+        """
+        self._get_current_price()
+
+        if not self.spot_price:
+            print(f"Failed to get current price for {self.symbol}")
+            return None
+
+        try:
+            option_chains = self.client.get_option_chains(
+                symbol=self.symbol,
+                strike_price=self._nearest_strike(self.spot_price),
+                no_of_strikes=2 * self.strikes_per_side + 1
+            )
+        except Exception as e:
+            print(f"Error getting option chains: {e}")
+            return None
+
+        expiry_date = selected_expiry(option_chains)
+        self.chain = load_chain_arrays(option_chains)
+        if not len(self.chain['strike']):
+            print("No OptionPair found in response")
+            return None
+
+        years = pricing.years_to_expiry(expiry_date, self.clock()) if expiry_date else pricing.MIN_YEARS
+        # Local IV and Greeks for every contract the response left without them
+        self.chain = pricing.chain_greeks(self.chain, self.spot_price, years)
+        self.straddles = compute_straddles(self.chain, self.spot_price, years_to_expiry=years)
+        call_iv, put_iv = self.chain['call_iv'], self.chain['put_iv']
+        self.straddles['iv'] = np.where(np.isnan(call_iv), put_iv,
+                                        np.where(np.isnan(put_iv), call_iv, (call_iv + put_iv) / 2))
+        self.straddles['delta'] = self.chain['call_delta'] + self.chain['put_delta']
+        self.option_data = {
+            'expiry_date': expiry_date.strftime('%Y-%m-%d') if expiry_date else 'Unknown',
+            'days_to_expiry': (expiry_date - datetime.date.today()).days if expiry_date else None,
+            'atm_index': atm_index(self.chain, self.spot_price),
+            'straddles': self.straddles,
+        }
+        self._display_chain()
+        return self.option_data
+
+    def _display_chain(self):
+        """
+        Display the straddle metrics for every strike
+        """
+        straddles = self.straddles
+        atm = self.option_data['atm_index']
+
+        print("\n===== SPY FULL CHAIN STRADDLES =====")
+        print(f"Current SPY Price: ${self.spot_price}")
+        print(f"Expiry Date: {self.option_data['expiry_date']}")
+        print(f"{'Strike':>9}{'Last':>9}{'Bid':>9}{'Ask':>9}{'Spread%':>9}{'BE Low':>10}{'BE High':>10}{'Parity':>9}"
+              f"{'IV':>8}{'Delta':>8}")
+        for i in range(len(straddles['strike'])):
+            marker = ' <' if i == atm else ''
+            print(f"{straddles['strike'][i]:>9.2f}{straddles['straddle_last'][i]:>9.2f}"
+                  f"{straddles['straddle_bid'][i]:>9.2f}{straddles['straddle_ask'][i]:>9.2f}"
+                  f"{straddles['spread_percent'][i]:>9.2f}{straddles['break_even_lower'][i]:>10.2f}"
+                  f"{straddles['break_even_upper'][i]:>10.2f}{straddles['parity_residual'][i]:>9.3f}"
+                  f"{straddles['iv'][i]:>8.4f}{straddles['delta'][i]:>8.3f}{marker}")
+        print("====================================")
@@ -1,9 +1,184 @@
 """This Python script provides examples on using the E*TRADE API endpoints"""
 from __future__ import print_function
+import datetime
 import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
 import pyetrade
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 import webbrowser
+
+import metrics
+from request_executor import RequestExecutor, is_unavailable
+from token_manager import TokenExpiredError, TokenManager, update_env_file
+
+# Keep-alive pool sizing for the long-lived pyetrade sessions
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 8
+
+# Time-to-live, in seconds, of cached responses per endpoint (0 disables caching)
+CACHE_TTLS = {
+    'quote': 2,
+    'option_chains': 5,
+    'option_expire_dates': 3600,
+    'accounts': 300,
+}
+CACHE_MAX_ENTRIES = 256
+
+# pyetrade hardcodes these hosts; they are swapped for base_url when it differs
+ETRADE_HOST_PATTERN = re.compile(r'^https://api(sb)?\.etrade\.com')
+SERVICE_URL_ATTRIBUTES = ('base_url', 'renew_access_token_url', 'revoke_access_token_url')
+
+# Assumed requests per second allowed per API group; headroom is reported against these
+RATE_LIMITS = {
+    'market': 4,
+    'accounts': 2,
+    'order': 2,
+    'oauth': 2,
+}
+
+UPSTREAM_REQUESTS = metrics.REGISTRY.counter('etrade_upstream_requests_total',
+                                             'Requests sent to the E*TRADE API (cache misses)')
+HTTP_RESPONSES = metrics.REGISTRY.counter('etrade_http_responses_total', 'E*TRADE HTTP responses by status')
+RATE_LIMIT_HEADROOM = metrics.REGISTRY.gauge('etrade_rate_limit_headroom',
+                                             'Requests left in the current one-second window per API group')
+
+
+class DeadlineHTTPAdapter(HTTPAdapter):
+    '''
+    A keep-alive adapter whose socket timeouts come from the deadline of the request in flight
+    '''
+
+    def __init__(self, timeout, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(request, timeout=self.timeout() if timeout is None else timeout, **kwargs)
+
+
+class ResponseCache:
+    '''
+    A bounded LRU cache of API responses with per-endpoint TTLs and optional
+    stale-while-revalidate. While the API is unavailable the last good response
+    is served past its TTL and its endpoint is reported stale. Cached responses
+    are shared, so callers must not mutate them.
+    '''
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttls=None, stale_while_revalidate=0):
+        self.max_entries = max_entries
+        self.ttls = dict(CACHE_TTLS if ttls is None else ttls)
+        self.stale_while_revalidate = stale_while_revalidate
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+        self.fallbacks = 0
+        self._entries = OrderedDict()  # (endpoint, *key) -> (response, stored_at)
+        self._stale_since = {}  # endpoint -> Unix time its last good response was first served in place of a failure
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get_or_fetch(self, endpoint, key, fetch):
+        '''
+        This function returns the cached response for the key or calls fetch() to load it
+        '''
+        ttl = self.ttls.get(endpoint, 0)
+        if ttl <= 0:
+            return fetch()
+
+        cache_key = (endpoint,) + tuple(key)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                response, stored_at = entry
+                age = time.monotonic() - stored_at
+                if age <= ttl:
+                    self.hits += 1
+                    self._entries.move_to_end(cache_key)
+                    return response
+                if age <= ttl + self.stale_while_revalidate:
+                    self.stale_hits += 1
+                    self._entries.move_to_end(cache_key)
+                    if cache_key not in self._refreshing:
+                        self._refreshing.add(cache_key)
+                        threading.Thread(target=self._revalidate, args=(cache_key, fetch), daemon=True).start()
+                    return response
+            self.misses += 1
+
+        try:
+            response = fetch()
+        except Exception as e:
+            if not is_unavailable(e):
+                raise
+            with self._lock:
+                entry = self._entries.get(cache_key)
+                if entry is None:
+                    raise
+                self.fallbacks += 1
+                self._stale_since.setdefault(endpoint, time.time())
+            print(f"Serving the last good {endpoint} response: {e}")
+            return entry[0]
+        self._store(cache_key, response)
+        return response
+
+    def _revalidate(self, cache_key, fetch):
+        '''
+        This function refreshes a stale entry in the background
+        '''
+        try:
+            self._store(cache_key, fetch())
+        except Exception as e:
+            print(f"Error revalidating cached {cache_key[0]} response: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(cache_key)
+
+    def _store(self, cache_key, response):
+        '''
+        This function stores a response and evicts the least recently used entries
+        '''
+        with self._lock:
+            self._stale_since.pop(cache_key[0], None)
+            self._entries[cache_key] = (response, time.monotonic())
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        '''
+        This function drops every cached response
+        '''
+        with self._lock:
+            self._entries.clear()
+
+    def stale_endpoints(self):
+        '''
+        This function returns the endpoints currently served from their last good response, with the time it began
+        '''
+        with self._lock:
+            return dict(self._stale_since)
+
+    def stats(self):
+        '''
+        This function returns the cache counters
+        '''
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale_hits': self.stale_hits,
+                'fallbacks': self.fallbacks,
+                'evictions': self.evictions
+            }
+
+
 class Client:
 
     env_type: str = ""
@@ -15,6 +190,16 @@ class Client:
     oauth_token_secret: str = ""
 
     def __init__(self, skip_tokens=False):
+        # Long-lived pyetrade service objects, one per service class
+        self._services = {}
+        self._services_lock = threading.Lock()
+        self._retired_stats = {'requests': 0, 'connections': 0}
+        self.cache = ResponseCache()
+        self.executor = RequestExecutor(RATE_LIMITS)
+        self._request_times = {group: deque() for group in RATE_LIMITS}
+        self._rate_lock = threading.Lock()
+        self._local = threading.local()  # endpoint of the request in flight on this thread
+
         # loading configuration file if exists
         if os.path.exists(".env"):
             # Clear environment variables
@@ -39,8 +224,16 @@ class Client:
         # OAuth tokens
         self.oauth_token = os.getenv("OAUTH_TOKEN", "")
         self.oauth_token_secret = os.getenv("OAUTH_TOKEN_SECRET", "")
+        try:
+            issued_at = float(os.getenv("OAUTH_TOKEN_ISSUED", ""))
+        except ValueError:
+            issued_at = None
+        self.tokens = TokenManager(self._renew_access_token, issued_at=issued_at)
 
-        if not skip_tokens and (not self.oauth_token or not self.oauth_token_secret):
+        if not skip_tokens and (not self.oauth_token or not self.oauth_token_secret or self.tokens.is_expired()):
+            # Authorizing needs a person at the terminal; background processes fail fast instead
+            if not sys.stdin or not sys.stdin.isatty():
+                raise TokenExpiredError()
             self.get_tokens()
 
     def get_params(self):
@@ -53,20 +246,131 @@ class Client:
             'resource_owner_key': self.oauth_token,
             'resource_owner_secret': self.oauth_token_secret
         }
-    
-    def update_env_file(self, key, value):
+
+    def _get_service(self, service_cls):
         '''
-        This function removes the key from the .env file and adds the new key-value pair
+        This function returns the pooled pyetrade service object for the class,
+        creating it with a keep-alive connection pool on first use
         '''
-        with open(".env", "r", encoding='utf-8') as env_file:
-            lines = env_file.readlines()
+        with self._services_lock:
+            service = self._services.get(service_cls)
+            if service is None:
+                if service_cls is pyetrade.ETradeAccessManager:
+                    service = service_cls(**self.get_params())
+                else:
+                    service = service_cls(**self.get_params(), dev=self.dev_type)
+                self._apply_base_url(service)
+                adapter = DeadlineHTTPAdapter(self.executor.timeout, pool_connections=POOL_CONNECTIONS,
+                                              pool_maxsize=POOL_MAXSIZE)
+                service.session.mount('https://', adapter)
+                service.session.mount('http://', adapter)
+                service.session.hooks['response'].append(self._observe_response)
+                self._services[service_cls] = service
+            return service
 
-        with open(".env", "w", encoding='utf-8') as env_file:
-            for line in lines:
-                if key in line:
+    def _apply_base_url(self, service):
+        '''
+        This function points a pyetrade service at base_url (e.g. a local mock server)
+        '''
+        if not self.base_url:
+            return
+        base_url = self.base_url.rstrip('/')
+        for attribute in SERVICE_URL_ATTRIBUTES:
+            url = getattr(service, attribute, None)
+            if url:
+                setattr(service, attribute, ETRADE_HOST_PATTERN.sub(base_url, url))
+
+    def _request(self, endpoint, group, fetch, hedge=False):
+        '''
+        This function sends one upstream request through fetch() under the executor's
+        budget, deadline, retries and circuit breaker, timing each attempt and
+        tracking the rate-limit headroom of its API group
+        '''
+        def attempt():
+            now = time.monotonic()
+            with self._rate_lock:
+                times = self._request_times[group]
+                times.append(now)
+                while times and times[0] <= now - 1.0:
+                    times.popleft()
+                RATE_LIMIT_HEADROOM.set(RATE_LIMITS[group] - len(times), group=group)
+            UPSTREAM_REQUESTS.inc(endpoint=endpoint)
+
+            self._local.endpoint = endpoint
+            try:
+                # Includes OAuth signing and response parsing; the http.* span is the network part
+                with metrics.span('upstream.' + endpoint):
+                    if group == 'oauth':
+                        return fetch()
+                    # A 401 renews the tokens once for every request in flight, then retries
+                    return self.tokens.call(fetch)
+            finally:
+                self._local.endpoint = None
+
+        # Every call is a GET; token renewal is left to the token manager's own retry
+        return self.executor.execute(group, attempt, idempotent=group != 'oauth', hedge=hedge)
+
+    def _observe_response(self, response, *args, **kwargs):
+        '''
+        This function records the network time and status of every HTTP response
+        '''
+        endpoint = getattr(self._local, 'endpoint', None) or 'other'
+        metrics.SPAN_SECONDS.observe(response.elapsed.total_seconds(), span='http.' + endpoint)
+        HTTP_RESPONSES.inc(endpoint=endpoint, status=response.status_code)
+        return response
+
+    def reset_sessions(self):
+        '''
+        This function closes the pooled sessions so they are rebuilt with the current tokens
+        '''
+        with self._services_lock:
+            stats = self._pool_stats(self._services.values())
+            self._retired_stats['requests'] += stats['requests']
+            self._retired_stats['connections'] += stats['connections']
+            for service in self._services.values():
+                service.session.close()
+            self._services = {}
+
+    @staticmethod
+    def _pool_stats(services):
+        '''
+        This function sums the urllib3 request and connection counters for the services
+        '''
+        stats = {'requests': 0, 'connections': 0}
+        seen = set()
+        for service in services:
+            for adapter in service.session.adapters.values():
+                if id(adapter) in seen:
                     continue
-                env_file.write(line)
-            env_file.write(f"\n{key}={value}")
+                seen.add(id(adapter))
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools[key]
+                    stats['requests'] += pool.num_requests
+                    stats['connections'] += pool.num_connections
+        return stats
+
+    def connection_stats(self):
+        '''
+        This function reports how many requests reused an existing keep-alive connection
+        '''
+        with self._services_lock:
+            stats = self._pool_stats(self._services.values())
+        requests = stats['requests'] + self._retired_stats['requests']
+        connections = stats['connections'] + self._retired_stats['connections']
+        reused = max(requests - connections, 0)
+        return {
+            'requests': requests,
+            'connections': connections,
+            'reused': reused,
+            'reuse_ratio': round(reused / requests, 4) if requests else 0.0
+        }
+    
+    def update_env_file(self, key, value):
+        '''
+        This function sets the key in the .env file, replacing the file atomically
+        '''
+        update_env_file(".env", {key: value})
 
     def get_tokens(self):
         '''
@@ -85,10 +389,18 @@ class Client:
 
         self.oauth_token = tokens['oauth_token']
         self.oauth_token_secret = tokens['oauth_token_secret']
+        issued_at = time.time()
+        self.tokens.reset(issued_at)
         
-        # Save the tokens for future use
-        self.update_env_file("OAUTH_TOKEN", self.oauth_token)
-        self.update_env_file("OAUTH_TOKEN_SECRET", self.oauth_token_secret)
+        # Save the tokens for future use in one atomic rewrite
+        update_env_file(".env", {
+            "OAUTH_TOKEN": self.oauth_token,
+            "OAUTH_TOKEN_SECRET": self.oauth_token_secret,
+            "OAUTH_TOKEN_ISSUED": int(issued_at),
+        })
+
+        # Rebuild the pooled sessions with the new credentials
+        self.reset_sessions()
 
         return self.oauth_token, self.oauth_token_secret
     
@@ -96,49 +408,136 @@ class Client:
         '''
         This function renews the OAuth tokens for the E*TRADE API
         '''
-        oauth = pyetrade.ETradeAccessManager(**self.get_params())
-        return oauth.renew_access_token()
+        return self.tokens.renew()
+
+    def _renew_access_token(self):
+        '''
+        This function sends the renew request; renewal reactivates the same tokens, so the pooled sessions are kept
+        '''
+        oauth = self._get_service(pyetrade.ETradeAccessManager)
+        return self._request('renew_access_token', 'oauth', oauth.renew_access_token)
 
 
     def get_account(self):
         '''
         This function gets the account ID key for the E*TRADE API
         '''
-        accounts = pyetrade.ETradeAccounts(**self.get_params(), dev=self.dev_type)
-        account = accounts.list_accounts()['AccountListResponse']['Accounts']['Account']
-        return account
+        with metrics.span('client.get_account'):
+            accounts = self._get_service(pyetrade.ETradeAccounts)
+            response = self.cache.get_or_fetch(
+                'accounts', (),
+                lambda: self._request('accounts', 'accounts', accounts.list_accounts)
+            )
+            account = response['AccountListResponse']['Accounts']['Account']
+            return account
     
 
     def get_account_balance(self, account_id_key):
         '''
         This function gets the account balance for the account
         '''
-        account = pyetrade.ETradeAccounts(**self.get_params(), dev=self.dev_type)
-        balance = account.get_account_balance(account_id_key=account_id_key)
-        return round(float(balance['BalanceResponse']['Computed']['cashAvailableForInvestment']), 2)
+        with metrics.span('client.get_account_balance'):
+            account = self._get_service(pyetrade.ETradeAccounts)
+            balance = self._request('account_balance', 'accounts',
+                                    lambda: account.get_account_balance(account_id_key=account_id_key))
+            return round(float(balance['BalanceResponse']['Computed']['cashAvailableForInvestment']), 2)
     
-    def get_positions(self, account_id_key):
+    def get_account_balance_details(self, account_id_key, account_type=None):
         '''
-        This function gets the positions for the account
+        This function gets the full balance response for the account (cash, buying power, totals)
         '''
-        account = pyetrade.ETradeAccounts(**self.get_params(), dev=self.dev_type)
-        return account.get_account_portfolio(account_id_key=account_id_key)
+        with metrics.span('client.get_account_balance_details'):
+            account = self._get_service(pyetrade.ETradeAccounts)
+            response = self._request('account_balance', 'accounts',
+                                     lambda: account.get_account_balance(account_id_key=account_id_key,
+                                                                         account_type=account_type,
+                                                                         resp_format='json'))
+            return response.get('BalanceResponse', {})
 
-    def get_market_quote(self, symbols):
+    def get_positions(self, account_id_key, page_number=None):
         '''
-        This function gets the market quotes for the symbols
+        This function gets one page of positions for the account
         '''
-        market = pyetrade.ETradeMarket(**self.get_params(), dev=self.dev_type)
-        return market.get_quote(symbols)
+        with metrics.span('client.get_positions'):
+            account = self._get_service(pyetrade.ETradeAccounts)
+            return self._request('portfolio', 'accounts',
+                                 lambda: account.get_account_portfolio(account_id_key=account_id_key,
+                                                                       page_number=page_number,
+                                                                       resp_format='json'))
 
-    def list_orders(self, account_id_key):
+    def get_market_quote(self, symbols, resp_format='xml'):
         '''
-        This function lists the orders for the account
+        This function gets the market quotes for the symbols (at most 25 per call)
         '''
-        order = pyetrade.ETradeOrder(**self.get_params(), dev = self.dev_type)
-        return order.list_orders(account_id_key=account_id_key)
+        with metrics.span('client.get_market_quote'):
+            market = self._get_service(pyetrade.ETradeMarket)
+            return self.cache.get_or_fetch(
+                'quote', (tuple(symbols), resp_format),
+                lambda: self._request('quote', 'market', lambda: market.get_quote(symbols, resp_format=resp_format),
+                                      hedge=True)
+            )
 
-    def get_option_chains(self, symbol, strike_price=None, expiry_date=None):
+    def get_option_expire_dates(self, symbol):
+        '''
+        This function lists the option expiry dates for a symbol
+        
+        Returns a list of (datetime.date, expiry type) tuples sorted by date
+        '''
+        with metrics.span('client.get_option_expire_dates'):
+            market = self._get_service(pyetrade.ETradeMarket)
+            response = self.cache.get_or_fetch(
+                'option_expire_dates', (symbol,),
+                lambda: self._request('option_expire_dates', 'market',
+                                      lambda: market.get_option_expire_date(symbol, resp_format='json'))
+            )
+        expiry_dates = response.get('OptionExpireDateResponse', {}).get('ExpirationDate', [])
+        if not isinstance(expiry_dates, list):
+            expiry_dates = [expiry_dates]
+        return sorted(
+            (datetime.date(int(expiry['year']), int(expiry['month']), int(expiry['day'])),
+             expiry.get('expiryType', ''))
+            for expiry in expiry_dates
+        )
+
+    def list_orders(self, account_id_key, marker=None, count=25, status=None, from_date=None, to_date=None):
+        '''
+        This function lists one page of orders for the account (newest first; marker continues to older orders)
+        '''
+        with metrics.span('client.list_orders'):
+            order = self._get_service(pyetrade.ETradeOrder)
+            return self._request('orders', 'order',
+                                 lambda: order.list_orders(account_id_key=account_id_key, marker=marker, count=count,
+                                                           status=status, from_date=from_date, to_date=to_date))
+
+    def get_option_chains_raw(self, symbol, expiry_date=None, no_of_strikes=None):
+        '''
+        This function gets the option chain JSON body of one expiry without parsing it,
+        so bulk callers can parse it in another process. It bypasses the response cache.
+
+        Parameters:
+        - symbol: The ticker symbol (underlier)
+        - expiry_date: Optional - The expiration date as a datetime.date object
+        - no_of_strikes: Optional - The number of strikes around the money (every strike if omitted)
+
+        Returns the response body as bytes
+        '''
+        market = self._get_service(pyetrade.ETradeMarket)
+        params = {'symbol': symbol}
+        if expiry_date is not None:
+            params.update(expiryDay=f"{expiry_date.day:02d}", expiryMonth=f"{expiry_date.month:02d}",
+                          expiryYear=f"{expiry_date.year:04d}")
+        if no_of_strikes is not None:
+            params['noOfStrikes'] = no_of_strikes
+
+        def fetch():
+            response = market.session.get(f"{market.base_url}optionchains.json", params=params)
+            response.raise_for_status()
+            return response.content
+
+        with metrics.span('client.get_option_chains_raw'):
+            return self._request('option_chains', 'market', fetch)
+
+    def get_option_chains(self, symbol, strike_price=None, expiry_date=None, no_of_strikes=1):
         '''
         This function gets the option chains for a symbol using the E*TRADE API
         
@@ -146,16 +545,17 @@ class Client:
         - symbol: The ticker symbol (underlier)
         - strike_price: Optional - The target strike price
         - expiry_date: Optional - The expiration date as a datetime.date object
+        - no_of_strikes: Optional - The number of strikes to return around strike_price
         
         Returns option chain data for the symbol
         '''
-        market = pyetrade.ETradeMarket(**self.get_params(), dev=self.dev_type)
+        market = self._get_service(pyetrade.ETradeMarket)
         
         # Set parameters according to API documentation
         params = {
             'underlier': symbol,
             'chain_type': None,  # Get both calls and puts
-            'no_of_strikes': 1,
+            'no_of_strikes': no_of_strikes,
             'resp_format': 'json',
         }
         
@@ -166,7 +566,10 @@ class Client:
         # None is a valid value for expiry_date, so check if it's provided    
         params['expiry_date'] = expiry_date
 
-        # Call the API to get option chains
-        print(f"Getting option chains for {symbol} with params: {params}")
-            
-        return market.get_option_chains(**params)
\ No newline at end of file
+        def fetch():
+            # Call the API to get option chains
+            print(f"Getting option chains for {symbol} with params: {params}")
+            return self._request('option_chains', 'market', lambda: market.get_option_chains(**params))
+
+        with metrics.span('client.get_option_chains'):
+            return self.cache.get_or_fetch('option_chains', (symbol, strike_price, expiry_date, no_of_strikes), fetch)
\ No newline at end of file
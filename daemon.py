@@ -0,0 +1,201 @@
+"""
+This module implements the warm daemon behind repeated CLI invocations.
+The daemon stays resident with one Client (pooled keep-alive sessions and the
+response cache) and runs commands sent over a local multiprocessing
+connection, so a repeated `app.py spy` skips interpreter start-up, imports and
+TLS handshakes. Connections are authenticated with a random key kept in a
+state file readable only by the owner.
+"""
+
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from typing import Dict, Any, Callable, Optional
+
+STATE_FILE = '.etrade-daemon.json'
+LOG_FILE = '.etrade-daemon.log'
+# Seconds `daemon start` waits for the background process to publish its state
+START_TIMEOUT = 30.0
+
+
+def read_state(path: str = STATE_FILE) -> Optional[Dict[str, Any]]:
+    """
+    Read the daemon's pid, port and authkey, or None if no daemon has published one
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_state(state: Dict[str, Any], path: str = STATE_FILE):
+    """
+    Atomically write the state file with owner-only permissions (it holds the authkey)
+    """
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(state, f)
+    os.replace(temp_path, path)
+
+
+class DaemonReplyError(Exception):
+    """
+    Raised when the daemon accepted a message but no reply arrived (it may still be running the command)
+    """
+
+
+def request(message: Dict[str, Any], path: str = STATE_FILE, timeout: float = 300.0) -> Optional[Dict[str, Any]]:
+    """
+    Send one message to the running daemon
+
+    Args:
+        message: {'argv': [...]} to run a command, or {'command': 'status' | 'stop'}
+        path: The daemon's state file
+        timeout: Seconds to wait for the reply
+
+    Returns:
+        The daemon's reply, or None if no daemon is reachable (callers then run in-process)
+
+    Raises:
+        DaemonReplyError: If the message was sent but the reply timed out or the connection dropped;
+            running the command again in-process would repeat its API calls
+    """
+    state = read_state(path)
+    if not state:
+        return None
+    # Only pay for the connection machinery when a daemon has published its address
+    from multiprocessing.connection import AuthenticationError, Client as Connection
+    try:
+        connection = Connection(('localhost', state['port']), authkey=bytes.fromhex(state['authkey']))
+    except (OSError, EOFError, KeyError, ValueError, AuthenticationError):
+        return None
+    with connection:
+        try:
+            connection.send(message)
+        except OSError:
+            return None
+        try:
+            if not connection.poll(timeout):
+                raise DaemonReplyError(f"Daemon (pid {state.get('pid')}) did not reply within {timeout:g}s; "
+                                       "it may still be running the command")
+            return connection.recv()
+        except (OSError, EOFError) as e:
+            raise DaemonReplyError(f"Daemon (pid {state.get('pid')}) closed the connection before replying") from e
+
+
+class DaemonServer:
+    """
+    Serves commands one at a time from a local, authenticated listener.
+    Commands run on a worker thread, so the listener keeps answering: a command
+    arriving while another runs is refused as busy instead of queued.
+    """
+
+    def __init__(self, handler: Callable[[list], Dict[str, Any]], path: str = STATE_FILE):
+        """
+        Initialize the server
+
+        Args:
+            handler: Runs one command argv and returns {'status': int, 'output': str}
+            path: Where to publish the pid, port and authkey
+        """
+        self.handler = handler
+        self.path = path
+        self.started = None
+        self.requests = 0
+        self._running = threading.Lock()
+
+    def serve(self):
+        """
+        Listen until a stop message arrives, then remove the state file
+        """
+        from multiprocessing.connection import AuthenticationError, Listener
+
+        authkey = secrets.token_bytes(32)
+        with Listener(('localhost', 0), authkey=authkey) as listener:
+            self.started = time.time()
+            write_state({'pid': os.getpid(), 'port': listener.address[1], 'authkey': authkey.hex(),
+                         'started': self.started}, self.path)
+            try:
+                while True:
+                    try:
+                        connection = listener.accept()
+                    except (AuthenticationError, OSError, EOFError):
+                        continue
+                    try:
+                        message = connection.recv()
+                    except (OSError, EOFError):
+                        connection.close()
+                        continue
+                    if not isinstance(message, dict):
+                        connection.close()
+                        continue
+                    command = message.get('command')
+                    if command is None and self._running.acquire(blocking=False):
+                        self.requests += 1
+                        threading.Thread(target=self._run, args=(connection, list(message.get('argv', []))),
+                                         name='daemon-command', daemon=True).start()
+                        continue
+                    with connection:
+                        if command == 'stop':
+                            with self._running:  # let a running command finish and reply first
+                                connection.send({'status': 0, 'output': "Daemon stopped\n"})
+                            break
+                        try:
+                            if command == 'status':
+                                connection.send({'status': 0, 'output': self._status()})
+                            elif command is None:
+                                connection.send({'status': 1, 'output': "Daemon is busy running another command; "
+                                                                        "try again or use --no-daemon\n"})
+                        except OSError:
+                            pass
+            finally:
+                state = read_state(self.path)
+                if state and state.get('pid') == os.getpid():
+                    os.remove(self.path)
+
+    def _run(self, connection, argv: list):
+        """
+        Run one command and send its reply (on the worker thread, holding the running lock)
+        """
+        try:
+            reply = self.handler(argv)
+            try:
+                connection.send(reply)
+            except OSError:
+                pass
+        finally:
+            connection.close()
+            self._running.release()
+
+    def _status(self) -> str:
+        return (f"Daemon {os.getpid()} up {time.time() - self.started:.0f}s, "
+                f"{self.requests} command(s) served\n")
+
+
+def start_background(command: list, path: str = STATE_FILE, log_path: str = LOG_FILE,
+                     timeout: float = START_TIMEOUT) -> Optional[Dict[str, Any]]:
+    """
+    Launch `command` (which runs DaemonServer.serve) detached from this terminal
+
+    Returns:
+        The published state once the daemon is listening, or None if it exited or timed out
+    """
+    import subprocess
+
+    with open(log_path, 'ab') as log:
+        process = subprocess.Popen([sys.executable] + command, stdin=subprocess.DEVNULL, stdout=log,
+                                   stderr=subprocess.STDOUT, start_new_session=True)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        state = read_state(path)
+        if state and state.get('pid') == process.pid:
+            return state
+        if process.poll() is not None:
+            return None
+        time.sleep(0.05)
+    return None
@@ -0,0 +1,123 @@
+"""
+This module implements the multi-expiry straddle scanner.
+It lists every available expiry for the underlier, fetches the at-the-money
+chain of each expiry concurrently through a bounded worker pool and prints
+the straddle term structure (price, implied move and IV per expiry).
+"""
+
+import datetime
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
+
+import pricing
+from option_models import OptionQuote, Straddle, nearest_strike
+from quote_service import parse_quote_response
+
+
+class ExpiryScannerStrategy:
+    """
+    A strategy that scans the ATM straddle across the whole expiry calendar
+    """
+
+    def __init__(self, client, symbol: str = 'SPY', max_workers: int = 8, max_expiries: Optional[int] = None,
+                 strike_increment: float = 1.0):
+        """
+        Initialize the expiry scanner
+
+        Args:
+            client: An instance of Client
+            symbol: The underlier to scan
+            max_workers: Maximum number of chain requests in flight at once
+            max_expiries: Optional limit on how many of the nearest expiries are scanned
+            strike_increment: Spacing of the listed strikes around the money
+        """
+        self.client = client
+        self.symbol = symbol.upper()
+        self.max_workers = max_workers
+        self.max_expiries = max_expiries
+        self.strike_increment = strike_increment
+        self.spot_price = None
+        self.term_structure = []
+
+    def run_strategy(self):
+        """
+        Execute the scan:
+        1. Get the current underlier price
+        2. List the available expiries
+        3. Fetch the ATM chain for every expiry concurrently
+        4. Display the term structure
+        """
+        quote = parse_quote_response(self.client.get_market_quote([self.symbol], resp_format='json'))
+        self.spot_price = quote.get(self.symbol, {}).get('last_price')
+        if not self.spot_price:
+            print(f"Failed to get current price for {self.symbol}")
+            return None
+
+        expiries = self.client.get_option_expire_dates(self.symbol)
+        if self.max_expiries:
+            expiries = expiries[:self.max_expiries]
+
+        # Submit every expiry up front; the pool bounds how many run at once
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='expiry-scan') as executor:
+            futures = [executor.submit(self._scan_expiry, expiry_date, expiry_type)
+                       for expiry_date, expiry_type in expiries]
+            rows = [future.result() for future in futures]
+
+        self.term_structure = [row for row in rows if row]
+        self._display_term_structure()
+        return self.term_structure
+
+    def _scan_expiry(self, expiry_date: datetime.date, expiry_type: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetch the ATM chain of one expiry and build its term-structure row
+        """
+        try:
+            option_chains = self.client.get_option_chains(
+                symbol=self.symbol,
+                strike_price=nearest_strike(self.spot_price, self.strike_increment),
+                expiry_date=expiry_date
+            )
+        except Exception as e:
+            print(f"Error getting option chains for {expiry_date}: {e}")
+            return None
+
+        option_pair = option_chains.get('OptionChainResponse', {}).get('OptionPair', [])
+        if not isinstance(option_pair, list):
+            option_pair = [option_pair]
+        if not option_pair:
+            return None
+
+        years = pricing.years_to_expiry(expiry_date, time.time())
+        call = pricing.fill_option_greeks(OptionQuote.from_api(option_pair[0].get('Call') or {}),
+                                          self.spot_price, years, is_call=True)
+        put = pricing.fill_option_greeks(OptionQuote.from_api(option_pair[0].get('Put') or {}),
+                                         self.spot_price, years, is_call=False)
+        straddle = Straddle.from_quotes(self.symbol, call, put)
+        straddle_mid = call.mid + put.mid
+        ivs = [iv for iv in (call.iv, put.iv) if not math.isnan(iv)]
+
+        return {
+            'expiry_date': expiry_date,
+            'expiry_type': expiry_type,
+            'days_to_expiry': (expiry_date - datetime.date.today()).days,
+            'strike_price': straddle.strike_price,
+            'straddle_mid': straddle_mid,
+            'straddle_last': straddle.last_price,
+            'implied_move_percent': straddle_mid / self.spot_price * 100,
+            'iv': sum(ivs) / len(ivs) if ivs else float('nan'),
+        }
+
+    def _display_term_structure(self):
+        """
+        Display the straddle term structure table
+        """
+        print(f"\n===== {self.symbol} STRADDLE TERM STRUCTURE =====")
+        print(f"Current {self.symbol} Price: ${self.spot_price}")
+        print(f"{'Expiry':<12}{'Type':<10}{'DTE':>5}{'Strike':>9}{'Mid':>9}{'Last':>9}{'Move %':>8}{'IV':>8}")
+        for row in self.term_structure:
+            print(f"{row['expiry_date'].strftime('%Y-%m-%d'):<12}{row['expiry_type']:<10}{row['days_to_expiry']:>5}"
+                  f"{row['strike_price']:>9.2f}{row['straddle_mid']:>9.2f}{row['straddle_last']:>9.2f}"
+                  f"{row['implied_move_percent']:>8.2f}{row['iv']:>8.4f}")
+        print("===============================================")
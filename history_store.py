@@ -0,0 +1,190 @@
+"""
+This module implements the persistent tick-history store.
+Each strategy snapshot is appended to an append-only columnar layout: one
+raw little-endian float64 file per column, in one directory per trading day.
+Time-range reads memory-map the columns and slice them without copying.
+"""
+
+import datetime
+import math
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from option_models import ChainSnapshot
+
+try:
+    from zoneinfo import ZoneInfo
+    MARKET_TIMEZONE = ZoneInfo('America/New_York')
+except Exception:
+    # No tz database available (e.g. Windows without tzdata); assume EST
+    MARKET_TIMEZONE = datetime.timezone(datetime.timedelta(hours=-5))
+
+COLUMN_DTYPE = np.dtype('<f8')
+
+# Column name -> function extracting the value from a ChainSnapshot
+COLUMNS = {
+    'timestamp': lambda s: s.timestamp,
+    'spot': lambda s: s.spot_price,
+    'strike': lambda s: s.straddle.strike_price,
+    'call_bid': lambda s: s.call.bid,
+    'call_ask': lambda s: s.call.ask,
+    'call_last': lambda s: s.call.last_price,
+    'put_bid': lambda s: s.put.bid,
+    'put_ask': lambda s: s.put.ask,
+    'put_last': lambda s: s.put.last_price,
+    'call_delta': lambda s: s.call.delta,
+    'call_gamma': lambda s: s.call.gamma,
+    'call_theta': lambda s: s.call.theta,
+    'call_vega': lambda s: s.call.vega,
+    'call_iv': lambda s: s.call.iv,
+    'put_delta': lambda s: s.put.delta,
+    'put_gamma': lambda s: s.put.gamma,
+    'put_theta': lambda s: s.put.theta,
+    'put_vega': lambda s: s.put.vega,
+    'put_iv': lambda s: s.put.iv,
+    'straddle_last': lambda s: s.straddle.last_price,
+    'straddle_bid': lambda s: s.straddle.bid,
+    'straddle_ask': lambda s: s.straddle.ask,
+}
+
+
+def trading_day(timestamp: float) -> datetime.date:
+    """
+    Get the exchange (US/Eastern) date of a Unix timestamp
+    """
+    return datetime.datetime.fromtimestamp(timestamp, MARKET_TIMEZONE).date()
+
+
+class HistoryStore:
+    """
+    An append-only, memory-mappable columnar store of strategy snapshots
+    """
+
+    def __init__(self, base_dir: str = 'history'):
+        """
+        Initialize the history store
+
+        Args:
+            base_dir: Directory holding one sub-directory per trading day
+        """
+        self.base_dir = base_dir
+        self._lock = threading.Lock()
+        self._day = None
+        self._files = {}
+
+    def _day_dir(self, day: datetime.date) -> str:
+        """
+        Get the directory of a trading day
+        """
+        return os.path.join(self.base_dir, day.strftime('%Y-%m-%d'))
+
+    def _open_day(self, day: datetime.date):
+        """
+        Roll the open column files over to a new trading day
+        """
+        self._close_files()
+        day_dir = self._day_dir(day)
+        os.makedirs(day_dir, exist_ok=True)
+        self._truncate_torn_rows(day_dir)
+        self._files = {name: open(os.path.join(day_dir, f"{name}.f64"), 'ab') for name in COLUMNS}
+        self._day = day
+
+    @staticmethod
+    def _truncate_torn_rows(day_dir: str):
+        """
+        Trim columns to a common length so a crash mid-append cannot misalign rows
+        """
+        paths = [os.path.join(day_dir, f"{name}.f64") for name in COLUMNS]
+        sizes = [os.path.getsize(path) if os.path.exists(path) else 0 for path in paths]
+        common = min(sizes) // COLUMN_DTYPE.itemsize * COLUMN_DTYPE.itemsize
+        for path, size in zip(paths, sizes):
+            if size > common:
+                os.truncate(path, common)
+
+    def append(self, snapshot: ChainSnapshot):
+        """
+        Append one snapshot to the file set of its trading day
+        """
+        row = np.array([extract(snapshot) for extract in COLUMNS.values()], dtype=COLUMN_DTYPE)
+        day = trading_day(snapshot.timestamp)
+        with self._lock:
+            if day != self._day:
+                self._open_day(day)
+            for value, column_file in zip(row, self._files.values()):
+                column_file.write(value.tobytes())
+            for column_file in self._files.values():
+                column_file.flush()
+
+    def _load_day(self, day: datetime.date) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Memory-map the columns of a trading day
+        """
+        day_dir = self._day_dir(day)
+        paths = {name: os.path.join(day_dir, f"{name}.f64") for name in COLUMNS}
+        if not all(os.path.exists(path) for path in paths.values()):
+            return None
+
+        rows = min(os.path.getsize(path) for path in paths.values()) // COLUMN_DTYPE.itemsize
+        if rows == 0:
+            return None
+        return {name: np.memmap(path, dtype=COLUMN_DTYPE, mode='r', shape=(rows,))
+                for name, path in paths.items()}
+
+    def read(self, start: float, end: float, columns: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        Read the snapshots with start <= timestamp <= end
+
+        Args:
+            start: Range start as a Unix timestamp
+            end: Range end as a Unix timestamp
+            columns: Optional subset of column names to return
+
+        Returns:
+            Dict of float64 arrays; views into the memory-mapped files when the range is one day
+        """
+        names = list(columns or COLUMNS)
+        parts = []
+        day = trading_day(start)
+        last_day = trading_day(end)
+        while day <= last_day:
+            data = self._load_day(day)
+            if data is not None:
+                timestamps = data['timestamp']
+                lo = int(np.searchsorted(timestamps, start, side='left'))
+                hi = int(np.searchsorted(timestamps, end, side='right'))
+                if hi > lo:
+                    parts.append({name: data[name][lo:hi] for name in names})
+            day += datetime.timedelta(days=1)
+
+        if not parts:
+            return {name: np.empty(0, dtype=COLUMN_DTYPE) for name in names}
+        if len(parts) == 1:
+            return parts[0]
+        return {name: np.concatenate([part[name] for part in parts]) for name in names}
+
+    def _close_files(self):
+        """
+        Close the open column files
+        """
+        for column_file in self._files.values():
+            column_file.close()
+        self._files = {}
+        self._day = None
+
+    def close(self):
+        """
+        Close the store
+        """
+        with self._lock:
+            self._close_files()
+
+
+def history_to_json(history: Dict[str, np.ndarray]) -> Dict[str, list]:
+    """
+    Convert history columns to JSON-ready lists (NaN becomes None)
+    """
+    return {name: [value if math.isfinite(value) else None for value in column.tolist()]
+            for name, column in history.items()}
@@ -0,0 +1,299 @@
+"""
+This module implements lightweight in-process metrics for the hot path.
+Counters, gauges and fixed-bucket histograms are kept in a registry and
+rendered in the Prometheus text exposition format; timing spans wrap client
+calls and strategy stages. A sampling profiler can be toggled at runtime.
+"""
+
+import bisect
+import collections
+import math
+import sys
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
+
+# Histogram bucket upper bounds in seconds (spans range from microseconds of parsing to seconds of network)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# Raw label items -> normalized key; label sets are few, and sorting them on every observation is most of its cost
+_LABEL_KEYS = {}
+
+
+def _label_key(labels: Dict[str, Any]) -> Tuple:
+    """
+    Turn a label dict into a hashable, ordered key
+    """
+    raw = tuple(labels.items())
+    key = _LABEL_KEYS.get(raw)
+    if key is None:
+        key = _LABEL_KEYS[raw] = tuple(sorted((name, str(value)) for name, value in raw))
+    return key
+
+
+def _format_labels(key: Tuple, extra: Optional[Tuple] = None) -> str:
+    """
+    Render a label key as {name="value",...}
+    """
+    pairs = key + (extra or ())
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    """
+    Render a sample value without losing precision (+Inf, -Inf and NaN as the exposition format spells them)
+    """
+    if isinstance(value, int):
+        return str(int(value))
+    value = float(value)
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if value.is_integer() and abs(value) < 2 ** 53:
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    """
+    A monotonically increasing value per label set
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values = collections.defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """
+    A value per label set that can go up and down
+    """
+
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    """
+    Cumulative fixed-bucket histograms per label set
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}  # label key -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            series_items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in series_items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                samples.append((f"{self.name}_bucket", key + (('le', le),), cumulative))
+            samples.append((f"{self.name}_sum", key, series[-1]))
+            samples.append((f"{self.name}_count", key, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    A named collection of metrics rendered together
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help_text, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, **kwargs)
+            return metric
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._get_or_create(Counter, name, help_text)
+
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        return self._get_or_create(Gauge, name, help_text)
+
+    def histogram(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, buckets=buckets)
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+SPAN_SECONDS = REGISTRY.histogram('etrade_span_seconds', 'Duration of instrumented hot-path spans')
+SPAN_ERRORS = REGISTRY.counter('etrade_span_errors_total', 'Instrumented spans that raised an exception')
+
+
+class span:
+    """
+    Time a block into etrade_span_seconds{span=name}; exceptions are counted and re-raised.
+
+    A plain class rather than @contextmanager: it is entered on every hot-path call.
+    """
+
+    __slots__ = ('name', 'labels', 'started')
+
+    def __init__(self, name: str, **labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        SPAN_SECONDS.observe(time.perf_counter() - self.started, span=self.name, **self.labels)
+        if exc_type is not None:
+            SPAN_ERRORS.inc(span=self.name, error=exc_type.__name__, **self.labels)
+        return False
+
+
+class SamplingProfiler:
+    """
+    A wall-clock sampling profiler over every thread's stack.
+
+    Samples are aggregated as folded stacks ("outer;inner count" lines), the
+    input format of flame graph tools. Sampling runs in its own thread, so the
+    hot path only pays for it while the profiler is started.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        """
+        Initialize the profiler
+
+        Args:
+            interval: Seconds between samples
+            max_depth: Deepest stack frame recorded per sample
+        """
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self._stacks = collections.Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """
+        Start sampling (no-op when already running)
+        """
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop sampling, keeping the collected stacks
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def reset(self):
+        """
+        Drop the collected stacks
+        """
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            stacks = []
+            for thread_id, frame in frames.items():
+                if thread_id == own_id:
+                    continue
+                names = []
+                while frame is not None and len(names) < self.max_depth:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stacks.append(';'.join(reversed(names)))
+            with self._lock:
+                self._stacks.update(stacks)
+                self.samples += 1
+
+    def folded(self, top: Optional[int] = None) -> str:
+        """
+        Get the collected stacks in folded format, most frequent first
+        """
+        with self._lock:
+            stacks = self._stacks.most_common(top)
+        return ''.join(f"{stack} {count}\n" for stack, count in stacks)
+
+
+PROFILER = SamplingProfiler()
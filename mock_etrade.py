@@ -0,0 +1,380 @@
+"""
+This module implements a local mock of the E*TRADE API for tests and benchmarks.
+It serves the OAuth, quote, option chain, expiry date, account list and
+order list endpoints with configurable latency and chain sizes, and counts
+every request.
+Point a Client at it by setting its base_url to MockETradeServer.url.
+"""
+
+import datetime
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional
+from urllib.parse import parse_qs, urlparse
+
+from history_store import MARKET_TIMEZONE
+
+
+def _to_xml(tag: str, value: Any) -> str:
+    """
+    Render a JSON-style response as the XML E*TRADE returns for non-.json URLs
+    """
+    if isinstance(value, list):
+        return ''.join(_to_xml(tag, item) for item in value)
+    if isinstance(value, dict):
+        return f"<{tag}>{''.join(_to_xml(key, item) for key, item in value.items())}</{tag}>"
+    return f"<{tag}>{value}</{tag}>"
+
+
+class MockMarket:
+    """
+    A random-walk underlier and a smooth synthetic option surface around it
+    """
+
+    def __init__(self, spot: float = 590.0, volatility: float = 0.05, seed: Optional[int] = None):
+        self.spot = spot
+        self.volatility = volatility
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def tick(self, symbol: str) -> float:
+        """
+        Advance and return the price of a symbol (every symbol shares the SPY walk, scaled)
+        """
+        with self._lock:
+            self.spot = round(self.spot + self._random.gauss(0, self.volatility), 2)
+            scale = 1 + (sum(map(ord, symbol)) % 50) / 100 if symbol != 'SPY' else 1
+            return round(self.spot * scale, 2)
+
+    def quote(self, symbol: str) -> Dict[str, Any]:
+        """
+        Build one QuoteData entry
+        """
+        price = self.tick(symbol)
+        return {
+            'dateTimeUTC': int(time.time()),
+            'quoteStatus': 'REALTIME',
+            'All': {
+                'lastTrade': price,
+                'bid': round(price - 0.01, 2),
+                'ask': round(price + 0.01, 2),
+                'changeClose': 0.0,
+                'changeClosePercentage': 0.0,
+                'totalVolume': 1000000,
+            },
+            'Product': {'symbol': symbol, 'securityType': 'EQ'},
+        }
+
+    def option(self, symbol: str, strike: float, call_put: str, expiry: datetime.date) -> Dict[str, Any]:
+        """
+        Build one Call or Put entry of an OptionPair
+        """
+        distance = (self.spot - strike) if call_put == 'CALL' else (strike - self.spot)
+        time_value = 2.0 * math.exp(-(distance / 5) ** 2) + 0.05
+        price = round(max(distance, 0) + time_value, 2)
+        delta = 0.5 + 0.5 * math.tanh(distance / 3)
+        return {
+            'symbol': symbol,
+            'displaySymbol': f"{symbol} {expiry.strftime('%b %d %y')} ${strike:g} {call_put.title()}",
+            'optionType': call_put,
+            'strikePrice': strike,
+            'lastPrice': price,
+            'bid': round(price - 0.01, 2),
+            'ask': round(price + 0.01, 2),
+            'volume': 1000,
+            'openInterest': 5000,
+            'OptionGreeks': {
+                'delta': round(delta if call_put == 'CALL' else -delta, 5),
+                'gamma': round(0.08 * math.exp(-(distance / 5) ** 2), 5),
+                'theta': -1.8,
+                'vega': 0.11,
+                'iv': 0.17,
+            },
+        }
+
+    def option_chain(self, symbol: str, near: float, strikes: int, expiry: datetime.date) -> Dict[str, Any]:
+        """
+        Build an OptionChainResponse with `strikes` strikes centred on `near`
+        """
+        center = round(near)
+        first = center - strikes // 2
+        pairs = [{'Call': self.option(symbol, float(strike), 'CALL', expiry),
+                  'Put': self.option(symbol, float(strike), 'PUT', expiry)}
+                 for strike in range(first, first + strikes)]
+        return {'OptionChainResponse': {
+            'OptionPair': pairs,
+            'SelectedED': {'year': expiry.year, 'month': expiry.month, 'day': expiry.day},
+        }}
+
+
+class MockETradeServer:
+    """
+    A threaded local HTTP server speaking enough of the E*TRADE API for the strategies
+    """
+
+    def __init__(self, latency: float = 0.0, max_strikes: int = 200, expiries: int = 30,
+                 port: int = 0, seed: Optional[int] = None):
+        """
+        Initialize the mock server
+
+        Args:
+            latency: Seconds added to every response
+            max_strikes: Upper bound on the strikes returned per option chain
+            expiries: Number of expiry dates listed
+            port: Port to listen on (0 picks a free port)
+            seed: Random seed for the price walk
+        """
+        self.latency = latency
+        self.max_strikes = max_strikes
+        self.expiries = expiries
+        self.market = MockMarket(seed=seed)
+        self.request_counts = Counter()
+        self.rejected_tokens = set()  # resource owner keys answered with 401
+        self.inactive_tokens = set()  # keys answered with 401 until renew_access_token reactivates them
+        self.failures = Counter()  # endpoint -> number of upcoming requests answered with 503
+        self.outage = False  # answer every API request with 503
+        self.accounts = [{'accountId': '12345678', 'accountIdKey': 'mockAccountKey', 'accountType': 'INDIVIDUAL',
+                          'accountDesc': 'Mock Brokerage', 'accountStatus': 'ACTIVE'}]
+        self.orders = {}  # accountIdKey -> orders in placement order
+        self._next_order_id = 1000
+        self._orders_lock = threading.Lock()
+        self._counts_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """
+        The base URL to use as Client.base_url
+        """
+        return f"http://127.0.0.1:{self._httpd.server_port}"
+
+    def total_requests(self) -> int:
+        """
+        Get the number of requests served so far
+        """
+        with self._counts_lock:
+            return sum(self.request_counts.values())
+
+    def start(self) -> 'MockETradeServer':
+        """
+        Serve in a background thread
+        """
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving
+        """
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def expiry_dates(self):
+        """
+        List the next weekday expiries
+        """
+        dates = []
+        day = datetime.date.today()
+        while len(dates) < self.expiries:
+            if day.weekday() < 5:
+                dates.append(day)
+            day += datetime.timedelta(days=1)
+        return dates
+
+    def route(self, path: str, query: Dict[str, str]) -> Optional[Any]:
+        """
+        Build the JSON-style response for a path, or None for unknown paths
+        """
+        if path.startswith('/v1/market/quote/'):
+            symbols = path[len('/v1/market/quote/'):].split(',')
+            return {'QuoteResponse': {'QuoteData': [self.market.quote(symbol.upper()) for symbol in symbols]}}
+
+        if path == '/v1/market/optionchains':
+            expiry = datetime.date.today()
+            if 'expiryYear' in query:
+                expiry = datetime.date(int(query['expiryYear']), int(query['expiryMonth']), int(query['expiryDay']))
+            near = float(query.get('strikePriceNear', self.market.spot))
+            strikes = min(int(query.get('noOfStrikes', self.max_strikes)), self.max_strikes)
+            return self.market.option_chain(query.get('symbol', 'SPY'), near, strikes, expiry)
+
+        if path == '/v1/market/optionexpiredate':
+            return {'OptionExpireDateResponse': {'ExpirationDate': [
+                {'year': day.year, 'month': day.month, 'day': day.day,
+                 'expiryType': 'MONTHLY' if 15 <= day.day <= 21 and day.weekday() == 4 else 'WEEKLY'}
+                for day in self.expiry_dates()
+            ]}}
+
+        if path == '/v1/accounts/list':
+            return {'AccountListResponse': {'Accounts': {'Account': list(self.accounts)}}}
+
+        if path.startswith('/v1/accounts/') and path.endswith('/orders'):
+            return self.list_orders(path[len('/v1/accounts/'):-len('/orders')], query)
+
+        return None
+
+    def fail_next(self, endpoint: str, count: int = 1):
+        """
+        Answer the next `count` requests to an endpoint (e.g. /v1/market/optionchains) with 503
+        """
+        with self._counts_lock:
+            self.failures[endpoint] += count
+
+    def add_order(self, account_id_key: str, symbol: str, quantity: float, action: str = 'BUY',
+                  limit_price: float = 1.0, status: str = 'OPEN', placed_time: Optional[float] = None) -> str:
+        """
+        Place an order in an account's order history
+
+        Returns:
+            The new orderId
+        """
+        with self._orders_lock:
+            self._next_order_id += 1
+            order_id = str(self._next_order_id)
+            self.orders.setdefault(account_id_key, []).append({
+                'orderId': order_id,
+                'orderType': 'EQ',
+                'OrderDetail': [{
+                    'placedTime': int((time.time() if placed_time is None else placed_time) * 1000),
+                    'status': status,
+                    'orderTerm': 'GOOD_FOR_DAY',
+                    'priceType': 'LIMIT',
+                    'limitPrice': limit_price,
+                    'Instrument': [{
+                        'Product': {'symbol': symbol, 'securityType': 'EQ'},
+                        'symbolDescription': symbol,
+                        'orderAction': action,
+                        'quantityType': 'QUANTITY',
+                        'orderedQuantity': quantity,
+                        'filledQuantity': 0,
+                    }],
+                }],
+            })
+        return order_id
+
+    def update_order(self, account_id_key: str, order_id: str, status: Optional[str] = None,
+                     filled: Optional[float] = None):
+        """
+        Change the status or filled quantity of an order
+        """
+        with self._orders_lock:
+            order = next(order for order in self.orders[account_id_key] if order['orderId'] == order_id)
+            detail = order['OrderDetail'][0]
+            if status is not None:
+                detail['status'] = status
+            if filled is not None:
+                detail['Instrument'][0]['filledQuantity'] = filled
+
+    def list_orders(self, account_id_key: str, query: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Build one page of OrdersResponse, newest first; the marker is the orderId the next page starts below
+        """
+        def day(value: str) -> datetime.date:
+            return datetime.datetime.strptime(value, '%m%d%Y').date()
+
+        count = min(int(query.get('count', 25)), 100)
+        status = query.get('status')
+        from_date = day(query['fromDate']) if 'fromDate' in query else None
+        to_date = day(query['toDate']) if 'toDate' in query else None
+        marker = int(query['marker']) if query.get('marker') else None
+
+        with self._orders_lock:
+            matches = []
+            for order in reversed(self.orders.get(account_id_key, [])):
+                detail = order['OrderDetail'][0]
+                placed = datetime.datetime.fromtimestamp(detail['placedTime'] / 1000, MARKET_TIMEZONE).date()
+                if ((marker is not None and int(order['orderId']) >= marker)
+                        or (status and detail['status'] != status)
+                        or (from_date and placed < from_date) or (to_date and placed > to_date)):
+                    continue
+                matches.append(json.loads(json.dumps(order)))
+                if len(matches) > count:
+                    break
+
+        response = {'Order': matches[:count]}
+        if len(matches) > count:
+            response['marker'] = matches[count - 1]['orderId']
+        return {'OrdersResponse': response}
+
+    def _handler_class(self):
+        """
+        Build the request handler bound to this server
+        """
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; without this, delayed ACKs add ~40ms per request
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: str, content_type: str):
+                data = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                path = parsed.path
+                query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+                endpoint = '/v1/market/quote' if path.startswith('/v1/market/quote/') else path.replace('.json', '')
+                with server._counts_lock:
+                    server.request_counts[endpoint] += 1
+                    failing = server.outage or server.failures[endpoint] > 0
+                    if server.failures[endpoint] > 0:
+                        server.failures[endpoint] -= 1
+                if server.latency:
+                    time.sleep(server.latency)
+                if failing and not path.startswith('/oauth/'):
+                    self._send(503, '{"Error": {"message": "Service unavailable"}}', 'application/json')
+                    return
+
+                authorization = self.headers.get('Authorization', '')
+                with server._counts_lock:
+                    rejected = any(f'oauth_token="{token}"' in authorization for token in server.rejected_tokens)
+                    inactive = [token for token in server.inactive_tokens if f'oauth_token="{token}"' in authorization]
+                if path.startswith('/oauth/'):
+                    if path in ('/oauth/request_token', '/oauth/access_token'):
+                        self._send(200, 'oauth_token=mockToken&oauth_token_secret=mockSecret'
+                                        '&oauth_callback_confirmed=true', 'application/x-www-form-urlencoded')
+                    elif rejected:
+                        self._send(401, 'oauth_problem=token_expired', 'text/plain')
+                    else:
+                        with server._counts_lock:
+                            server.inactive_tokens.difference_update(inactive)
+                        self._send(200, 'Access Token has been renewed', 'text/plain')
+                    return
+
+                if not authorization.startswith('OAuth'):
+                    self._send(401, '{"Error": {"message": "oauth_problem=parameter_absent"}}', 'application/json')
+                    return
+                if rejected:
+                    self._send(401, '{"Error": {"message": "oauth_problem=token_expired"}}', 'application/json')
+                    return
+                if inactive:
+                    self._send(401, '{"Error": {"message": "oauth_problem=token_rejected"}}', 'application/json')
+                    return
+
+                as_json = path.endswith('.json')
+                response = server.route(path[:-len('.json')] if as_json else path, query)
+                if response is None:
+                    self._send(404, '{"Error": {"message": "Not found"}}', 'application/json')
+                elif as_json:
+                    self._send(200, json.dumps(response), 'application/json')
+                else:
+                    (tag, body), = response.items()
+                    self._send(200, _to_xml(tag, body), 'application/xml')
+
+        return Handler
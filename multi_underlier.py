@@ -0,0 +1,122 @@
+"""
+This module implements the multi-underlier straddle runner.
+Each tick quotes the whole basket in batched get_market_quote calls (25
+symbols per request), then fetches the at-the-money chain of every underlier
+concurrently and returns one BasketSnapshot for all of them.
+"""
+
+import asyncio
+import math
+import time
+from typing import Dict, Any, Iterable, Optional
+
+import metrics
+from async_client import AsyncClient
+from option_models import BasketSnapshot, ChainSnapshot
+from quote_service import QuoteService
+from spy_strategy import StraddleStrategy
+
+
+class MultiUnderlierRunner:
+    """
+    Runs the straddle strategy over a basket of underliers in one process
+    """
+
+    def __init__(self, client, symbols: Iterable[str], max_workers: int = 8,
+                 strike_increments: Optional[Dict[str, float]] = None):
+        """
+        Initialize the runner
+
+        Args:
+            client: An instance of Client
+            symbols: The underliers to evaluate each tick
+            max_workers: Maximum number of chain requests in flight at once
+            strike_increments: Optional strike spacing per symbol (defaults to $1)
+        """
+        strike_increments = {symbol.upper(): increment for symbol, increment in (strike_increments or {}).items()}
+        self.client = client
+        self.symbols = list(dict.fromkeys(symbol.strip().upper() for symbol in symbols if symbol.strip()))
+        self.strategies = {symbol: StraddleStrategy(client, symbol, strike_increments.get(symbol, 1.0))
+                           for symbol in self.symbols}
+        self.quote_service = QuoteService(client, coalesce_window=0)
+        self.async_client = AsyncClient(client, max_workers=max_workers)
+        self.clock = time.time
+        self.latest = None
+
+    def run_strategy(self) -> BasketSnapshot:
+        """
+        Evaluate the basket once from synchronous code
+        """
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self.run_strategy_async())
+        finally:
+            loop.close()
+
+    async def run_strategy_async(self) -> BasketSnapshot:
+        """
+        Evaluate the basket on an event loop:
+        1. Quote every underlier in batched requests
+        2. Fetch the ATM chain of every quoted underlier concurrently
+        3. Display the basket
+        """
+        loop = asyncio.get_running_loop()
+        with metrics.span('basket.quote'):
+            quotes = await loop.run_in_executor(None, self.quote_service.get_quotes, self.symbols)
+
+        with metrics.span('basket.chains'):
+            results = await asyncio.gather(*(self._evaluate(self.strategies[symbol], quotes.get(symbol))
+                                             for symbol in self.symbols))
+
+        self.latest = BasketSnapshot(
+            timestamp=self.clock(),
+            snapshots=tuple(snapshot for snapshot in results if snapshot is not None),
+            failed=tuple(symbol for symbol, snapshot in zip(self.symbols, results) if snapshot is None),
+        )
+        self._display_basket()
+        return self.latest
+
+    async def _evaluate(self, strategy: StraddleStrategy, quote: Optional[Dict[str, Any]]) -> Optional[ChainSnapshot]:
+        """
+        Fetch and process the ATM chain of one underlier from its batched quote
+        """
+        if not quote or not quote.get('last_price'):
+            print(f"Failed to get current price for {strategy.symbol}")
+            strategy.option_data = None
+            return None
+
+        strategy.spot_price = quote['last_price']
+        try:
+            option_chains = await self.async_client.get_option_chains(
+                symbol=strategy.symbol,
+                strike_price=strategy._nearest_strike(strategy.spot_price)
+            )
+        except Exception as e:
+            print(f"Error getting option chains for {strategy.symbol}: {e}")
+            strategy.option_data = None
+            return None
+
+        strategy.option_data = strategy._process_option_chain(option_chains)
+        return strategy.option_data
+
+    def _display_basket(self):
+        """
+        Display one line per underlier
+        """
+        print("\n===== STRADDLE BASKET =====")
+        print(f"{'Symbol':<8}{'Spot':>10}{'Strike':>9}{'Straddle':>10}{'Move %':>8}{'DTE':>5}")
+        for snapshot in self.latest.snapshots:
+            straddle = snapshot.straddle
+            move = straddle.last_price / snapshot.spot_price * 100 if snapshot.spot_price else math.nan
+            print(f"{snapshot.underlier:<8}{snapshot.spot_price:>10.2f}{straddle.strike_price:>9.2f}"
+                  f"{straddle.last_price:>10.2f}{move:>8.2f}{snapshot.days_to_expiry if snapshot.days_to_expiry is not None else '':>5}")
+        if self.latest.failed:
+            print(f"No data: {', '.join(self.latest.failed)}")
+        print("===========================")
+
+    def close(self):
+        """
+        Stop the worker threads
+        """
+        self.quote_service.shutdown()
+        self.async_client.close()
@@ -0,0 +1,281 @@
+"""
+This module defines the compact, typed records produced by the option strategies.
+The API payload is parsed once into numeric fields (NaN for missing prices,
+None for missing counts and dates) and serialized with a direct to_dict/to_json path.
+"""
+
+import dataclasses
+import datetime
+import json
+import math
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
+
+NAN = float('nan')
+GREEK_NAMES = ('delta', 'gamma', 'theta', 'vega', 'iv')
+
+
+def to_float(value) -> float:
+    """
+    Convert an API value to a float, returning NaN when it is missing or not numeric
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+def to_int(value) -> Optional[int]:
+    """
+    Convert an API value to an int, returning None when it is missing or not numeric
+    """
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def as_list(value) -> List[Any]:
+    """
+    Normalize an API field that holds one object or a list of them
+    """
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def nearest_strike(price: float, increment: float = 1.0) -> float:
+    """
+    Get the listed strike closest to a price, so requests near the same price send
+    identical (cacheable) chain requests
+    """
+    return round(round(float(price) / increment) * increment, 2)
+
+
+def json_number(value: float) -> Optional[float]:
+    """
+    Convert a float to a JSON-safe value (NaN and infinities become None)
+    """
+    return value if math.isfinite(value) else None
+
+
+@dataclass(frozen=True)
+class OptionQuote:
+    """
+    A single call or put quote
+    """
+    __slots__ = ('symbol', 'strike_price', 'last_price', 'bid', 'ask', 'volume', 'open_interest',
+                 'delta', 'gamma', 'theta', 'vega', 'iv')
+
+    symbol: str
+    strike_price: float
+    last_price: float
+    bid: float
+    ask: float
+    volume: Optional[int]
+    open_interest: Optional[int]
+    delta: float
+    gamma: float
+    theta: float
+    vega: float
+    iv: float
+
+    @classmethod
+    def from_api(cls, option: Dict[str, Any]) -> 'OptionQuote':
+        """
+        Parse a Call or Put entry of an OptionPair
+        """
+        greeks = option.get('OptionGreeks') or {}
+        return cls(
+            symbol=str(option.get('displaySymbol', option.get('symbol', ''))),
+            strike_price=to_float(option.get('strikePrice')),
+            last_price=to_float(option.get('lastPrice')),
+            bid=to_float(option.get('bid')),
+            ask=to_float(option.get('ask')),
+            volume=to_int(option.get('volume')),
+            open_interest=to_int(option.get('openInterest')),
+            delta=to_float(greeks.get('delta')),
+            gamma=to_float(greeks.get('gamma')),
+            theta=to_float(greeks.get('theta')),
+            vega=to_float(greeks.get('vega')),
+            iv=to_float(greeks.get('iv')),
+        )
+
+    @property
+    def mid(self) -> float:
+        """
+        The midpoint of the bid and ask
+        """
+        return (self.bid + self.ask) / 2
+
+    @property
+    def has_greeks(self) -> bool:
+        """
+        Whether any Greek is available
+        """
+        return not all(math.isnan(value) for value in (self.delta, self.gamma, self.theta, self.vega, self.iv))
+
+    def with_greeks(self, greeks: Dict[str, float]) -> 'OptionQuote':
+        """
+        Get a copy with the missing (NaN) Greeks taken from `greeks`; API values are kept
+        """
+        missing = {name: value for name, value in greeks.items()
+                   if name in GREEK_NAMES and math.isnan(getattr(self, name))}
+        return dataclasses.replace(self, **missing) if missing else self
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the quote to a JSON-ready dict
+        """
+        greeks = None
+        if self.has_greeks:
+            greeks = {
+                'delta': json_number(self.delta),
+                'gamma': json_number(self.gamma),
+                'theta': json_number(self.theta),
+                'vega': json_number(self.vega),
+                'iv': json_number(self.iv),
+            }
+        return {
+            'symbol': self.symbol,
+            'strike_price': json_number(self.strike_price),
+            'last_price': json_number(self.last_price),
+            'bid': json_number(self.bid),
+            'ask': json_number(self.ask),
+            'volume': self.volume,
+            'open_interest': self.open_interest,
+            'greeks': greeks,
+        }
+
+
+@dataclass(frozen=True)
+class Straddle:
+    """
+    A long straddle built from a call and put at the same strike
+    """
+    __slots__ = ('symbol', 'strike_price', 'last_price', 'bid', 'ask',
+                 'break_even_lower', 'break_even_upper', 'break_even_distance')
+
+    symbol: str
+    strike_price: float
+    last_price: float
+    bid: float
+    ask: float
+    break_even_lower: float
+    break_even_upper: float
+    break_even_distance: float
+
+    @classmethod
+    def from_quotes(cls, underlier: str, call: OptionQuote, put: OptionQuote) -> 'Straddle':
+        """
+        Combine a call and put quote into a straddle
+        """
+        strike_price = call.strike_price if not math.isnan(call.strike_price) else put.strike_price
+        last_price = round(call.last_price + put.last_price, 2)
+        return cls(
+            symbol=f"{underlier} {strike_price} Straddle",
+            strike_price=strike_price,
+            last_price=last_price,
+            bid=round(call.bid + put.bid, 2),
+            ask=round(call.ask + put.ask, 2),
+            break_even_lower=round(strike_price - last_price, 2),
+            break_even_upper=round(strike_price + last_price, 2),
+            break_even_distance=last_price,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the straddle to a JSON-ready dict
+        """
+        return {
+            'symbol': self.symbol,
+            'strike_price': json_number(self.strike_price),
+            'last_price': json_number(self.last_price),
+            'bid': json_number(self.bid),
+            'ask': json_number(self.ask),
+            'break_even_lower': json_number(self.break_even_lower),
+            'break_even_upper': json_number(self.break_even_upper),
+            'break_even_distance': json_number(self.break_even_distance),
+        }
+
+
+@dataclass(frozen=True)
+class ChainSnapshot:
+    """
+    The at-the-money call, put and straddle of one strategy tick
+    """
+    __slots__ = ('underlier', 'spot_price', 'expiry_date', 'days_to_expiry', 'timestamp',
+                 'call', 'put', 'straddle')
+
+    underlier: str
+    spot_price: float
+    expiry_date: Optional[datetime.date]
+    days_to_expiry: Optional[int]
+    timestamp: float
+    call: OptionQuote
+    put: OptionQuote
+    straddle: Straddle
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the snapshot to a JSON-ready dict
+        """
+        return {
+            'underlier': self.underlier,
+            'timestamp': int(self.timestamp),
+            'spot_price': json_number(self.spot_price),
+            'expiry_date': self.expiry_date.strftime('%Y-%m-%d') if self.expiry_date else 'Unknown',
+            'days_to_expiry': self.days_to_expiry,
+            'call': self.call.to_dict(),
+            'put': self.put.to_dict(),
+            'straddle': self.straddle.to_dict(),
+        }
+
+    def to_json(self) -> str:
+        """
+        Serialize the snapshot to a compact JSON string
+        """
+        return json.dumps(self.to_dict(), separators=(',', ':'))
+
+
+@dataclass(frozen=True)
+class BasketSnapshot:
+    """
+    The chain snapshots of every underlier evaluated in one multi-underlier tick
+    """
+    __slots__ = ('timestamp', 'snapshots', 'failed')
+
+    timestamp: float
+    snapshots: Tuple[ChainSnapshot, ...]
+    failed: Tuple[str, ...]  # underliers without a usable quote or chain this tick
+
+    def get(self, underlier: str) -> Optional[ChainSnapshot]:
+        """
+        Get the snapshot of one underlier
+        """
+        for snapshot in self.snapshots:
+            if snapshot.underlier == underlier:
+                return snapshot
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the basket to a JSON-ready dict; per-underlier tick times are
+        dropped so unchanged quotes keep the payload unchanged
+        """
+        underliers = []
+        for snapshot in self.snapshots:
+            data = snapshot.to_dict()
+            del data['timestamp']
+            underliers.append(data)
+        return {
+            'timestamp': int(self.timestamp),
+            'underliers': underliers,
+            'failed': list(self.failed),
+        }
+
+    def to_json(self) -> str:
+        """
+        Serialize the basket to a compact JSON string
+        """
+        return json.dumps(self.to_dict(), separators=(',', ':'))
@@ -0,0 +1,381 @@
+"""
+This module implements an incremental order-book monitor.
+list_orders is polled for every account concurrently into an in-memory book
+keyed by orderId. Each order is reduced to a fingerprint (status and filled
+quantity), so a poll only touches orders whose fingerprint changed and
+publishes fills, cancels and new orders as events. Polls read the newest
+orders until they reach a known one, plus the open orders; older history is
+backfilled a few pages per poll from the last-seen marker.
+"""
+
+import collections
+import datetime
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+import metrics
+from history_store import MARKET_TIMEZONE
+from option_models import as_list, to_float, json_number
+
+# Orders per list_orders request (the API maximum)
+PAGE_SIZE = 100
+# Older history pages fetched per poll until the backfill reaches the end
+BACKFILL_PAGES = 5
+# Events kept for late subscribers
+MAX_EVENTS = 1000
+# Seconds between polls of the tail mode and the web UI job
+POLL_INTERVAL = 5
+
+CANCEL_STATUSES = frozenset(('CANCELLED', 'EXPIRED', 'REJECTED'))
+TERMINAL_STATUSES = CANCEL_STATUSES | {'EXECUTED'}
+
+
+@dataclass(frozen=True)
+class OrderRecord:
+    """
+    One order of one account, reduced to the fields the monitor diffs and displays
+    """
+    __slots__ = ('account_id', 'order_id', 'symbol', 'action', 'status', 'ordered', 'filled', 'price', 'placed_time')
+
+    account_id: str
+    order_id: str
+    symbol: str
+    action: str
+    status: str
+    ordered: float
+    filled: float
+    price: float
+    placed_time: float  # Unix seconds
+
+    @property
+    def fingerprint(self) -> Tuple[str, float]:
+        return self.status, self.filled
+
+    @property
+    def is_open(self) -> bool:
+        return self.status not in TERMINAL_STATUSES
+
+    @classmethod
+    def from_api(cls, account_id: str, order: Dict[str, Any]) -> 'OrderRecord':
+        """
+        Parse one entry of OrdersResponse.Order
+        """
+        details = as_list(order.get('OrderDetail'))
+        detail = details[0] if details else {}
+        instruments = [instrument for entry in details for instrument in as_list(entry.get('Instrument'))]
+
+        def total(field):
+            return sum(value for value in (to_float(instrument.get(field)) for instrument in instruments)
+                       if value == value)
+
+        price = to_float(detail.get('limitPrice'))
+        if not price > 0 and instruments:
+            price = to_float(instruments[0].get('averageExecutionPrice'))
+        return cls(
+            account_id=account_id,
+            order_id=str(order.get('orderId', '')),
+            symbol=' / '.join(str(instrument.get('symbolDescription')
+                                  or (instrument.get('Product') or {}).get('symbol', '')) for instrument in instruments),
+            action=' / '.join(str(instrument.get('orderAction', '')) for instrument in instruments),
+            status=str(detail.get('status', '')).upper(),
+            ordered=total('orderedQuantity'),
+            filled=total('filledQuantity'),
+            price=price,
+            placed_time=to_float(detail.get('placedTime')) / 1000.0,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'account_id': self.account_id,
+            'order_id': self.order_id,
+            'symbol': self.symbol,
+            'action': self.action,
+            'status': self.status,
+            'ordered': json_number(self.ordered),
+            'filled': json_number(self.filled),
+            'price': json_number(self.price),
+            'placed_time': json_number(self.placed_time),
+            'open': self.is_open,
+        }
+
+
+@dataclass(frozen=True)
+class OrderEvent:
+    """
+    A new order, a (partial) fill or a cancel observed by the monitor
+    """
+    __slots__ = ('sequence', 'kind', 'timestamp', 'order', 'filled_delta')
+
+    sequence: int
+    kind: str  # 'new', 'fill' or 'cancel'
+    timestamp: float
+    order: OrderRecord
+    filled_delta: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'sequence': self.sequence, 'kind': self.kind, 'timestamp': self.timestamp,
+                'filled_delta': self.filled_delta, 'order': self.order.to_dict()}
+
+    def describe(self) -> str:
+        order = self.order
+        when = datetime.datetime.fromtimestamp(self.timestamp, MARKET_TIMEZONE).strftime('%H:%M:%S')
+        detail = f"+{self.filled_delta:g} ({order.filled:g}/{order.ordered:g})" if self.kind == 'fill' else order.status
+        return f"{when} {self.kind.upper():<6} {order.account_id} #{order.order_id} {order.action} {order.symbol} {detail}"
+
+
+class OrderBook:
+    """
+    Orders keyed by (account, orderId) with an index of the open ones
+    """
+
+    def __init__(self):
+        self.orders = {}
+        self._open = collections.defaultdict(set)  # account_id -> open order ids
+        self.revision = 0  # bumped whenever a stored order changes
+
+    def __len__(self) -> int:
+        return len(self.orders)
+
+    def get(self, account_id: str, order_id: str) -> Optional[OrderRecord]:
+        return self.orders.get((account_id, order_id))
+
+    def is_unchanged(self, record: OrderRecord) -> bool:
+        """
+        Check whether the book already holds this order with the same fingerprint
+        """
+        known = self.orders.get((record.account_id, record.order_id))
+        return known is not None and known.fingerprint == record.fingerprint
+
+    def open_orders(self, account_id: str) -> List[OrderRecord]:
+        return [self.orders[(account_id, order_id)] for order_id in self._open.get(account_id, ())]
+
+    def apply(self, record: OrderRecord, announce_new: bool) -> List[Tuple[str, float]]:
+        """
+        Store an order and describe what changed
+
+        Args:
+            record: The order as just listed
+            announce_new: Whether an order the book has never seen counts as new
+                          (it does not while loading history)
+
+        Returns:
+            (kind, filled_delta) pairs; empty when nothing worth publishing changed
+        """
+        key = (record.account_id, record.order_id)
+        known = self.orders.get(key)
+        if known is not None and known.fingerprint == record.fingerprint:
+            return []
+        self.orders[key] = record
+        self.revision += 1
+        if record.is_open:
+            self._open[record.account_id].add(record.order_id)
+        else:
+            self._open[record.account_id].discard(record.order_id)
+
+        if known is None and not announce_new:
+            return []
+        changes = [('new', 0.0)] if known is None else []
+        filled_before = known.filled if known is not None else 0.0
+        if record.filled > filled_before:
+            changes.append(('fill', record.filled - filled_before))
+        if record.status in CANCEL_STATUSES and (known is None or known.status not in CANCEL_STATUSES):
+            changes.append(('cancel', 0.0))
+        return changes
+
+
+class _AccountCursor:
+    """
+    Per-account polling state: when monitoring started and where the history backfill stopped
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self.backfill_marker = None
+
+
+class OrderMonitor:
+    """
+    Polls the orders of every account and publishes what changed
+    """
+
+    def __init__(self, client, max_workers: int = 8, page_size: int = PAGE_SIZE,
+                 backfill_pages: int = BACKFILL_PAGES, max_events: int = MAX_EVENTS,
+                 clock: Callable[[], float] = time.time):
+        """
+        Initialize the monitor
+
+        Args:
+            client: An instance of Client
+            max_workers: Maximum number of accounts polled at once
+            page_size: Orders per list_orders request
+            backfill_pages: Older history pages fetched per poll
+            max_events: Events kept for late subscribers
+            clock: Time source for event timestamps
+        """
+        self.client = client
+        self.page_size = page_size
+        self.backfill_pages = backfill_pages
+        self.book = OrderBook()
+        self.events = collections.deque(maxlen=max_events)
+        self.sequence = 0
+        self.requests = 0
+        self.clock = clock
+        self._cursors = {}
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='order-monitor')
+
+    def _list(self, account_id_key: str, account_id: str, **params) -> Tuple[List[OrderRecord], Optional[str]]:
+        """
+        Fetch one page of orders
+
+        Returns:
+            (orders, marker of the next page or None)
+        """
+        self.requests += 1
+        response = self.client.list_orders(account_id_key, count=self.page_size, **params) or {}
+        orders = response.get('OrdersResponse') or {}
+        records = [OrderRecord.from_api(account_id, order) for order in as_list(orders.get('Order'))]
+        return records, (orders.get('marker') or None) if records else None
+
+    def _poll_account(self, account: Dict[str, Any]) -> List[Tuple[List[OrderRecord], bool]]:
+        """
+        Fetch what may have changed in one account since the last poll (runs on a worker thread;
+        the book is only read here)
+
+        Returns:
+            Batches of (orders, announce_new)
+        """
+        account_id_key = account['accountIdKey']
+        account_id = str(account.get('accountId', account_id_key))
+        cursor = self._cursors.setdefault(account_id_key, _AccountCursor())
+        first = not cursor.loaded
+        batches = []
+        seen = set()
+
+        def fetch(announce, **params):
+            records, marker = self._list(account_id_key, account_id, **params)
+            batches.append((records, announce))
+            seen.update(record.order_id for record in records)
+            return records, marker
+
+        # 1. Newest orders, until a page reaches an order the book already holds unchanged
+        records, marker = fetch(not first)
+        if first:
+            cursor.backfill_marker = marker
+        else:
+            while marker and not any(self.book.is_unchanged(record) for record in records):
+                records, marker = fetch(True, marker=marker)
+
+        # 2. Every open order, wherever it sits in the history
+        records, marker = fetch(not first, status='OPEN')
+        while marker:
+            records, marker = fetch(not first, status='OPEN', marker=marker)
+
+        # 3. Orders that were open but were listed in neither: re-read the days they were placed on
+        if not first:
+            days = sorted({datetime.datetime.fromtimestamp(record.placed_time, MARKET_TIMEZONE).date()
+                           for record in self.book.open_orders(account_id) if record.order_id not in seen})
+            for day in days:
+                start = datetime.datetime.combine(day, datetime.time(0, 0))
+                window = {'from_date': start, 'to_date': start + datetime.timedelta(days=1)}
+                records, marker = fetch(False, **window)
+                while marker:
+                    records, marker = fetch(False, marker=marker, **window)
+
+        # 4. Older history, a few pages per poll from where the backfill stopped
+        for _ in range(self.backfill_pages):
+            if not cursor.backfill_marker:
+                break
+            records, cursor.backfill_marker = fetch(False, marker=cursor.backfill_marker)
+
+        cursor.loaded = True
+        return batches
+
+    def poll(self) -> List[OrderEvent]:
+        """
+        Poll every open account concurrently and publish the changes
+
+        Returns:
+            The events of this poll
+        """
+        with metrics.span('orders.poll'):
+            accounts = [account for account in as_list(self.client.get_account())
+                        if str(account.get('accountStatus', 'ACTIVE')).upper() != 'CLOSED']
+            results = list(self._executor.map(self._poll_account, accounts))
+
+        now = self.clock()
+        events = []
+        with metrics.span('orders.diff'), self._condition:
+            for batches in results:
+                for records, announce in batches:
+                    for record in records:
+                        for kind, filled_delta in self.book.apply(record, announce):
+                            self.sequence += 1
+                            events.append(OrderEvent(self.sequence, kind, now, record, filled_delta))
+            self.events.extend(events)
+            if events:
+                self._condition.notify_all()
+        return events
+
+    def events_since(self, sequence: int) -> List[OrderEvent]:
+        """
+        Get the retained events newer than a sequence number
+        """
+        with self._condition:
+            return [event for event in self.events if event.sequence > sequence]
+
+    def wait_for_events(self, sequence: int, timeout: float) -> List[OrderEvent]:
+        """
+        Wait until events newer than a sequence number are published (empty on timeout)
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.sequence > sequence, timeout=timeout)
+            return [event for event in self.events if event.sequence > sequence]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get the open orders and recent events as a JSON-ready dict
+        """
+        with self._condition:
+            open_orders = [record for record in self.book.orders.values() if record.is_open]
+            recent = list(self.events)[-50:]
+            return {
+                'orders': len(self.book),
+                'open': [record.to_dict() for record in sorted(open_orders, key=lambda r: -r.placed_time)],
+                'events': [event.to_dict() for event in recent],
+                'sequence': self.sequence,
+                'revision': self.book.revision,
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), separators=(',', ':'))
+
+    def tail(self, interval: float = POLL_INTERVAL):
+        """
+        Print the open orders, then one line per event as polls find them (until interrupted)
+        """
+        self.poll()
+        print(f"Tracking {len(self.book)} orders")
+        for record in self.book.orders.values():
+            if record.is_open:
+                print(f"OPEN   {record.account_id} #{record.order_id} {record.action} {record.symbol} "
+                      f"{record.filled:g}/{record.ordered:g} @ {record.price:g}")
+        while True:
+            time.sleep(interval)
+            try:
+                events = self.poll()
+            except Exception as e:
+                print(f"Error polling orders: {e}")
+                continue
+            for event in events:
+                print(event.describe())
+
+    def close(self):
+        """
+        Stop the worker threads
+        """
+        self._executor.shutdown(wait=False)
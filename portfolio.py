@@ -0,0 +1,368 @@
+"""
+This module implements a portfolio risk aggregator over every account.
+Positions of all accounts are fetched concurrently, joined with batched
+underlier quotes and priced with the local Black-Scholes engine. Each tick
+reprices only the underliers whose quote moved, so a large multi-account
+book refreshes cheaply.
+"""
+
+import datetime
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+import metrics
+import pricing
+from option_models import as_list, to_float, json_number
+from quote_service import QuoteService
+
+# Contracts per equity option
+OPTION_MULTIPLIER = 100
+# Seconds before positions and balances are reloaded (which also re-solves every option's IV)
+RELOAD_INTERVAL = 300.0
+RISK_FIELDS = ('delta', 'gamma', 'theta', 'vega', 'market_value', 'pnl')
+
+
+@dataclass(frozen=True)
+class Position:
+    """
+    One position of one account
+    """
+    __slots__ = ('account_id', 'symbol', 'underlier', 'security_type', 'quantity', 'multiplier',
+                 'cost', 'price', 'is_call', 'strike', 'expiry')
+
+    account_id: str
+    symbol: str
+    underlier: str
+    security_type: str
+    quantity: float  # signed: negative for short positions
+    multiplier: float
+    cost: float  # signed cost basis (negative for credits received)
+    price: float  # last price reported by the portfolio
+    is_call: Optional[bool]
+    strike: float
+    expiry: Optional[datetime.date]
+
+    @property
+    def is_option(self) -> bool:
+        return self.security_type == 'OPTN'
+
+    @classmethod
+    def from_api(cls, account_id: str, position: Dict[str, Any]) -> 'Position':
+        """
+        Parse one entry of PortfolioResponse.AccountPortfolio.Position
+        """
+        product = position.get('Product') or {}
+        security_type = str(product.get('securityType', 'EQ')).upper()
+        quantity = abs(to_float(position.get('quantity')))
+        if str(position.get('positionType', 'LONG')).upper() == 'SHORT':
+            quantity = -quantity
+        multiplier = OPTION_MULTIPLIER if security_type == 'OPTN' else 1
+
+        price = to_float((position.get('Quick') or {}).get('lastTrade'))
+        if not price > 0:
+            market_value = to_float(position.get('marketValue'))
+            price = abs(market_value / (quantity * multiplier)) if quantity else math.nan
+
+        expiry = None
+        is_call = None
+        if security_type == 'OPTN':
+            is_call = str(product.get('callPut', '')).upper() == 'CALL'
+            try:
+                year = int(product['expiryYear'])
+                expiry = datetime.date(year + 2000 if year < 100 else year,
+                                       int(product['expiryMonth']), int(product['expiryDay']))
+            except (KeyError, TypeError, ValueError):
+                expiry = None
+
+        return cls(
+            account_id=account_id,
+            symbol=str(position.get('symbolDescription', product.get('symbol', ''))),
+            underlier=str(product.get('symbol', '')).upper(),
+            security_type=security_type,
+            quantity=quantity,
+            multiplier=multiplier,
+            cost=to_float(position.get('pricePaid')) * quantity * multiplier,
+            price=price,
+            is_call=is_call,
+            strike=to_float(product.get('strikePrice')),
+            expiry=expiry,
+        )
+
+
+def parse_balance(account: Dict[str, Any], balance: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract buying power, cash and account value from a BalanceResponse
+    """
+    computed = balance.get('Computed') or {}
+    margin = to_float(computed.get('marginBuyingPower'))
+    return {
+        'account_id': str(account.get('accountId', account.get('accountIdKey', ''))),
+        'description': account.get('accountDesc') or account.get('accountName') or '',
+        'buying_power': margin if math.isfinite(margin) else to_float(computed.get('cashBuyingPower')),
+        'cash': to_float(computed.get('cashAvailableForInvestment')),
+        'account_value': to_float((computed.get('RealTimeValues') or {}).get('totalAccountValue')),
+    }
+
+
+class UnderlierBook:
+    """
+    Every position on one underlier, held as arrays so the whole group reprices in one pass
+    """
+
+    def __init__(self, underlier: str, positions: List[Position]):
+        self.underlier = underlier
+        self.positions = positions
+        self.weight = np.array([p.quantity * p.multiplier for p in positions], dtype=np.float64)
+        self.cost = np.array([p.cost for p in positions], dtype=np.float64)
+        self.reported = np.array([p.price for p in positions], dtype=np.float64)
+        self.is_option = np.array([p.is_option for p in positions])
+        self.is_call = np.array([bool(p.is_call) for p in positions])
+        self.strike = np.array([p.strike for p in positions], dtype=np.float64)
+        self.expiry = [p.expiry for p in positions]
+        self.iv = np.full(len(positions), np.nan)
+        self.spot = None
+        self.totals = dict.fromkeys(RISK_FIELDS, 0.0)
+        self.unpriced = 0
+
+    def _years(self, now: float) -> np.ndarray:
+        return np.array([pricing.years_to_expiry(expiry, now) if expiry else np.nan for expiry in self.expiry])
+
+    def calibrate(self, spot: float, now: float):
+        """
+        Solve each option's IV from the price the portfolio reported, against the spot at load time
+        """
+        years = self._years(now)
+        options = self.is_option & np.isfinite(years)
+        self.iv[options] = pricing.implied_volatility(self.reported[options], spot, self.strike[options],
+                                                      years[options], self.is_call[options])
+
+    def reprice(self, spot: float, now: float):
+        """
+        Reprice every position at a new underlier price and rebuild this book's totals.
+        Stock is worth spot with a delta of one; options are repriced at their calibrated IV,
+        and options without one keep their reported price and contribute no Greeks.
+        """
+        count = len(self.positions)
+        price = np.where(self.is_option, self.reported, spot)
+        greeks = {'delta': np.where(self.is_option, np.nan, 1.0),
+                  'gamma': np.zeros(count), 'theta': np.zeros(count), 'vega': np.zeros(count)}
+
+        priced = self.is_option & np.isfinite(self.iv)
+        if priced.any():
+            years = self._years(now)[priced]
+            model = pricing.bs_greeks(spot, self.strike[priced], years, self.iv[priced], self.is_call[priced])
+            price[priced] = model['price']
+            for name in greeks:
+                greeks[name][priced] = model[name]
+        unpriced = self.is_option & ~priced
+        for name in greeks:
+            greeks[name][unpriced] = np.nan
+
+        market_value = self.weight * price
+        totals = {name: float(np.nansum(self.weight * values)) for name, values in greeks.items()}
+        totals['market_value'] = float(np.nansum(market_value))
+        totals['pnl'] = float(np.nansum(market_value - self.cost))
+        self.totals = totals
+        self.unpriced = int(unpriced.sum())
+        self.spot = spot
+
+
+@dataclass(frozen=True)
+class PortfolioSnapshot:
+    """
+    Aggregated risk of every account at one tick
+    """
+    __slots__ = ('timestamp', 'totals', 'underliers', 'accounts', 'positions', 'repriced', 'unpriced')
+
+    timestamp: float
+    totals: Dict[str, float]
+    underliers: Tuple[Dict[str, Any], ...]  # per-underlier spot, position count and totals
+    accounts: Tuple[Dict[str, Any], ...]
+    positions: int
+    repriced: int  # positions repriced this tick
+    unpriced: int  # options without an implied volatility
+
+    @property
+    def buying_power(self) -> float:
+        return sum(account['buying_power'] for account in self.accounts if math.isfinite(account['buying_power']))
+
+    def to_dict(self) -> Dict[str, Any]:
+        def clean(record):
+            return {key: json_number(value) if isinstance(value, float) else value for key, value in record.items()}
+        return {
+            'timestamp': self.timestamp,
+            'totals': clean(self.totals),
+            'buying_power': json_number(self.buying_power),
+            'underliers': [clean(underlier) for underlier in self.underliers],
+            'accounts': [clean(account) for account in self.accounts],
+            'positions': self.positions,
+            'repriced': self.repriced,
+            'unpriced': self.unpriced,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), separators=(',', ':'))
+
+
+class PortfolioRiskAggregator:
+    """
+    Net Greeks, P&L and buying power across every account of the user
+    """
+
+    def __init__(self, client, max_workers: int = 8, reload_interval: float = RELOAD_INTERVAL):
+        """
+        Initialize the aggregator
+
+        Args:
+            client: An instance of Client
+            max_workers: Maximum number of account requests in flight at once
+            reload_interval: Seconds before positions and balances are fetched again
+        """
+        self.client = client
+        self.reload_interval = reload_interval
+        self.quote_service = QuoteService(client, coalesce_window=0)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='portfolio')
+        self.clock = time.time
+        self.books = {}  # underlier -> UnderlierBook
+        self.other = []  # positions that are not stock or options, carried at their reported price
+        self.accounts = ()
+        self.loaded_at = None
+        self.latest = None
+
+    def _fetch_account(self, account: Dict[str, Any]):
+        """
+        Fetch every page of positions and the balance of one account
+        """
+        account_id_key = account['accountIdKey']
+        balance = self.client.get_account_balance_details(account_id_key, account.get('accountType'))
+        positions = []
+        page, pages = 1, 1
+        while page <= pages:
+            response = self.client.get_positions(account_id_key, page_number=page if page > 1 else None)
+            for portfolio in as_list((response or {}).get('PortfolioResponse', {}).get('AccountPortfolio')):
+                pages = int(portfolio.get('totalPages') or 1)
+                positions.extend(Position.from_api(str(account.get('accountId', account_id_key)), position)
+                                 for position in as_list(portfolio.get('Position')))
+            page += 1
+        return positions, parse_balance(account, balance)
+
+    def load(self):
+        """
+        Fetch the positions and balances of every open account concurrently and rebuild the books
+        """
+        with metrics.span('portfolio.load'):
+            accounts = [account for account in as_list(self.client.get_account())
+                        if str(account.get('accountStatus', 'ACTIVE')).upper() != 'CLOSED']
+            results = list(self._executor.map(self._fetch_account, accounts))
+
+        grouped = {}
+        other = []
+        for positions, _ in results:
+            for position in positions:
+                if position.security_type in ('EQ', 'OPTN') and position.underlier:
+                    grouped.setdefault(position.underlier, []).append(position)
+                else:
+                    other.append(position)
+        self.books = {underlier: UnderlierBook(underlier, positions) for underlier, positions in grouped.items()}
+        self.other = other
+        self.accounts = tuple(balance for _, balance in results)
+        self.loaded_at = self.clock()
+
+    def refresh(self) -> PortfolioSnapshot:
+        """
+        Quote every underlier in batched requests and reprice only the books whose quote changed
+        """
+        now = self.clock()
+        reloaded = self.loaded_at is None or now - self.loaded_at >= self.reload_interval
+        if reloaded:
+            self.load()
+
+        with metrics.span('portfolio.quote'):
+            quotes = self.quote_service.get_quotes(list(self.books))
+
+        repriced = 0
+        with metrics.span('portfolio.reprice'):
+            for underlier, book in self.books.items():
+                spot = (quotes.get(underlier) or {}).get('last_price')
+                if not spot or (spot == book.spot and not reloaded):
+                    continue
+                if reloaded or book.spot is None:
+                    book.calibrate(spot, now)
+                book.reprice(spot, now)
+                repriced += len(book.positions)
+
+        self.latest = self._snapshot(now, repriced)
+        return self.latest
+
+    def _snapshot(self, now: float, repriced: int) -> PortfolioSnapshot:
+        """
+        Sum the per-underlier totals (plus positions carried at their reported price)
+        """
+        totals = dict.fromkeys(RISK_FIELDS, 0.0)
+        for book in self.books.values():
+            for name in RISK_FIELDS:
+                totals[name] += book.totals[name]
+        for position in self.other:
+            value = position.quantity * position.multiplier * position.price
+            if math.isfinite(value):
+                totals['market_value'] += value
+                totals['pnl'] += value - position.cost
+
+        underliers = tuple(
+            dict(underlier=book.underlier, spot=book.spot if book.spot is not None else math.nan,
+                 positions=len(book.positions), **book.totals)
+            for book in sorted(self.books.values(), key=lambda book: book.underlier)
+        )
+        return PortfolioSnapshot(
+            timestamp=now,
+            totals=totals,
+            underliers=underliers,
+            accounts=self.accounts,
+            positions=sum(len(book.positions) for book in self.books.values()) + len(self.other),
+            repriced=repriced,
+            unpriced=sum(book.unpriced for book in self.books.values()),
+        )
+
+    def run_strategy(self) -> PortfolioSnapshot:
+        """
+        Refresh and display the portfolio once
+        """
+        snapshot = self.refresh()
+        self._display_portfolio(snapshot)
+        return snapshot
+
+    def _display_portfolio(self, snapshot: PortfolioSnapshot):
+        """
+        Display one line per underlier, the net totals and each account's buying power
+        """
+        print("\n===== PORTFOLIO RISK =====")
+        header = f"{'Symbol':<8}{'Spot':>10}{'Pos':>5}{'Delta':>11}{'Gamma':>10}{'Theta':>10}{'Vega':>10}{'P&L':>12}"
+        print(header)
+        for row in snapshot.underliers:
+            print(f"{row['underlier']:<8}{row['spot']:>10.2f}{row['positions']:>5}{row['delta']:>11.1f}"
+                  f"{row['gamma']:>10.2f}{row['theta']:>10.2f}{row['vega']:>10.2f}{row['pnl']:>12.2f}")
+        totals = snapshot.totals
+        print('-' * len(header))
+        print(f"{'Net':<8}{'':>10}{snapshot.positions:>5}{totals['delta']:>11.1f}{totals['gamma']:>10.2f}"
+              f"{totals['theta']:>10.2f}{totals['vega']:>10.2f}{totals['pnl']:>12.2f}")
+        print(f"Market value: ${totals['market_value']:,.2f}")
+        for account in snapshot.accounts:
+            print(f"Buying power {account['account_id']} {account['description']}: ${account['buying_power']:,.2f}")
+        print(f"Total buying power: ${snapshot.buying_power:,.2f}")
+        if snapshot.unpriced:
+            print(f"{snapshot.unpriced} option position(s) without an implied volatility carry no Greeks")
+        print(f"Repriced {snapshot.repriced} of {snapshot.positions} positions")
+        print("==========================")
+
+    def close(self):
+        """
+        Stop the worker threads
+        """
+        self.quote_service.shutdown()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,259 @@
+"""
+This module implements a vectorized Black-Scholes engine.
+Prices, Greeks and implied volatilities are computed for whole arrays of
+contracts at once with NumPy, so a full chain is priced in one pass. Time to
+expiry is measured in fractional days up to the 4 p.m. ET close of the expiry
+date, which keeps same-day (0DTE) contracts accurate.
+"""
+
+import datetime
+import math
+from typing import Dict, Optional
+
+import numpy as np
+
+from history_store import MARKET_TIMEZONE
+
+SECONDS_PER_YEAR = 365.0 * 24 * 60 * 60
+EXPIRY_TIME = datetime.time(16, 0)
+# Floor on time to expiry (one minute) so contracts at the bell still have a defined volatility
+MIN_YEARS = 60.0 / SECONDS_PER_YEAR
+# Continuously compounded risk-free rate and dividend yield used when none is given
+DEFAULT_RATE = 0.0
+DEFAULT_DIVIDEND = 0.0
+# Implied volatility search bounds and tolerance (in price units)
+MIN_VOL = 1e-4
+MAX_VOL = 5.0
+IV_TOLERANCE = 1e-8
+IV_MAX_ITERATIONS = 60
+
+_INV_SQRT_2PI = 1.0 / math.sqrt(2.0 * math.pi)
+_SQRT_HALF = math.sqrt(0.5)
+
+
+def years_to_expiry(expiry_date: datetime.date, now: float) -> float:
+    """
+    Get the time from a Unix timestamp to the 4 p.m. ET close of an expiry date, in years
+    """
+    expiry = datetime.datetime.combine(expiry_date, EXPIRY_TIME, MARKET_TIMEZONE)
+    return max((expiry.timestamp() - now) / SECONDS_PER_YEAR, MIN_YEARS)
+
+
+def _erfc(x: np.ndarray) -> np.ndarray:
+    """
+    Complementary error function (Chebyshev fit, fractional error below 1.2e-7 everywhere,
+    so deep out-of-the-money tails keep their relative precision)
+    """
+    z = np.abs(x)
+    t = 1.0 / (1.0 + 0.5 * z)
+    poly = -z * z - 1.26551223 + t * (1.00002368 + t * (0.37409196 + t * (0.09678418 + t * (
+        -0.18628806 + t * (0.27886807 + t * (-1.13520398 + t * (1.48851587 + t * (
+            -0.82215223 + t * 0.17087277))))))))
+    result = t * np.exp(poly)
+    return np.where(x >= 0, result, 2.0 - result)
+
+
+def norm_cdf(x: np.ndarray) -> np.ndarray:
+    """
+    Standard normal cumulative distribution function
+    """
+    return 0.5 * _erfc(-np.asarray(x, dtype=np.float64) * _SQRT_HALF)
+
+
+def norm_pdf(x: np.ndarray) -> np.ndarray:
+    """
+    Standard normal density
+    """
+    x = np.asarray(x, dtype=np.float64)
+    return _INV_SQRT_2PI * np.exp(-0.5 * x * x)
+
+
+def _d1_d2(spot, strike, years, vol, rate, dividend):
+    sqrt_t = np.sqrt(years)
+    vol_sqrt_t = vol * sqrt_t
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d1 = (np.log(spot / strike) + (rate - dividend + 0.5 * vol * vol) * years) / vol_sqrt_t
+    return d1, d1 - vol_sqrt_t, sqrt_t
+
+
+def bs_price(spot, strike, years, vol, is_call, rate: float = DEFAULT_RATE,
+             dividend: float = DEFAULT_DIVIDEND) -> np.ndarray:
+    """
+    Black-Scholes price of European calls (is_call True) and puts; all arguments broadcast
+    """
+    spot, strike, years, vol = (np.asarray(value, dtype=np.float64) for value in (spot, strike, years, vol))
+    d1, d2, _ = _d1_d2(spot, strike, years, vol, rate, dividend)
+    spot_df = spot * np.exp(-dividend * years)
+    strike_df = strike * np.exp(-rate * years)
+    call = spot_df * norm_cdf(d1) - strike_df * norm_cdf(d2)
+    # Put from the same d1/d2 rather than via parity, so far-OTM puts keep their precision
+    put = strike_df * norm_cdf(-d2) - spot_df * norm_cdf(-d1)
+    return np.where(is_call, call, put)
+
+
+def bs_greeks(spot, strike, years, vol, is_call, rate: float = DEFAULT_RATE,
+              dividend: float = DEFAULT_DIVIDEND) -> Dict[str, np.ndarray]:
+    """
+    Black-Scholes price and Greeks in E*TRADE's conventions:
+    theta per calendar day, vega per volatility point (1%)
+
+    Returns:
+        Dict of arrays: price, delta, gamma, theta, vega
+    """
+    spot, strike, years, vol = (np.asarray(value, dtype=np.float64) for value in (spot, strike, years, vol))
+    d1, d2, sqrt_t = _d1_d2(spot, strike, years, vol, rate, dividend)
+    spot_df = spot * np.exp(-dividend * years)
+    strike_df = strike * np.exp(-rate * years)
+    n_d1 = norm_cdf(d1)
+    n_d2 = norm_cdf(d2)
+    pdf_d1 = norm_pdf(d1)
+
+    call = spot_df * n_d1 - strike_df * n_d2
+    put = strike_df * norm_cdf(-d2) - spot_df * norm_cdf(-d1)
+    decay = -spot_df * pdf_d1 * vol / (2.0 * sqrt_t)
+    call_theta = decay - rate * strike_df * n_d2 + dividend * spot_df * n_d1
+    put_theta = decay + rate * strike_df * (1.0 - n_d2) - dividend * spot_df * (1.0 - n_d1)
+
+    price = np.where(is_call, call, put)
+    # Gamma and vega do not depend on the side; broadcast them to the same shape as the rest
+    zeros = np.zeros_like(price)
+    return {
+        'price': price,
+        'delta': np.where(is_call, np.exp(-dividend * years) * n_d1, np.exp(-dividend * years) * (n_d1 - 1.0)),
+        'gamma': np.exp(-dividend * years) * pdf_d1 / (spot * vol * sqrt_t) + zeros,
+        'theta': np.where(is_call, call_theta, put_theta) / 365.0,
+        'vega': spot_df * pdf_d1 * sqrt_t / 100.0 + zeros,
+    }
+
+
+def implied_volatility(price, spot, strike, years, is_call, rate: float = DEFAULT_RATE,
+                       dividend: float = DEFAULT_DIVIDEND, tolerance: float = IV_TOLERANCE,
+                       max_iterations: int = IV_MAX_ITERATIONS) -> np.ndarray:
+    """
+    Solve Black-Scholes implied volatilities for arrays of option prices.
+
+    Every contract takes a Newton step on vega each iteration; steps that would
+    leave the contract's bisection bracket (or have no usable vega) bisect
+    instead, so the batch converges even for deep out-of-the-money and 0DTE quotes.
+
+    Returns:
+        Array of volatilities; NaN where the price is missing or outside the no-arbitrage bounds
+    """
+    price, spot, strike, years, is_call = np.broadcast_arrays(
+        *(np.asarray(value, dtype=np.float64) for value in (price, spot, strike, years, is_call)))
+    is_call = is_call.astype(bool)
+    spot_df = spot * np.exp(-dividend * years)
+    strike_df = strike * np.exp(-rate * years)
+    lower = np.where(is_call, np.maximum(spot_df - strike_df, 0.0), np.maximum(strike_df - spot_df, 0.0))
+    upper = np.where(is_call, spot_df, strike_df)
+    valid = np.isfinite(price) & (price > lower) & (price < upper) & (spot > 0) & (strike > 0)
+
+    out = np.full(price.shape, np.nan)
+    if not valid.any():
+        return out
+
+    price, spot, strike, years, is_call = (value[valid] for value in (price, spot, strike, years, is_call))
+    low = np.full(price.shape, MIN_VOL)
+    high = np.full(price.shape, MAX_VOL)
+    # Brenner-Subrahmanyam start (the at-the-money approximation)
+    vol = np.clip(np.sqrt(2.0 * math.pi / years) * price / spot, 0.05, 2.0)
+    active = np.ones(price.shape, dtype=bool)
+
+    for _ in range(max_iterations):
+        index = np.flatnonzero(active)
+        if not len(index):
+            break
+        v = vol[index]
+        d1, d2, sqrt_t = _d1_d2(spot[index], strike[index], years[index], v, rate, dividend)
+        model = bs_price(spot[index], strike[index], years[index], v, is_call[index], rate, dividend)
+        diff = model - price[index]
+
+        done = np.abs(diff) < tolerance
+        too_high = diff > 0
+        high[index] = np.where(too_high, v, high[index])
+        low[index] = np.where(too_high, low[index], v)
+
+        vega = spot[index] * np.exp(-dividend * years[index]) * norm_pdf(d1) * sqrt_t
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            newton = v - diff / vega
+        inside = np.isfinite(newton) & (newton > low[index]) & (newton < high[index])
+        vol[index] = np.where(done, v, np.where(inside, newton, 0.5 * (low[index] + high[index])))
+        active[index[done | (high[index] - low[index] < 1e-12)]] = False
+
+    out[valid] = vol
+    return out
+
+
+def option_mid(bid, ask, last) -> np.ndarray:
+    """
+    Price to solve IV from: the bid/ask mid when both sides are quoted, otherwise the last trade
+    """
+    bid, ask, last = (np.asarray(value, dtype=np.float64) for value in (bid, ask, last))
+    two_sided = np.isfinite(bid) & np.isfinite(ask) & (ask >= bid) & (ask > 0)
+    return np.where(two_sided, (bid + ask) / 2.0, np.where(last > 0, last, np.nan))
+
+
+def chain_greeks(chain: Dict[str, np.ndarray], spot: float, years: float, rate: float = DEFAULT_RATE,
+                 dividend: float = DEFAULT_DIVIDEND, overwrite: bool = False) -> Dict[str, np.ndarray]:
+    """
+    Fill the IV and Greek columns of a chain (from chain_analytics.load_chain_arrays) locally
+
+    Args:
+        chain: Columnar chain arrays
+        spot: The current underlier price
+        years: Time to expiry in years
+        rate: Risk-free rate
+        dividend: Dividend yield
+        overwrite: Replace API-provided values too, instead of only filling missing ones
+
+    Returns:
+        A new chain dict with call_/put_ iv, delta, gamma, theta and vega filled in
+    """
+    strike = chain['strike']
+    count = len(strike)
+    filled = dict(chain)
+    if not count:
+        return filled
+
+    # Solve calls and puts in one batch
+    strikes = np.concatenate([strike, strike])
+    is_call = np.concatenate([np.ones(count, dtype=bool), np.zeros(count, dtype=bool)])
+    prices = np.concatenate([option_mid(chain['call_bid'], chain['call_ask'], chain['call_last']),
+                             option_mid(chain['put_bid'], chain['put_ask'], chain['put_last'])])
+    vol = implied_volatility(prices, spot, strikes, years, is_call, rate, dividend)
+    greeks = bs_greeks(spot, strikes, years, vol, is_call, rate, dividend)
+    greeks['iv'] = vol
+
+    for name in ('iv', 'delta', 'gamma', 'theta', 'vega'):
+        for prefix, part in (('call', slice(0, count)), ('put', slice(count, None))):
+            column = f"{prefix}_{name}"
+            local = greeks[name][part]
+            existing = chain.get(column)
+            if existing is None or overwrite:
+                filled[column] = local
+            else:
+                filled[column] = np.where(np.isnan(existing), local, existing)
+    return filled
+
+
+def local_greeks(bid: float, ask: float, last: float, spot: float, strike: float, years: float,
+                 is_call: bool, rate: float = DEFAULT_RATE) -> Optional[Dict[str, float]]:
+    """
+    Compute the IV and Greeks of a single contract, or None if its price does not imply a volatility
+    """
+    price = option_mid(bid, ask, last)
+    vol = implied_volatility(price, spot, strike, years, is_call, rate)
+    if not np.isfinite(vol):
+        return None
+    greeks = bs_greeks(spot, strike, years, vol, is_call, rate)
+    return {'iv': float(vol), **{name: float(value) for name, value in greeks.items() if name != 'price'}}
+
+
+def fill_option_greeks(option, spot: float, years: float, is_call: bool, rate: float = DEFAULT_RATE):
+    """
+    Get an OptionQuote with any Greeks the API left out computed locally
+    """
+    if not any(math.isnan(getattr(option, name)) for name in ('delta', 'gamma', 'theta', 'vega', 'iv')):
+        return option
+    greeks = local_greeks(option.bid, option.ask, option.last_price, spot, option.strike_price, years, is_call, rate)
+    return option.with_greeks(greeks) if greeks else option
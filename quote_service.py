@@ -0,0 +1,200 @@
+"""
+This module implements a batched quote service on top of Client.get_market_quote.
+Symbols are split into E*TRADE's per-request limit, the chunks are fetched
+concurrently, and overlapping requests from concurrent callers are coalesced.
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Iterable, List, Optional
+
+# E*TRADE processes at most 25 symbols per quote request
+MAX_SYMBOLS_PER_REQUEST = 25
+
+
+def chunk_symbols(symbols: List[str], size: int = MAX_SYMBOLS_PER_REQUEST) -> List[List[str]]:
+    """
+    Split a list of symbols into chunks of at most `size` symbols
+    """
+    return [symbols[i:i + size] for i in range(0, len(symbols), size)]
+
+
+def _to_float(value) -> Optional[float]:
+    """
+    Convert an API value (number or numeric string) to a float, or None
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def extract_last_price(data: Dict[str, Any]) -> Optional[float]:
+    """
+    Extract the last traded price from a single QuoteData entry
+
+    Args:
+        data: One entry of QuoteResponse.QuoteData
+
+    Returns:
+        The last price as a float, or None if no price field is present
+    """
+    all_data = data.get('All', {})
+    intraday = data.get('Intraday', {})
+    for section, field in ((all_data, 'lastTrade'), (all_data, 'price'),
+                           (intraday, 'lastTrade'), (intraday, 'lastPrice'),
+                           (all_data, 'lastPrice')):
+        price = _to_float(section.get(field))
+        if price is not None:
+            return price
+    return None
+
+
+def normalize_quote(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normalize a QuoteData entry into a flat dict of numeric fields
+
+    Args:
+        data: One entry of QuoteResponse.QuoteData
+
+    Returns:
+        Dict with symbol, last_price, bid, ask, change, change_percent, volume and timestamp
+    """
+    product = data.get('Product', {})
+    section = data.get('All') or data.get('Intraday') or {}
+    return {
+        'symbol': str(product.get('symbol', '')).upper(),
+        'last_price': extract_last_price(data),
+        'bid': _to_float(section.get('bid')),
+        'ask': _to_float(section.get('ask')),
+        'change': _to_float(section.get('changeClose')),
+        'change_percent': _to_float(section.get('changeClosePercentage')),
+        'volume': _to_float(section.get('totalVolume')),
+        'timestamp': _to_float(data.get('dateTimeUTC')),
+    }
+
+
+def parse_quote_response(response: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Parse a get_market_quote response into normalized quotes keyed by symbol
+    """
+    quote_data = response.get('QuoteResponse', {}).get('QuoteData', [])
+    if not isinstance(quote_data, list):
+        quote_data = [quote_data]
+
+    quotes = {}
+    for data in quote_data:
+        quote = normalize_quote(data)
+        if quote['symbol']:
+            quotes[quote['symbol']] = quote
+    return quotes
+
+
+class QuoteService:
+    """
+    A batched, coalescing quote service for any number of symbols
+    """
+
+    def __init__(self, client, max_workers: int = 4, coalesce_window: float = 0.5):
+        """
+        Initialize the quote service
+
+        Args:
+            client: An instance of Client
+            max_workers: Number of chunks fetched concurrently
+            coalesce_window: Seconds a finished request keeps answering new callers
+        """
+        self.client = client
+        self.coalesce_window = coalesce_window
+        self.upstream_requests = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='quotes')
+        self._lock = threading.Lock()
+        # symbol -> (Future, monotonic time the request was issued)
+        self._requests = {}
+        self._pruned_at = time.monotonic()
+
+    def get_quote(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the normalized quote for a single symbol
+        """
+        return self.get_quotes([symbol]).get(symbol.upper())
+
+    def get_quotes(self, symbols: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get normalized quotes for any number of symbols
+
+        Args:
+            symbols: The ticker symbols to quote
+
+        Returns:
+            Dict of normalized quotes keyed by symbol; unknown symbols are omitted
+        """
+        wanted = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+        futures = {}
+        to_fetch = []
+        now = time.monotonic()
+
+        with self._lock:
+            if now - self._pruned_at >= self.coalesce_window:
+                self._prune(now)
+            for symbol in wanted:
+                request = self._requests.get(symbol)
+                if request and self._can_coalesce(request, now):
+                    futures[symbol] = request[0]
+                else:
+                    future = Future()
+                    self._requests[symbol] = (future, now)
+                    futures[symbol] = future
+                    to_fetch.append(symbol)
+
+        for chunk in chunk_symbols(to_fetch):
+            self._executor.submit(self._fetch_chunk, chunk, [futures[symbol] for symbol in chunk])
+
+        results = {}
+        for symbol, future in futures.items():
+            quote = future.result()
+            if quote is not None:
+                results[symbol] = quote
+        return results
+
+    def _can_coalesce(self, request, now: float) -> bool:
+        """
+        Check whether an earlier request can answer a new caller
+        """
+        future, issued_at = request
+        if not future.done():
+            return True
+        return future.exception() is None and now - issued_at <= self.coalesce_window
+
+    def _prune(self, now: float):
+        """
+        Drop finished requests that can no longer answer callers, so the table does not
+        grow with every symbol ever quoted (called with the lock held, once per coalesce window)
+        """
+        self._requests = {symbol: request for symbol, request in self._requests.items()
+                          if self._can_coalesce(request, now)}
+        self._pruned_at = now
+
+    def _fetch_chunk(self, chunk: List[str], futures: List[Future]):
+        """
+        Fetch one chunk of symbols and resolve the futures waiting on it
+        """
+        try:
+            with self._lock:
+                self.upstream_requests += 1
+            response = self.client.get_market_quote(chunk, resp_format='json')
+            quotes = parse_quote_response(response)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        for symbol, future in zip(chunk, futures):
+            future.set_result(quotes.get(symbol))
+
+    def shutdown(self):
+        """
+        Stop the worker threads
+        """
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,243 @@
+"""
+This module implements offline recording, replay and backtesting.
+RecordingClient captures the raw quote and option chain responses of a live
+Client to JSON lines files, and ReplayClient feeds them back with the same
+interface, either at full speed or on an accelerated wall clock.
+"""
+
+import datetime
+import glob
+import json
+import math
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+from client import ResponseCache
+from spy_strategy import SpyStrategy
+
+# Client methods whose responses are captured and replayed
+RECORDED_METHODS = ('get_market_quote', 'get_option_chains')
+
+
+class ReplayExhausted(Exception):
+    """
+    Raised when a ReplayClient has no recorded tick left
+    """
+
+
+def _json_default(value):
+    """
+    Serialize dates in recorded call arguments
+    """
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+class RecordingClient:
+    """
+    A Client wrapper that appends every quote and option chain response to disk
+    """
+
+    def __init__(self, client, record_dir: str = 'recordings'):
+        """
+        Initialize the recording client
+
+        Args:
+            client: The live Client to wrap
+            record_dir: Directory receiving one <date>.jsonl file per day
+        """
+        self.client = client
+        self.record_dir = record_dir
+        self._lock = threading.Lock()
+        os.makedirs(record_dir, exist_ok=True)
+
+    def __getattr__(self, name):
+        # Everything that is not recorded goes straight to the live client
+        return getattr(self.client, name)
+
+    def _record(self, method: str, args: Dict[str, Any], response: Dict[str, Any]):
+        """
+        Append one recorded call to today's file
+        """
+        line = json.dumps({'ts': time.time(), 'method': method, 'args': args, 'response': response},
+                          default=_json_default)
+        path = os.path.join(self.record_dir, f"{datetime.date.today().strftime('%Y-%m-%d')}.jsonl")
+        with self._lock:
+            with open(path, 'a', encoding='utf-8') as record_file:
+                record_file.write(line + '\n')
+
+    def get_market_quote(self, symbols, resp_format='xml'):
+        """
+        Get and record the market quotes for the symbols
+        """
+        response = self.client.get_market_quote(symbols, resp_format=resp_format)
+        self._record('get_market_quote', {'symbols': list(symbols), 'resp_format': resp_format}, response)
+        return response
+
+    def get_option_chains(self, symbol, strike_price=None, expiry_date=None, no_of_strikes=1):
+        """
+        Get and record the option chains for a symbol
+        """
+        response = self.client.get_option_chains(symbol, strike_price=strike_price, expiry_date=expiry_date,
+                                                 no_of_strikes=no_of_strikes)
+        self._record('get_option_chains', {'symbol': symbol, 'strike_price': strike_price,
+                                           'expiry_date': expiry_date, 'no_of_strikes': no_of_strikes}, response)
+        return response
+
+
+class ReplayClient:
+    """
+    A Client stand-in that replays a recorded timeline of responses.
+
+    Each recorded quote starts a tick; get_option_chains returns the last chain
+    recorded before the next quote, i.e. the chain the live strategy used after
+    any prefetch or re-request.
+    """
+
+    def __init__(self, record_dir: str = 'recordings', speed: float = 0.0):
+        """
+        Initialize the replay client
+
+        Args:
+            record_dir: Directory of recorded <date>.jsonl files, or a single .jsonl file
+            speed: 0 replays at full speed; N > 0 replays N times faster than real time
+        """
+        self.speed = speed
+        self.cache = ResponseCache(ttls={})
+        self._events = []
+        self._started_at = None
+        self._tick = -1
+
+        paths = [record_dir] if os.path.isfile(record_dir) else sorted(glob.glob(os.path.join(record_dir, '*.jsonl')))
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as record_file:
+                for line in record_file:
+                    if line.strip():
+                        event = json.loads(line)
+                        if event['method'] in RECORDED_METHODS:
+                            self._events.append(event)
+
+        self._events.sort(key=lambda event: event['ts'])
+        self._quote_indices = [i for i, event in enumerate(self._events) if event['method'] == 'get_market_quote']
+
+    def remaining(self) -> int:
+        """
+        Get the number of recorded ticks (quotes) not yet replayed
+        """
+        return len(self._quote_indices) - self._tick - 1
+
+    def now(self) -> float:
+        """
+        Get the recorded time of the current tick (the replay clock)
+        """
+        if self._tick >= 0:
+            return self._events[self._quote_indices[self._tick]]['ts']
+        return self._events[0]['ts'] if self._events else time.time()
+
+    def get_market_quote(self, symbols, resp_format='xml'):
+        """
+        Replay the next recorded market quote response, starting a new tick
+        """
+        if self.remaining() <= 0:
+            raise ReplayExhausted("No recorded ticks left")
+        self._tick += 1
+        event = self._events[self._quote_indices[self._tick]]
+
+        if self.speed > 0:
+            if self._started_at is None:
+                self._started_at = time.monotonic()
+            due = self._started_at + (event['ts'] - self._events[self._quote_indices[0]]['ts']) / self.speed
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+        return event['response']
+
+    def get_option_chains(self, symbol, strike_price=None, expiry_date=None, no_of_strikes=1):
+        """
+        Replay the option chain recorded for the current tick
+        """
+        if self._tick < 0:
+            raise ReplayExhausted("get_option_chains called before the first recorded quote")
+        start = self._quote_indices[self._tick] + 1
+        end = self._quote_indices[self._tick + 1] if self._tick + 1 < len(self._quote_indices) else len(self._events)
+        for event in reversed(self._events[start:end]):
+            if event['method'] == 'get_option_chains':
+                return event['response']
+        return {}
+
+    def connection_stats(self):
+        """
+        Replays never open connections
+        """
+        return {'requests': 0, 'connections': 0, 'reused': 0, 'reuse_ratio': 0.0}
+
+
+class Backtester:
+    """
+    Runs a strategy over recorded responses and measures its throughput
+    """
+
+    def __init__(self, replay_client: ReplayClient, strategy_cls=None, history_store=None):
+        """
+        Initialize the backtester
+
+        Args:
+            replay_client: The ReplayClient feeding recorded responses
+            strategy_cls: Strategy class to run (defaults to SpyStrategy)
+            history_store: Optional HistoryStore receiving every replayed snapshot
+        """
+        strategy_cls = strategy_cls or SpyStrategy
+        self.replay_client = replay_client
+        self.strategy = strategy_cls(replay_client)
+        # Stamp snapshots with the recorded time instead of the wall clock
+        self.strategy.clock = replay_client.now
+        self.history_store = history_store
+        self.process_seconds = 0.0
+        self.total_seconds = 0.0
+
+    def run(self) -> List[Any]:
+        """
+        Replay every recorded tick and return the resulting snapshots
+        """
+        strategy = self.strategy
+        snapshots = []
+        started = time.perf_counter()
+
+        while self.replay_client.remaining() > 0:
+            strategy.spot_price = None
+            strategy._get_current_price()
+            if not strategy.spot_price:
+                continue
+
+            option_chains = self.replay_client.get_option_chains(strategy.symbol)
+            process_started = time.perf_counter()
+            snapshot = strategy._process_option_chain(option_chains)
+            self.process_seconds += time.perf_counter() - process_started
+
+            if snapshot:
+                snapshots.append(snapshot)
+                if self.history_store is not None:
+                    self.history_store.append(snapshot)
+
+        self.total_seconds = time.perf_counter() - started
+        return snapshots
+
+    def summary(self, snapshots: List[Any]) -> Dict[str, Any]:
+        """
+        Summarize a backtest run
+        """
+        ticks = len(snapshots)
+        straddles = [snapshot.straddle.last_price for snapshot in snapshots
+                     if not math.isnan(snapshot.straddle.last_price)]
+        return {
+            'ticks': ticks,
+            'total_seconds': round(self.total_seconds, 4),
+            'ticks_per_second': round(ticks / self.total_seconds, 1) if self.total_seconds else 0.0,
+            'process_us_per_chain': round(self.process_seconds / ticks * 1e6, 2) if ticks else 0.0,
+            'straddle_min': min(straddles) if straddles else None,
+            'straddle_max': max(straddles) if straddles else None,
+        }
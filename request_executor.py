@@ -0,0 +1,436 @@
+"""
+This module implements the resilient executor every Client request runs through.
+Each API group (market, accounts, order, oauth) has a token-bucket budget
+shared by all threads and a circuit breaker. A request gets a deadline that
+bounds its socket timeouts, its waits for the budget and its retries.
+Idempotent GETs are retried on transient failures (connection errors,
+timeouts, 429 and 5xx) with jittered exponential backoff, but only while the
+group's retry budget (a fraction of recent first attempts) allows, so an
+outage does not turn into a retry storm. Quotes can be hedged: a second copy
+is sent when the first is slow and the budget has a token to spare.
+After repeated transient failures the group's breaker opens and requests
+fail fast with CircuitOpenError until a probe succeeds (requests arriving
+while the probe is in flight wait for its result); the response cache
+then serves the last good response marked stale.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Callable, Dict, Any, Optional
+
+import requests
+
+import metrics
+
+# Seconds a request may take, including budget waits, retries and hedges
+DEFAULT_DEADLINE = 10.0
+# Attempts per idempotent request (the first one included)
+MAX_ATTEMPTS = 3
+# Backoff before retry n is uniform in [0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** n)]
+BACKOFF_BASE = 0.2
+BACKOFF_CAP = 2.0
+# Retries earned per first attempt, and the most that can be saved up
+RETRY_RATIO = 0.2
+RETRY_BURST = 5.0
+# Seconds a quote may be in flight before a hedged copy is sent
+HEDGE_DELAY = 0.3
+# Consecutive transient failures that open a group's breaker, and seconds it stays open
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+# Seconds a group's budget pauses after a 429 without a Retry-After header
+RATE_LIMIT_PAUSE = 1.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+RETRIES = metrics.REGISTRY.counter('etrade_request_retries_total', 'Requests retried after a transient failure')
+HEDGES = metrics.REGISTRY.counter('etrade_request_hedges_total', 'Hedged quote requests by outcome')
+SHED = metrics.REGISTRY.counter('etrade_requests_shed_total', 'Requests failed fast by the executor by reason')
+BREAKER_STATE = metrics.REGISTRY.gauge('etrade_circuit_open', 'Whether the circuit breaker of each API group is open')
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised without sending a request while an API group's breaker is open
+    """
+
+    def __init__(self, group: str, retry_in: float):
+        super().__init__(f"E*TRADE {group} API unavailable; retrying in {retry_in:.0f}s")
+        self.group = group
+        self.retry_in = retry_in
+
+
+class DeadlineExceededError(TimeoutError):
+    """
+    Raised when a request's deadline passes before it could be sent or completed
+    """
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """
+    Check whether an exception came from an HTTP 429 response
+    """
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None) == 429
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Check whether a failure may succeed when retried (connection errors, timeouts, 429 and 5xx)
+    """
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, DeadlineExceededError)):
+        return True
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None) in RETRY_STATUSES
+
+
+def is_unavailable(error: BaseException) -> bool:
+    """
+    Check whether a request failed because the API is unreachable, so the last good response may stand in
+    """
+    return isinstance(error, CircuitOpenError) or is_transient(error)
+
+
+class RequestBudget:
+    """
+    A token bucket shared by every job so their combined request rate stays under the API limit
+    """
+
+    def __init__(self, rate: float = 4.0, burst: float = 8.0, clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the budget
+
+        Args:
+            rate: Requests per second refilled into the bucket
+            burst: Bucket capacity
+            clock: Monotonic time source
+        """
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._tokens = burst
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, requests: float = 1.0) -> bool:
+        """
+        Take tokens for `requests` requests if they are available now
+        """
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            requests = min(requests, self.burst)  # a job costlier than the burst still runs once the bucket is full
+            if now < self._paused_until or self._tokens < requests:
+                return False
+            self._tokens -= requests
+            return True
+
+    def acquire(self, requests: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until tokens for `requests` requests are available and take them
+
+        Returns:
+            False if the timeout passed first
+        """
+        deadline = None if timeout is None else self.clock() + timeout
+        while not self.try_acquire(requests):
+            wait = self.wait_time(requests)
+            if deadline is not None:
+                if self.clock() + wait > deadline:
+                    return False
+            time.sleep(max(wait, 0.001))
+        return True
+
+    def wait_time(self, requests: float = 1.0) -> float:
+        """
+        Get the seconds until `requests` tokens are available
+        """
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            refill_wait = max(0.0, (min(requests, self.burst) - self._tokens) / self.rate)
+            return max(refill_wait, self._paused_until - now)
+
+    def penalize(self, seconds: float):
+        """
+        Stop handing out tokens for a while (after a rate-limit response)
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, self.clock() + seconds)
+            self._tokens = 0.0
+
+
+class RetryBudget:
+    """
+    Retries earned as a fraction of first attempts, so retries stay a bounded share of the traffic
+    """
+
+    def __init__(self, ratio: float = RETRY_RATIO, burst: float = RETRY_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+            return True
+
+
+class CircuitBreaker:
+    """
+    Opens after consecutive transient failures; once the reset timeout passes one probe request is let through
+    and the requests arriving meanwhile wait for its result
+    """
+
+    def __init__(self, group: str, failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT,
+                 clock: Callable[[], float] = time.monotonic):
+        self.group = group
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._prober = None  # thread sending the half-open probe
+        self._lock = threading.Condition()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if self.clock() - self.opened_at >= self.reset_timeout else 'open'
+
+    def check(self, timeout: Optional[float] = None):
+        """
+        Let a request through or raise CircuitOpenError
+
+        Args:
+            timeout: Seconds to wait for the result of a probe already in flight
+        """
+        with self._lock:
+            while True:
+                if self.opened_at is None:
+                    return
+                retry_in = self.opened_at + self.reset_timeout - self.clock()
+                if retry_in <= 0 and self._prober is None:
+                    self._prober = threading.get_ident()
+                    return
+                if retry_in > 0 or self._prober == threading.get_ident() or not self._lock.wait(timeout):
+                    SHED.inc(group=self.group, reason='circuit_open')
+                    raise CircuitOpenError(self.group, max(retry_in, 0.0))
+
+    def release(self):
+        """
+        Give up this thread's probe without a result (it was never sent)
+        """
+        with self._lock:
+            if self._prober == threading.get_ident():
+                self._prober = None
+                self._lock.notify_all()
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._prober = None
+            if self.opened_at is not None:
+                self.opened_at = None
+                BREAKER_STATE.set(0, group=self.group)
+                print(f"E*TRADE {self.group} API recovered; circuit closed")
+            self._lock.notify_all()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._prober is not None or (self.opened_at is None and self.failures >= self.failure_threshold):
+                if self.opened_at is None:
+                    print(f"E*TRADE {self.group} API failing; circuit open for {self.reset_timeout:g}s")
+                self.opened_at = self.clock()
+                self._prober = None
+                BREAKER_STATE.set(1, group=self.group)
+                self._lock.notify_all()
+
+
+class RequestExecutor:
+    """
+    Runs requests under per-group budgets, deadlines, retries, hedging and circuit breakers
+    """
+
+    def __init__(self, rates: Dict[str, float], deadline: float = DEFAULT_DEADLINE, max_attempts: int = MAX_ATTEMPTS,
+                 hedge_delay: float = HEDGE_DELAY, failure_threshold: int = FAILURE_THRESHOLD,
+                 reset_timeout: float = RESET_TIMEOUT, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep, jitter: Callable[[], float] = random.random):
+        """
+        Initialize the executor
+
+        Args:
+            rates: Requests per second allowed per API group (also the burst of its bucket)
+            deadline: Default seconds a request may take
+            max_attempts: Attempts per idempotent request
+            hedge_delay: Seconds before a hedged request sends its second copy
+            failure_threshold: Consecutive transient failures that open a breaker
+            reset_timeout: Seconds an open breaker waits before a probe
+            clock: Monotonic time source
+            sleep: Sleep function (tests pass a fake one)
+            jitter: Uniform [0, 1) source for backoff jitter
+        """
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.hedge_delay = hedge_delay
+        self.clock = clock
+        self.sleep = sleep
+        self.jitter = jitter
+        self.budgets = {group: RequestBudget(rate=rate, burst=max(1.0, rate), clock=clock)
+                        for group, rate in rates.items()}
+        self.retry_budgets = {group: RetryBudget() for group in rates}
+        self.breakers = {group: CircuitBreaker(group, failure_threshold, reset_timeout, clock) for group in rates}
+        self._local = threading.local()
+
+    def timeout(self) -> float:
+        """
+        Get the socket timeout of the request in flight on this thread (its remaining deadline)
+        """
+        deadline_at = getattr(self._local, 'deadline_at', None)
+        if deadline_at is None:
+            return self.deadline
+        return max(deadline_at - self.clock(), 0.001)
+
+    def execute(self, group: str, fetch: Callable[[], Any], idempotent: bool = True, hedge: bool = False,
+                deadline: Optional[float] = None) -> Any:
+        """
+        Send one request through its group's budget and breaker, retrying transient failures
+
+        Args:
+            group: The API group whose budget and breaker apply
+            fetch: Sends the request and returns the parsed response
+            idempotent: Whether the request may be retried and hedged
+            hedge: Send a second copy if the first is slower than hedge_delay
+            deadline: Seconds the request may take (the executor default if omitted)
+
+        Returns:
+            The response of the first successful attempt
+
+        Raises:
+            CircuitOpenError: If the group's breaker is open
+            DeadlineExceededError: If the budget had no token before the deadline
+        """
+        deadline_at = self.clock() + (self.deadline if deadline is None else deadline)
+        budget, retry_budget, breaker = self.budgets[group], self.retry_budgets[group], self.breakers[group]
+        breaker.check(timeout=deadline_at - self.clock())
+        retry_budget.deposit()
+        attempt = 0
+        while True:
+            if not budget.acquire(timeout=deadline_at - self.clock()):
+                breaker.release()
+                SHED.inc(group=group, reason='deadline')
+                raise DeadlineExceededError(f"No {group} request budget before the deadline")
+            try:
+                if hedge and idempotent:
+                    result = self._hedged(group, fetch, deadline_at)
+                else:
+                    result = self._attempt(fetch, deadline_at)
+            except Exception as e:
+                transient = is_transient(e)
+                if is_rate_limited(e):
+                    budget.penalize(self._retry_after(e))
+                if transient:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()  # the API answered; the request itself was wrong
+                attempt += 1
+                if not (idempotent and transient) or attempt >= self.max_attempts:
+                    raise
+                delay = self.jitter() * min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)
+                if self.clock() + delay >= deadline_at or not retry_budget.withdraw():
+                    SHED.inc(group=group, reason='retry_budget')
+                    raise
+                breaker.check(timeout=deadline_at - self.clock())
+                RETRIES.inc(group=group)
+                self.sleep(delay)
+                continue
+            breaker.record_success()
+            return result
+
+    @staticmethod
+    def _retry_after(error: BaseException) -> float:
+        headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+        try:
+            return float(headers.get('Retry-After', RATE_LIMIT_PAUSE))
+        except (TypeError, ValueError):
+            return RATE_LIMIT_PAUSE
+
+    def _attempt(self, fetch: Callable[[], Any], deadline_at: float) -> Any:
+        """
+        Run fetch() with this thread's socket timeouts bounded by the deadline
+        """
+        previous = getattr(self._local, 'deadline_at', None)
+        self._local.deadline_at = deadline_at
+        try:
+            return fetch()
+        finally:
+            self._local.deadline_at = previous
+
+    def _start(self, fetch: Callable[[], Any], deadline_at: float) -> Future:
+        """
+        Run an attempt on its own thread, so attempts never queue behind other callers' requests
+        """
+        future = Future()
+        future.set_running_or_notify_cancel()
+
+        def run():
+            try:
+                future.set_result(self._attempt(fetch, deadline_at))
+            except BaseException as e:
+                future.set_exception(e)
+        threading.Thread(target=run, name='request-attempt', daemon=True).start()
+        return future
+
+    def _hedged(self, group: str, fetch: Callable[[], Any], deadline_at: float) -> Any:
+        """
+        Send the request, and a second copy if it is still in flight hedge_delay after it started
+        and the budget has a token to spare; the first success wins
+        """
+        # Thread.start() returns once the attempt is running, so the hedge delay counts from the send
+        pending = {self._start(fetch, deadline_at)}
+        done, pending = wait(pending, timeout=min(self.hedge_delay, max(deadline_at - self.clock(), 0.0)))
+        if not done:
+            if self.budgets[group].try_acquire():
+                HEDGES.inc(group=group, outcome='sent')
+                hedge = self._start(fetch, deadline_at)
+                pending.add(hedge)
+            else:
+                hedge = None
+                HEDGES.inc(group=group, outcome='no_budget')
+        else:
+            hedge = None
+
+        error = None
+        while True:
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        HEDGES.inc(group=group, outcome='won')
+                    return future.result()
+                error = future.exception()
+            if not pending:
+                raise error
+            remaining = deadline_at - self.clock()
+            if remaining <= 0:
+                raise DeadlineExceededError(f"{group} request did not complete before the deadline")
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+
+    def degraded(self) -> Dict[str, str]:
+        """
+        Get the groups whose breaker is not closed, with their state
+        """
+        return {group: breaker.state for group, breaker in self.breakers.items() if breaker.opened_at is not None}
@@ -0,0 +1,349 @@
+"""
+This module implements the adaptive refresh scheduler.
+Registered jobs tick at a fixed rate with drift correction, only while the
+exchange is open, faster near the close, near expiry and when the underlier
+moves, slower after errors or rate-limit responses. All jobs draw from one
+shared request budget.
+"""
+
+import datetime
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Optional
+
+from history_store import MARKET_TIMEZONE
+from request_executor import RequestBudget, is_rate_limited
+
+MARKET_OPEN = datetime.time(9, 30)
+MARKET_CLOSE = datetime.time(16, 0)
+EARLY_CLOSE = datetime.time(13, 0)
+
+# (seconds to the close, interval multiplier): the last half hour ticks twice as fast, the last 5 minutes 4x
+CLOSE_TIGHTENING = ((300, 0.25), (1800, 0.5))
+# Interval multiplier for snapshots expiring today
+EXPIRY_DAY_FACTOR = 0.5
+# Typical absolute spot move per tick, in basis points, at which volatility halves the interval
+VOLATILITY_REFERENCE_BPS = 5.0
+# Weight of the newest move in the moving average of absolute moves
+VOLATILITY_SMOOTHING = 0.3
+# Seconds all jobs pause after a 429 response
+RATE_LIMIT_PENALTY = 30.0
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> datetime.date:
+    """
+    Get the n-th (1-based; -1 for last) weekday of a month
+    """
+    if n > 0:
+        first = datetime.date(year, month, 1)
+        return first + datetime.timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    next_month = datetime.date(year + month // 12, month % 12 + 1, 1)
+    last = next_month - datetime.timedelta(days=1)
+    return last - datetime.timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year: int) -> datetime.date:
+    """
+    Get Easter Sunday (anonymous Gregorian algorithm)
+    """
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 19 * l) // 433
+    month = (h + l - 7 * m + 90) // 25
+    day = (h + l - 7 * m + 33 * month + 19) % 32
+    return datetime.date(year, month, day)
+
+
+def _observed(day: datetime.date) -> datetime.date:
+    """
+    Move a fixed-date holiday off the weekend (Saturday -> Friday, Sunday -> Monday)
+    """
+    if day.weekday() == 5:
+        return day - datetime.timedelta(days=1)
+    if day.weekday() == 6:
+        return day + datetime.timedelta(days=1)
+    return day
+
+
+class MarketCalendar:
+    """
+    Rules-based NYSE regular-session calendar with full holidays and 1 p.m. early closes
+    """
+
+    def __init__(self, timezone=MARKET_TIMEZONE):
+        self.timezone = timezone
+        self._years = {}
+
+    def _closures(self, year: int) -> Dict[datetime.date, Optional[datetime.time]]:
+        """
+        Map each holiday of a year to None (closed) or its early close time
+        """
+        closures = self._years.get(year)
+        if closures is not None:
+            return closures
+
+        closures = {}
+        new_year = datetime.date(year, 1, 1)
+        if new_year.weekday() != 5:  # a Saturday New Year's Day is not observed on the Friday before
+            closures[_observed(new_year)] = None
+        closures[_nth_weekday(year, 1, 0, 3)] = None   # Martin Luther King Jr. Day
+        closures[_nth_weekday(year, 2, 0, 3)] = None   # Washington's Birthday
+        closures[_easter(year) - datetime.timedelta(days=2)] = None  # Good Friday
+        closures[_nth_weekday(year, 5, 0, -1)] = None  # Memorial Day
+        if year >= 2022:
+            closures[_observed(datetime.date(year, 6, 19))] = None  # Juneteenth
+        closures[_observed(datetime.date(year, 7, 4))] = None
+        closures[_nth_weekday(year, 9, 0, 1)] = None   # Labor Day
+        thanksgiving = _nth_weekday(year, 11, 3, 4)
+        closures[thanksgiving] = None
+        closures[_observed(datetime.date(year, 12, 25))] = None
+
+        for early in (datetime.date(year, 7, 3), thanksgiving + datetime.timedelta(days=1),
+                      datetime.date(year, 12, 24)):
+            if early.weekday() < 5 and early not in closures:
+                closures[early] = EARLY_CLOSE
+
+        self._years[year] = closures
+        return closures
+
+    def session(self, day: datetime.date):
+        """
+        Get the (open, close) aware datetimes of a trading day, or None if the exchange is closed
+        """
+        if day.weekday() >= 5:
+            return None
+        closures = self._closures(day.year)
+        if day in closures and closures[day] is None:
+            return None
+        close = closures.get(day, MARKET_CLOSE)
+        return (datetime.datetime.combine(day, MARKET_OPEN, self.timezone),
+                datetime.datetime.combine(day, close, self.timezone))
+
+    def is_open(self, timestamp: float) -> bool:
+        """
+        Check whether the regular session is open at a Unix timestamp
+        """
+        return self.seconds_to_close(timestamp) is not None
+
+    def seconds_to_close(self, timestamp: float) -> Optional[float]:
+        """
+        Get the seconds until today's close, or None if the exchange is closed
+        """
+        now = datetime.datetime.fromtimestamp(timestamp, self.timezone)
+        session = self.session(now.date())
+        if session is None or not session[0] <= now < session[1]:
+            return None
+        return (session[1] - now).total_seconds()
+
+    def next_open(self, timestamp: float) -> float:
+        """
+        Get the Unix timestamp of the next session open at or after a timestamp
+        """
+        now = datetime.datetime.fromtimestamp(timestamp, self.timezone)
+        day = now.date()
+        for _ in range(15):
+            session = self.session(day)
+            if session is not None and now < session[1]:
+                return max(session[0], now).timestamp()
+            day += datetime.timedelta(days=1)
+        raise ValueError(f"No session within two weeks of {now}")
+
+
+class ScheduledJob:
+    """
+    A registered refresh job and its adaptive interval state
+    """
+
+    def __init__(self, name: str, run: Callable[[], Any], interval: float, min_interval: float,
+                 max_interval: float, requests_per_run: float, closed_interval: Optional[float]):
+        self.name = name
+        self.run = run
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.requests_per_run = requests_per_run
+        self.closed_interval = closed_interval
+        self.next_due = 0.0
+        self.runs = 0
+        self.failures = 0
+        self.running = False
+        self.last_interval = interval
+        self.last_result = None
+        self._last_spot = None
+        self._move_bps = 0.0
+
+    def observe(self, result: Any):
+        """
+        Update the moving average of absolute spot moves from a snapshot result
+        """
+        spot = getattr(result, 'spot_price', None)
+        if spot and self._last_spot and math.isfinite(spot):
+            move = abs(spot - self._last_spot) / self._last_spot * 10000
+            self._move_bps += VOLATILITY_SMOOTHING * (move - self._move_bps)
+        if spot and math.isfinite(spot):
+            self._last_spot = spot
+
+    def urgency(self) -> float:
+        """
+        Get the interval multiplier implied by the last result's expiry and recent moves
+        """
+        factor = 1.0 / (1.0 + self._move_bps / VOLATILITY_REFERENCE_BPS)
+        if getattr(self.last_result, 'days_to_expiry', None) == 0:
+            factor *= EXPIRY_DAY_FACTOR
+        return factor
+
+
+class RefreshScheduler:
+    """
+    Runs registered jobs at adaptive fixed rates under a shared request budget
+    """
+
+    def __init__(self, budget: Optional[RequestBudget] = None, calendar: Optional[MarketCalendar] = None,
+                 max_workers: int = 4, clock: Callable[[], float] = time.time):
+        """
+        Initialize the scheduler
+
+        Args:
+            budget: Shared request budget (defaults to 4 requests/second, bursts of 8)
+            calendar: Exchange calendar deciding when jobs run
+            max_workers: Maximum number of jobs running at once
+            clock: Wall-clock time source (Unix seconds)
+        """
+        self.budget = budget or RequestBudget()
+        self.calendar = calendar or MarketCalendar()
+        self.clock = clock
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='refresh')
+        self._thread = None
+        self.running = False
+
+    def register(self, name: str, run: Callable[[], Any], interval: float = 10.0, min_interval: float = 1.0,
+                 max_interval: float = 300.0, requests_per_run: float = 2.0,
+                 closed_interval: Optional[float] = None) -> ScheduledJob:
+        """
+        Register a job; it first runs as soon as the scheduler starts, whatever the market hours
+
+        Args:
+            name: Unique job name
+            run: Callable doing one refresh; returning None counts as a failed tick
+            interval: Base seconds between ticks while the market is open
+            min_interval: Floor of the adaptive interval
+            max_interval: Ceiling of the adaptive interval and of error backoff
+            requests_per_run: Budget tokens taken per tick
+            closed_interval: Seconds between ticks while the market is closed (None waits for the open)
+        """
+        job = ScheduledJob(name, run, interval, min_interval, max_interval, requests_per_run, closed_interval)
+        with self._lock:
+            self.jobs[name] = job
+        self._wake.set()
+        return job
+
+    def unregister(self, name: str):
+        with self._lock:
+            self.jobs.pop(name, None)
+
+    def next_interval(self, job: ScheduledJob, now: float) -> float:
+        """
+        Compute the seconds until a job's next tick from market hours, urgency and failures
+        """
+        seconds_to_close = self.calendar.seconds_to_close(now)
+        if seconds_to_close is None:
+            wait_for_open = self.calendar.next_open(now) - now
+            return wait_for_open if job.closed_interval is None else min(job.closed_interval, wait_for_open)
+
+        interval = job.interval * job.urgency()
+        for threshold, factor in CLOSE_TIGHTENING:
+            if seconds_to_close <= threshold:
+                interval *= factor
+                break
+        interval = max(job.min_interval, min(job.max_interval, interval))
+
+        if job.failures:
+            interval = min(job.max_interval, interval * 2 ** job.failures)
+        # Never tick past the close; the next tick after it waits for the open
+        return min(interval, seconds_to_close + 1e-3)
+
+    def _run_job(self, job: ScheduledJob, due: float):
+        """
+        Run one tick of a job and schedule its next tick
+        """
+        try:
+            result = job.run()
+            job.last_result = result
+            job.observe(result)
+            job.failures = 0 if result is not None else job.failures + 1
+        except Exception as e:
+            job.failures += 1
+            if is_rate_limited(e):
+                self.budget.penalize(RATE_LIMIT_PENALTY)
+            print(f"Error in scheduled job {job.name}: {e}")
+        finally:
+            job.runs += 1
+            now = self.clock()
+            interval = max(self.next_interval(job, now), 1e-3)
+            job.last_interval = interval
+            # Fixed rate: step from the due time, not from when the run finished, skipping missed ticks
+            next_due = due + interval
+            if next_due <= now:
+                next_due += (math.floor((now - next_due) / interval) + 1) * interval
+            with self._lock:
+                job.next_due = next_due
+                job.running = False
+            self._wake.set()
+
+    def _loop(self):
+        while self.running:
+            now = self.clock()
+            wake_at = now + 60
+            with self._lock:
+                jobs = list(self.jobs.values())
+            for job in jobs:
+                if job.running:
+                    continue
+                if job.next_due <= now:
+                    if self.budget.try_acquire(job.requests_per_run):
+                        with self._lock:
+                            job.running = True
+                        self._executor.submit(self._run_job, job, job.next_due if job.runs else now)
+                        continue
+                    job.next_due = now + self.budget.wait_time(job.requests_per_run)
+                wake_at = min(wake_at, job.next_due)
+            self._wake.wait(max(0.0, wake_at - self.clock()))
+            self._wake.clear()
+
+    def start(self):
+        """
+        Start ticking in a background thread
+        """
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._loop, name='refresh-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop ticking and wait for running jobs
+        """
+        self.running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the state of every job
+        """
+        with self._lock:
+            return {name: {'runs': job.runs, 'failures': job.failures, 'interval': round(job.last_interval, 3),
+                           'next_due': job.next_due} for name, job in self.jobs.items()}
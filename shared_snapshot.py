@@ -0,0 +1,247 @@
+"""
+This module implements single-writer, many-reader snapshot channels in shared memory.
+Each channel is a memory-mapped file holding a small header and one
+pre-serialized payload. The producer process overwrites it under a sequence
+lock (the sequence is odd while a write is in progress), so any number of
+reader processes copy the latest payload without locks or system calls and
+retry only when they raced a write. A payload that outgrows the mapping is
+written to a larger file that replaces the old one; readers of the old file
+see it marked as moved and reopen the path.
+"""
+
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+# sequence, version, timestamp, payload length
+HEADER = struct.Struct('<QQdQ')
+SEQUENCE = struct.Struct('<Q')
+# Sequence value of a file that was replaced by a larger one
+MOVED = 2 ** 64 - 1
+# Initial payload capacity of a channel in bytes
+DEFAULT_CAPACITY = 1 << 20
+# Environment variable naming the snapshot directory (read by wsgi.create_app)
+SNAPSHOT_DIR_ENV = 'ETRADE_SNAPSHOT_DIR'
+
+
+def default_directory() -> str:
+    """
+    Get the snapshot directory: ETRADE_SNAPSHOT_DIR, else a per-user directory in /dev/shm or the temp directory
+    """
+    configured = os.environ.get(SNAPSHOT_DIR_ENV)
+    if configured:
+        return configured
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    user = os.getuid() if hasattr(os, 'getuid') else os.environ.get('USERNAME', 'user')
+    return os.path.join(base, f"etrade-snapshots-{user}")
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    One payload read from a channel
+    """
+    __slots__ = ('sequence', 'version', 'timestamp', 'payload')
+
+    sequence: int  # bumped (by two) on every publish
+    version: int  # set by the producer; changes only when the content does
+    timestamp: float
+    payload: bytes
+
+    @property
+    def etag(self) -> str:
+        return str(self.version)
+
+
+class SnapshotWriter:
+    """
+    The producer side of a channel
+    """
+
+    def __init__(self, path: str, capacity: int = DEFAULT_CAPACITY):
+        """
+        Create (or truncate) the channel file
+
+        Args:
+            path: File backing the channel
+            capacity: Initial payload capacity in bytes (grown on demand)
+        """
+        self.path = path
+        self.sequence = 0
+        self._file, self._map = self._create(capacity, None)
+
+    def _create(self, capacity: int, current: Optional[Snapshot]):
+        """
+        Write a new channel file of the given capacity next to the path and rename it into place
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot.', suffix='.tmp')
+        channel_file = os.fdopen(fd, 'r+b')
+        channel_file.truncate(HEADER.size + capacity)
+        channel_map = mmap.mmap(channel_file.fileno(), HEADER.size + capacity)
+        if current is not None:
+            channel_map[HEADER.size:HEADER.size + len(current.payload)] = current.payload
+            HEADER.pack_into(channel_map, 0, self.sequence, current.version, current.timestamp, len(current.payload))
+        os.replace(temp_path, self.path)
+        return channel_file, channel_map
+
+    @property
+    def capacity(self) -> int:
+        return len(self._map) - HEADER.size
+
+    def publish(self, payload: bytes, version: int, timestamp: float = 0.0):
+        """
+        Replace the channel's payload
+
+        Args:
+            payload: The pre-serialized response body
+            version: Content version (used as the ETag)
+            timestamp: Producer time of the content
+        """
+        if len(payload) > self.capacity:
+            old_file, old_map = self._file, self._map
+            self.sequence += 2
+            self._file, self._map = self._create(max(2 * self.capacity, len(payload)),
+                                                 Snapshot(self.sequence, version, timestamp, payload))
+            SEQUENCE.pack_into(old_map, 0, MOVED)
+            old_map.close()
+            old_file.close()
+            return
+
+        sequence = self.sequence + 1  # odd: readers retry until the write completes
+        SEQUENCE.pack_into(self._map, 0, sequence)
+        self._map[HEADER.size:HEADER.size + len(payload)] = payload
+        HEADER.pack_into(self._map, 0, sequence, version, timestamp, len(payload))
+        self.sequence = sequence + 1
+        SEQUENCE.pack_into(self._map, 0, self.sequence)
+
+    def close(self):
+        """
+        Unmap the channel (the file stays for readers until the directory is removed)
+        """
+        self._map.close()
+        self._file.close()
+
+
+class SnapshotReader:
+    """
+    The consumer side of a channel; safe to share between the threads of one process
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._map = None
+        self._last = None
+        self.retries = 0
+
+    def _open(self) -> bool:
+        """
+        Map the channel file (False while the producer has not created it yet).
+        A replaced mapping is not closed here: threads still copying from it
+        hold a reference, and it is released with the last one.
+        """
+        try:
+            with open(self.path, 'rb') as channel_file:
+                self._map = mmap.mmap(channel_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def sequence(self) -> Optional[int]:
+        """
+        Peek at the channel's sequence number (a cheap change check)
+        """
+        if self._map is None and not self._open():
+            return None
+        sequence = SEQUENCE.unpack_from(self._map, 0)[0]
+        if sequence == MOVED:
+            return self.sequence() if self._open() else None
+        return sequence
+
+    def read(self) -> Optional[Snapshot]:
+        """
+        Get the latest payload, or None when nothing was published yet
+        """
+        while True:
+            if self._map is None and not self._open():
+                return None
+            channel_map = self._map
+            sequence = SEQUENCE.unpack_from(channel_map, 0)[0]
+            if sequence == MOVED:
+                self._open()
+                continue
+            if sequence == 0:
+                return None
+            last = self._last
+            if last is not None and last.sequence == sequence:
+                return last  # unchanged since the last read: no copy
+            if sequence & 1:
+                self.retries += 1
+                time.sleep(0)
+                continue
+
+            _, version, timestamp, length = HEADER.unpack_from(channel_map, 0)
+            payload = channel_map[HEADER.size:HEADER.size + length]
+            if SEQUENCE.unpack_from(channel_map, 0)[0] != sequence:
+                self.retries += 1  # raced a write
+                continue
+            snapshot = Snapshot(sequence, version, timestamp, payload)
+            self._last = snapshot
+            return snapshot
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+class SnapshotPublisher:
+    """
+    The producer's set of named channels in one directory
+    """
+
+    def __init__(self, directory: Optional[str] = None, capacity: int = DEFAULT_CAPACITY):
+        """
+        Initialize the publisher
+
+        Args:
+            directory: Directory of the channel files (default_directory() if omitted)
+            capacity: Initial payload capacity of each channel in bytes
+        """
+        self.directory = directory or default_directory()
+        self.capacity = capacity
+        self._writers: Dict[str, SnapshotWriter] = {}
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+
+    def publish(self, name: str, payload, version: int, timestamp: float = 0.0):
+        """
+        Publish a payload (str or bytes) on a named channel
+        """
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        writer = self._writers.get(name)
+        if writer is None:
+            writer = self._writers[name] = SnapshotWriter(channel_path(self.directory, name), self.capacity)
+        writer.publish(payload, version, timestamp)
+
+    def close(self, remove: bool = True):
+        """
+        Close every channel and optionally remove the directory
+        """
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+        if remove:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def channel_path(directory: str, name: str) -> str:
+    """
+    Get the file backing a named channel
+    """
+    return os.path.join(directory, f"{name}.snapshot")
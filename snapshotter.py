@@ -0,0 +1,300 @@
+"""
+This module implements the bulk historical chain snapshotter.
+Every round (one per minute by default) fetches the full option chain of
+every expiry of every underlier. Fetches run on threads under a shared
+request budget; the raw JSON bodies are parsed, normalized into columnar
+arrays and compressed in a process pool, so throughput scales with cores.
+Each chain is archived as a compressed .npz file partitioned by date,
+underlier and expiry:
+
+    <archive>/<YYYY-MM-DD>/<UNDERLIER>/<expiry YYYY-MM-DD>/<HHMMSS>.npz
+
+A checkpoint of the round in progress lets a restarted snapshotter finish
+the round instead of fetching it again.
+"""
+
+import datetime
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import metrics
+from chain_analytics import load_chain_arrays
+from history_store import MARKET_TIMEZONE
+from quote_service import QuoteService, chunk_symbols
+from scheduler import RequestBudget
+
+# Seconds between rounds
+ROUND_INTERVAL = 60
+CHECKPOINT_FILE = 'checkpoint.json'
+# Requests per second allowed to the snapshotter (its share of the market API limit)
+DEFAULT_RATE = 4.0
+
+SNAPSHOT_CHAINS = metrics.REGISTRY.counter('etrade_snapshot_chains_total', 'Option chains archived by the snapshotter')
+SNAPSHOT_ERRORS = metrics.REGISTRY.counter('etrade_snapshot_errors_total', 'Snapshotter failures by stage')
+
+
+def partition_dir(base_dir: str, round_time: float, underlier: str, expiry: datetime.date) -> str:
+    """
+    Get the directory of one (date, underlier, expiry) partition
+    """
+    day = datetime.datetime.fromtimestamp(round_time, MARKET_TIMEZONE).date()
+    return os.path.join(base_dir, day.isoformat(), underlier.upper(), expiry.isoformat())
+
+
+def archive_path(base_dir: str, round_time: float, underlier: str, expiry: datetime.date) -> str:
+    """
+    Get the archive file of one chain snapshot
+    """
+    stamp = datetime.datetime.fromtimestamp(round_time, MARKET_TIMEZONE).strftime('%H%M%S')
+    return os.path.join(partition_dir(base_dir, round_time, underlier, expiry), f"{stamp}.npz")
+
+
+def _write_atomic(path: str, write):
+    """
+    Write a file through a temporary file in the same directory, so readers never see a partial one
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as archive_file:
+            write(archive_file)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def archive_chain(payload: bytes, path: str, timestamp: float, spot: float) -> int:
+    """
+    Parse one raw option chain response, normalize it into columns and write it compressed.
+    Runs in the process pool.
+
+    Args:
+        payload: The optionchains.json response body
+        path: The archive file to write
+        timestamp: Round time stored with the chain
+        spot: Underlier price at the round (NaN if unknown)
+
+    Returns:
+        The number of strikes archived
+    """
+    chain = load_chain_arrays(json.loads(payload))
+    rows = len(chain['strike'])
+    if rows:
+        _write_atomic(path, lambda archive_file: np.savez_compressed(
+            archive_file, timestamp=np.float64(timestamp), spot=np.float64(spot), **chain))
+    return rows
+
+
+def read_partition(base_dir: str, day: datetime.date, underlier: str, expiry: datetime.date) -> Dict[str, np.ndarray]:
+    """
+    Load every snapshot of one partition into concatenated columns
+
+    Returns:
+        Dict of float64 arrays with one row per (snapshot, strike), including timestamp and spot columns
+    """
+    directory = os.path.join(base_dir, day.isoformat(), underlier.upper(), expiry.isoformat())
+    names = sorted(name for name in os.listdir(directory) if name.endswith('.npz')) if os.path.isdir(directory) else []
+    parts = []
+    for name in names:
+        with np.load(os.path.join(directory, name)) as archive:
+            rows = len(archive['strike'])
+            part = {key: archive[key] for key in archive.files if archive[key].ndim == 1}
+            part['timestamp'] = np.full(rows, float(archive['timestamp']))
+            part['spot'] = np.full(rows, float(archive['spot']))
+            parts.append(part)
+    if not parts:
+        return {}
+    return {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+
+
+class Checkpoint:
+    """
+    The archived chains of the round in progress, persisted after every completion
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.round_time = None
+        self.done = set()
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r', encoding='utf-8') as checkpoint_file:
+                state = json.load(checkpoint_file)
+            self.round_time = state['round']
+            self.done = set(state['done'])
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+
+    @staticmethod
+    def key(underlier: str, expiry: datetime.date) -> str:
+        return f"{underlier.upper()}/{expiry.isoformat()}"
+
+    def start(self, round_time: float) -> bool:
+        """
+        Begin a round; a round matching the saved one keeps its completed chains
+
+        Returns:
+            True if the round resumes a checkpoint
+        """
+        with self._lock:
+            resumed = self.round_time == round_time
+            if not resumed:
+                self.round_time = round_time
+                self.done = set()
+            return resumed
+
+    def mark(self, underlier: str, expiry: datetime.date):
+        with self._lock:
+            self.done.add(self.key(underlier, expiry))
+            state = json.dumps({'round': self.round_time, 'done': sorted(self.done)}).encode('utf-8')
+            _write_atomic(self.path, lambda checkpoint_file: checkpoint_file.write(state))
+
+
+class ChainSnapshotter:
+    """
+    Archives the full chain of every expiry of every underlier once per round
+    """
+
+    def __init__(self, client, underliers: Iterable[str], base_dir: str = 'archive', rate: float = DEFAULT_RATE,
+                 fetch_workers: int = 8, parse_workers: Optional[int] = None, max_expiries: Optional[int] = None):
+        """
+        Initialize the snapshotter
+
+        Args:
+            client: An instance of Client
+            underliers: Symbols to snapshot
+            base_dir: Root of the archive
+            rate: Requests per second the snapshotter may send
+            fetch_workers: Maximum number of chain requests in flight at once
+            parse_workers: Processes parsing and compressing chains (one per core if omitted)
+            max_expiries: Optional limit on how many of the nearest expiries are archived
+        """
+        self.client = client
+        self.underliers = [symbol.strip().upper() for symbol in underliers if symbol.strip()]
+        self.base_dir = base_dir
+        self.max_expiries = max_expiries
+        self.budget = RequestBudget(rate=rate, burst=max(1.0, rate))
+        self.quote_service = QuoteService(client)
+        self.checkpoint = Checkpoint(os.path.join(base_dir, CHECKPOINT_FILE))
+        self._fetch_pool = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix='snapshot-fetch')
+        self._parse_pool = ProcessPoolExecutor(max_workers=parse_workers or os.cpu_count(),
+                                               mp_context=multiprocessing.get_context('spawn'))
+
+    def _expiries(self, underlier: str) -> List[datetime.date]:
+        """
+        List the expiries of an underlier (cached by the client for an hour)
+        """
+        self.budget.acquire()
+        expiries = [expiry for expiry, _ in self.client.get_option_expire_dates(underlier)]
+        return expiries[:self.max_expiries] if self.max_expiries else expiries
+
+    def _fetch(self, underlier: str, expiry: datetime.date) -> bytes:
+        self.budget.acquire()
+        return self.client.get_option_chains_raw(underlier, expiry)
+
+    def run_round(self, round_time: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Archive one round
+
+        Args:
+            round_time: The round's scheduled time (now if omitted); it names the archive files
+
+        Returns:
+            Round statistics: chains, strikes, errors, skipped (already checkpointed), seconds
+        """
+        round_time = time.time() if round_time is None else round_time
+        started = time.monotonic()
+        resumed = self.checkpoint.start(round_time)
+        stats = {'round': round_time, 'chains': 0, 'strikes': 0, 'errors': 0, 'skipped': 0, 'resumed': resumed}
+
+        with metrics.span('snapshot.round'):
+            self.budget.acquire(len(chunk_symbols(self.underliers)))
+            quotes = self.quote_service.get_quotes(self.underliers)
+            tasks: List[Tuple[str, datetime.date]] = []
+            for underlier, expiries in zip(self.underliers, self._fetch_pool.map(self._expiries, self.underliers)):
+                for expiry in expiries:
+                    if Checkpoint.key(underlier, expiry) in self.checkpoint.done:
+                        stats['skipped'] += 1
+                    else:
+                        tasks.append((underlier, expiry))
+
+            # Each fetch hands its body to the process pool as soon as it arrives
+            fetches = {self._fetch_pool.submit(self._fetch, underlier, expiry): (underlier, expiry)
+                       for underlier, expiry in tasks}
+            parses = {}
+            for future in as_completed(fetches):
+                underlier, expiry = fetches[future]
+                try:
+                    payload = future.result()
+                except Exception as e:
+                    print(f"Error fetching the {underlier} {expiry} chain: {e}")
+                    SNAPSHOT_ERRORS.inc(stage='fetch')
+                    stats['errors'] += 1
+                    continue
+                spot = (quotes.get(underlier) or {}).get('last_price') or float('nan')
+                path = archive_path(self.base_dir, round_time, underlier, expiry)
+                parses[self._parse_pool.submit(archive_chain, payload, path, round_time, spot)] = (underlier, expiry)
+
+            for future, (underlier, expiry) in parses.items():
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    print(f"Error archiving the {underlier} {expiry} chain: {e}")
+                    SNAPSHOT_ERRORS.inc(stage='parse')
+                    stats['errors'] += 1
+                    continue
+                self.checkpoint.mark(underlier, expiry)
+                SNAPSHOT_CHAINS.inc(underlier=underlier)
+                stats['chains'] += 1
+                stats['strikes'] += rows
+
+        stats['seconds'] = time.monotonic() - started
+        return stats
+
+    def run(self, interval: float = ROUND_INTERVAL, rounds: Optional[int] = None):
+        """
+        Run rounds aligned to multiples of the interval until interrupted; a round that
+        overruns skips the boundaries it missed
+
+        Args:
+            interval: Seconds between rounds
+            rounds: Optional number of rounds to run
+        """
+        completed = 0
+        # A checkpointed round that was cut short is finished first
+        round_time = self.checkpoint.round_time
+        if round_time is None or time.time() - round_time >= interval:
+            round_time = time.time() // interval * interval
+        while rounds is None or completed < rounds:
+            stats = self.run_round(round_time)
+            completed += 1
+            print(f"{datetime.datetime.fromtimestamp(round_time, MARKET_TIMEZONE):%H:%M:%S} "
+                  f"archived {stats['chains']} chains ({stats['strikes']} strikes) in {stats['seconds']:.1f}s"
+                  + (f", {stats['skipped']} resumed from the checkpoint" if stats['skipped'] else '')
+                  + (f", {stats['errors']} errors" if stats['errors'] else ''))
+            next_round = (time.time() // interval + 1) * interval
+            if next_round - round_time > interval:
+                print(f"Round overran the {interval:g}s interval; skipping to the next boundary")
+            round_time = next_round
+            if rounds is not None and completed >= rounds:
+                break
+            time.sleep(max(0.0, next_round - time.time()))
+
+    def close(self):
+        """
+        Stop the worker threads and processes
+        """
+        self._fetch_pool.shutdown(wait=False)
+        self._parse_pool.shutdown()
+        self.quote_service.shutdown()
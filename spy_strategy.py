@@ -1,57 +1,112 @@
 """
-This module implements the SPY strategy functionality for the E*TRADE CLI.
-The strategy gets the current price of SPY and finds option chains closest to that price.
+This module implements the straddle strategy functionality for the E*TRADE CLI.
+The strategy gets the current price of an underlier (SPY by default) and finds
+option chains closest to that price.
 """
 
+import asyncio
+import contextlib
 import datetime
-from typing import Dict, Any
+import math
+import time
+from typing import Dict, Any, Optional
 
-class SpyStrategy:
+import metrics
+import pricing
+from async_client import AsyncClient
+from option_models import ChainSnapshot, OptionQuote, Straddle, nearest_strike, to_float
+from request_executor import is_unavailable
+
+class StraddleStrategy:
     """
-    A class to implement the SPY options strategy
+    A class to implement the at-the-money straddle strategy for any underlier
     """
     
-    def __init__(self, client):
+    def __init__(self, client, symbol: str = 'SPY', strike_increment: float = 1.0):
         """
-        Initialize the SPY strategy with the E*TRADE client
+        Initialize the straddle strategy with the E*TRADE client
+
+        Args:
+            client: An instance of Client
+            symbol: The underlier
+            strike_increment: Spacing of the listed strikes around the money
         """
         self.client = client
-        self.spy_symbol = 'SPY'
-        self.spy_price = None
+        self.symbol = symbol.upper()
+        self.spot_price = None
         self.option_data = None
+        self.strike_increment = strike_increment
+        self.clock = time.time  # replaced by the replay clock when backtesting
+        self._async_client = None
+
+    # Names from when the strategy only traded SPY
+    @property
+    def spy_symbol(self):
+        return self.symbol
+
+    @spy_symbol.setter
+    def spy_symbol(self, value):
+        self.symbol = value
+
+    @property
+    def spy_price(self):
+        return self.spot_price
+
+    @spy_price.setter
+    def spy_price(self, value):
+        self.spot_price = value
     
     def run_strategy(self):
         """
-        Execute the SPY strategy:
-        1. Get current SPY price
+        Execute the straddle strategy:
+        1. Get current underlier price
         2. Find closest option chain
         3. Get CALL and PUT prices
         """
-        # Step 1: Get current SPY price
-        self._get_current_price()
-        
-        if not self.spy_price:
-            print(f"Failed to get current price for {self.spy_symbol}")
-            return None
-        
-        print(f"Current {self.spy_symbol} price: ${self.spy_price}")
-        
-        # Step 2: Get option chains closest to current price
-        self._get_option_chains()
-        
-        # Step 3: Display the relevant options
-        self._display_options()
-        
-        return self.option_data
+        with metrics.span('strategy.tick'):
+            # Step 1: Get current underlier price
+            self._get_current_price()
+
+            if not self.spot_price:
+                print(f"Failed to get current price for {self.symbol}")
+                return None
+
+            print(f"Current {self.symbol} price: ${self.spot_price}")
+
+            # Step 2: Get option chains closest to current price
+            self._get_option_chains()
+
+            # Step 3: Display the relevant options
+            with metrics.span('strategy.display'):
+                self._display_options()
+
+            return self.option_data
     
     def _get_current_price(self):
         """
-        Get the current SPY price from the market
+        Get the current underlier price from the market
+        """
+        try:
+            # Get the market quote for the underlier
+            with metrics.span('strategy.quote'):
+                quote = self.client.get_market_quote([self.symbol])
+            self._parse_current_price(quote)
+        except (KeyError, IndexError, ValueError, AttributeError) as e:
+            print(f"Error getting {self.symbol} price: {e}")
+            self.spot_price = None
+
+    def _parse_current_price(self, quote: Dict[str, Any]):
+        """
+        Extract the current underlier price from a market quote response
+        """
+        with metrics.span('strategy.parse_quote'):
+            self._parse_quote_fields(quote)
+
+    def _parse_quote_fields(self, quote: Dict[str, Any]):
+        """
+        Try the known quote layouts in turn and set spot_price from the first match
         """
         try:
-            # Get the market quote for SPY
-            quote = self.client.get_market_quote([self.spy_symbol])
-            
             # Handle different response structures with better error handling
             if 'QuoteResponse' in quote and 'QuoteData' in quote['QuoteResponse']:
                 quote_data = quote['QuoteResponse']['QuoteData']
@@ -64,42 +119,139 @@ class SpyStrategy:
                     
                 # Try multiple possible paths to extract price
                 if 'All' in data and 'lastTrade' in data['All']:
-                    self.spy_price = float(data['All']['lastTrade'])
+                    self.spot_price = float(data['All']['lastTrade'])
                 elif 'All' in data and 'price' in data['All']:
-                    self.spy_price = float(data['All']['price'])
+                    self.spot_price = float(data['All']['price'])
                 elif 'Intraday' in data and 'lastPrice' in data['Intraday']:
-                    self.spy_price = float(data['Intraday']['lastPrice'])
-                
-                # If still no price, try to print available keys for debugging
-                if not self.spy_price and 'All' in data:
-                    print(f"DEBUG: Available price fields: {data['All'].keys()}")
-                    if 'lastPrice' in data['All']:
-                        self.spy_price = float(data['All']['lastPrice'])
+                    self.spot_price = float(data['Intraday']['lastPrice'])
+                elif 'All' in data and 'lastPrice' in data['All']:
+                    self.spot_price = float(data['All']['lastPrice'])
+                else:
+                    # Counted on the parse span instead of printing the payload's keys every tick
+                    metrics.SPAN_ERRORS.inc(span='strategy.parse_quote', error='missing_price')
             else:
-                print(f"DEBUG: Unexpected quote structure. Available keys: {quote.keys()}")
-                
+                metrics.SPAN_ERRORS.inc(span='strategy.parse_quote', error='unexpected_structure')
+
         except (KeyError, IndexError, ValueError, AttributeError) as e:
-            print(f"Error getting {self.spy_symbol} price: {e}")
-            self.spy_price = None
+            print(f"Error getting {self.symbol} price: {e}")
+            self.spot_price = None
     
+    async def run_strategy_async(self, async_client=None):
+        """
+        Execute the straddle strategy on an event loop.
+
+        While the new quote is in flight, the option chain for the last known
+        price is prefetched; it is only re-requested if the price moved into a
+        different strike bucket.
+
+        Args:
+            async_client: Optional shared AsyncClient, so many strategies can use one loop
+        """
+        with metrics.span('strategy.tick', mode='async'):
+            return await self._run_tick_async(async_client or self._get_async_client())
+
+    async def _run_tick_async(self, async_client):
+        """
+        One async tick: quote with chain prefetch, process and display
+        """
+        previous_price = self.spot_price
+
+        quote_task = asyncio.ensure_future(async_client.get_market_quote([self.symbol]))
+        chain_task = None
+        if previous_price:
+            chain_task = asyncio.ensure_future(
+                async_client.get_option_chains(symbol=self.symbol,
+                                               strike_price=self._nearest_strike(previous_price))
+            )
+
+        try:
+            with metrics.span('strategy.quote', mode='async'):
+                quote = await quote_task
+            self._parse_current_price(quote)
+
+            if not self.spot_price:
+                print(f"Failed to get current price for {self.symbol}")
+                return None
+
+            print(f"Current {self.symbol} price: ${self.spot_price}")
+
+            option_chains = None
+            if chain_task and self._strike_bucket(previous_price) == self._strike_bucket(self.spot_price):
+                try:
+                    with metrics.span('strategy.chain', mode='prefetch'):
+                        option_chains = await chain_task
+                except Exception as e:
+                    print(f"Error prefetching option chains: {e}")
+            elif chain_task:
+                chain_task.cancel()
+
+            try:
+                if option_chains is None:
+                    with metrics.span('strategy.chain', mode='async'):
+                        option_chains = await async_client.get_option_chains(
+                            symbol=self.symbol,
+                            strike_price=self._nearest_strike(self.spot_price)
+                        )
+                self.option_data = self._process_option_chain(option_chains)
+            except Exception as e:
+                print(f"Error getting option chains: {e}")
+                self.option_data = None
+                if is_unavailable(e):
+                    raise  # retries are spent and no cached chain stood in; let the caller back off
+
+            with metrics.span('strategy.display'):
+                self._display_options()
+
+            return self.option_data
+        finally:
+            # An unused or failed prefetch is cancelled and its outcome retrieved on every exit path
+            if chain_task is not None:
+                chain_task.cancel()
+                with contextlib.suppress(Exception, asyncio.CancelledError):
+                    await chain_task
+
+    def _get_async_client(self):
+        """
+        Get the AsyncClient wrapping this strategy's client, creating it on first use
+        """
+        if self._async_client is None:
+            self._async_client = AsyncClient(self.client)
+        return self._async_client
+
+    def _strike_bucket(self, price):
+        """
+        Get the nearest strike index for a price
+        """
+        return round(float(price) / self.strike_increment)
+
+    def _nearest_strike(self, price):
+        """
+        Get the listed strike closest to a price, so repeated ticks in the
+        same bucket send identical (cacheable) chain requests
+        """
+        return nearest_strike(price, self.strike_increment)
+
     def _get_option_chains(self):
         """
-        Get option chains for SPY at the current price
+        Get option chains for the underlier at the current price
         """
         try:
             # Get option chains data using correct parameters
-            option_chains = self.client.get_option_chains(
-                symbol=self.spy_symbol, 
-                strike_price=self.spy_price
-            )
+            with metrics.span('strategy.chain'):
+                option_chains = self.client.get_option_chains(
+                    symbol=self.symbol,
+                    strike_price=self._nearest_strike(self.spot_price)
+                )
             
             # Process the option chain response
             self.option_data = self._process_option_chain(option_chains)
         except Exception as e:
             print(f"Error getting option chains: {e}")
             self.option_data = None
+            if is_unavailable(e):
+                raise  # retries are spent and no cached chain stood in; let the caller back off
     
-    def _process_option_chain(self, option_chains_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _process_option_chain(self, option_chains_data: Dict[str, Any]) -> Optional[ChainSnapshot]:
         """
         Process the option chain response to extract relevant data
         
@@ -107,13 +259,20 @@ class SpyStrategy:
             option_chains_data: The option chains data from API
             
         Returns:
-            Dict with call and put options data
+            ChainSnapshot with the call, put and straddle, or None if the response is unusable
+        """
+        with metrics.span('strategy.process'):
+            return self._build_snapshot(option_chains_data)
+
+    def _build_snapshot(self, option_chains_data: Dict[str, Any]) -> Optional[ChainSnapshot]:
+        """
+        Build the ChainSnapshot from the first OptionPair of a chain response
         """
         try:
             # Extract the main response object
             if 'OptionChainResponse' not in option_chains_data:
                 print("No OptionChainResponse in data")
-                return {}
+                return None
                 
             chain_response = option_chains_data['OptionChainResponse']
             
@@ -121,14 +280,11 @@ class SpyStrategy:
             expiry_date = None
             days_to_expiry = None
             
-            if 'SelectedED' in chain_response:
-                selected_date = chain_response['SelectedED']
-                if all(key in selected_date for key in ['year', 'month', 'day']):
-                    year = int(selected_date['year'])
-                    month = int(selected_date['month'])
-                    day = int(selected_date['day'])
-                    expiry_date = datetime.date(year, month, day)
-                    days_to_expiry = (expiry_date - datetime.date.today()).days
+            selected_date = chain_response.get('SelectedED', {})
+            if all(key in selected_date for key in ['year', 'month', 'day']):
+                expiry_date = datetime.date(int(selected_date['year']), int(selected_date['month']),
+                                            int(selected_date['day']))
+                days_to_expiry = (expiry_date - datetime.date.fromtimestamp(self.clock())).days
             
             # Get the option pair - could be a single item or a list
             option_pair = chain_response.get('OptionPair', [])
@@ -137,150 +293,107 @@ class SpyStrategy:
                 
             if not option_pair:
                 print("No OptionPair found in response")
-                return {}
+                return None
                 
             # Use the first option pair (closest to the target price)
             pair = option_pair[0]
+            call = OptionQuote.from_api(pair.get('Call') or {})
+            put = OptionQuote.from_api(pair.get('Put') or {})
+            if expiry_date is not None:
+                # Fill Greeks the response left out from the quotes themselves
+                with metrics.span('strategy.greeks'):
+                    years = pricing.years_to_expiry(expiry_date, self.clock())
+                    call = pricing.fill_option_greeks(call, self.spot_price, years, is_call=True)
+                    put = pricing.fill_option_greeks(put, self.spot_price, years, is_call=False)
+            underlier = (pair.get('Call') or {}).get('symbol', self.symbol)
             
-            # Extract call and put data
-            call_data = pair.get('Call', {})
-            put_data = pair.get('Put', {})
-            
-            # Calculate straddle values
-            call_last_price = call_data.get('lastPrice', 0)
-            put_last_price = put_data.get('lastPrice', 0)
-            call_bid = call_data.get('bid', 0)
-            put_bid = put_data.get('bid', 0)
-            call_ask = call_data.get('ask', 0)
-            put_ask = put_data.get('ask', 0)
-            strike_price = call_data.get('strikePrice', self.spy_price)
-            
-            # Calculate straddle price and break-even points
-            straddle_price = round(float(call_last_price) + float(put_last_price), 2) if isinstance(call_last_price, (int, float)) and isinstance(put_last_price, (int, float)) else 'N/A'
-            
-            # Calculate break-even bounds and distance if we have valid data
-            break_even_lower = None
-            break_even_upper = None
-            break_even_distance = None
-            
-            if isinstance(strike_price, (int, float)) and isinstance(straddle_price, (int, float)):
-                break_even_lower = round(float(strike_price) - float(straddle_price), 2)
-                break_even_upper = round(float(strike_price) + float(straddle_price), 2)
-                break_even_distance = round(float(straddle_price), 2)
-            
-            # Create straddle info
-            straddle = {
-                'symbol': f"{call_data.get('symbol', 'SPY')} {strike_price} Straddle",
-                'strike_price': strike_price,
-                'last_price': straddle_price,
-                'bid': round(float(call_bid) + float(put_bid), 2) if isinstance(call_bid, (int, float)) and isinstance(put_bid, (int, float)) else 'N/A',
-                'ask': round(float(call_ask) + float(put_ask), 2) if isinstance(call_ask, (int, float)) and isinstance(put_ask, (int, float)) else 'N/A',
-                'break_even_lower': break_even_lower,
-                'break_even_upper': break_even_upper,
-                'break_even_distance': break_even_distance
-            }
-            
-            # Build result dictionary
-            result = {
-                'expiry_date': expiry_date.strftime('%Y-%m-%d') if expiry_date else 'Unknown',
-                'days_to_expiry': days_to_expiry,
-                'call': {
-                    'symbol': call_data.get('displaySymbol', call_data.get('symbol', 'N/A')),
-                    'strike_price': call_data.get('strikePrice', 'N/A'),
-                    'last_price': call_data.get('lastPrice', 'N/A'),
-                    'bid': call_data.get('bid', 'N/A'),
-                    'ask': call_data.get('ask', 'N/A'),
-                    'volume': call_data.get('volume', 'N/A'),
-                    'open_interest': call_data.get('openInterest', 'N/A'),
-                },
-                'put': {
-                    'symbol': put_data.get('displaySymbol', put_data.get('symbol', 'N/A')),
-                    'strike_price': put_data.get('strikePrice', 'N/A'),
-                    'last_price': put_data.get('lastPrice', 'N/A'),
-                    'bid': put_data.get('bid', 'N/A'),
-                    'ask': put_data.get('ask', 'N/A'),
-                    'volume': put_data.get('volume', 'N/A'),
-                    'open_interest': put_data.get('openInterest', 'N/A'),
-                },
-                'straddle': straddle
-            }
-            
-            # Add Greeks if available
-            if 'OptionGreeks' in call_data:
-                result['call']['greeks'] = call_data['OptionGreeks']
-                
-            if 'OptionGreeks' in put_data:
-                result['put']['greeks'] = put_data['OptionGreeks']
-                
-            return result
+            return ChainSnapshot(
+                underlier=self.symbol,
+                spot_price=to_float(self.spot_price),
+                expiry_date=expiry_date,
+                days_to_expiry=days_to_expiry,
+                timestamp=self.clock(),
+                call=call,
+                put=put,
+                straddle=Straddle.from_quotes(underlier, call, put)
+            )
             
         except Exception as e:
             print(f"Error processing option chain: {e}")
-            return {}
+            return None
     
+    @staticmethod
+    def _format_value(value):
+        """
+        Format a numeric field for display, showing N/A for missing values
+        """
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            return 'N/A'
+        return value
+
+    def _display_option(self, label: str, option: OptionQuote):
+        """
+        Display a single call or put option
+        """
+        fmt = self._format_value
+        print(f"\n{label} OPTION:")
+        print(f"Symbol: {option.symbol or 'N/A'}")
+        print(f"Strike Price: ${fmt(option.strike_price)}")
+        print(f"Last Price: ${fmt(option.last_price)}")
+        print(f"Bid: ${fmt(option.bid)}")
+        print(f"Ask: ${fmt(option.ask)}")
+        print(f"Volume: {fmt(option.volume)}")
+        print(f"Open Interest: {fmt(option.open_interest)}")
+        
+        # Display Greeks if available
+        if option.has_greeks:
+            print("\nGreeks:")
+            print(f"  Delta: {fmt(option.delta)}")
+            print(f"  Gamma: {fmt(option.gamma)}")
+            print(f"  Theta: {fmt(option.theta)}")
+            print(f"  Vega: {fmt(option.vega)}")
+            print(f"  IV: {fmt(option.iv)}")
+
     def _display_options(self):
         """
-        Display the current SPY price and option prices
+        Display the current underlier price and option prices
         """
         if not self.option_data:
             print("No option data available.")
             return
             
-        print("\n===== SPY STRATEGY RESULTS =====")
-        print(f"Current SPY Price: ${self.spy_price}")
-        print(f"Expiry Date: {self.option_data.get('expiry_date')}")
-        print(f"Days to Expiry: {self.option_data.get('days_to_expiry')}")
-        
-        call = self.option_data.get('call', {})
-        put = self.option_data.get('put', {})
-        straddle = self.option_data.get('straddle', {})
-        
-        print("\nCALL OPTION:")
-        print(f"Symbol: {call.get('symbol', 'N/A')}")
-        print(f"Strike Price: ${call.get('strike_price', 'N/A')}")
-        print(f"Last Price: ${call.get('last_price', 'N/A')}")
-        print(f"Bid: ${call.get('bid', 'N/A')}")
-        print(f"Ask: ${call.get('ask', 'N/A')}")
-        print(f"Volume: {call.get('volume', 'N/A')}")
-        print(f"Open Interest: {call.get('open_interest', 'N/A')}")
-        
-        # Display Greeks if available
-        if 'greeks' in call:
-            greeks = call['greeks']
-            print("\nGreeks:")
-            print(f"  Delta: {greeks.get('delta', 'N/A')}")
-            print(f"  Gamma: {greeks.get('gamma', 'N/A')}")
-            print(f"  Theta: {greeks.get('theta', 'N/A')}")
-            print(f"  Vega: {greeks.get('vega', 'N/A')}")
-            print(f"  IV: {greeks.get('iv', 'N/A')}")
-        
-        print("\nPUT OPTION:")
-        print(f"Symbol: {put.get('symbol', 'N/A')}")
-        print(f"Strike Price: ${put.get('strike_price', 'N/A')}")
-        print(f"Last Price: ${put.get('last_price', 'N/A')}")
-        print(f"Bid: ${put.get('bid', 'N/A')}")
-        print(f"Ask: ${put.get('ask', 'N/A')}")
-        print(f"Volume: {put.get('volume', 'N/A')}")
-        print(f"Open Interest: {put.get('open_interest', 'N/A')}")
+        snapshot = self.option_data
+        straddle = snapshot.straddle
+        fmt = self._format_value
+
+        print(f"\n===== {self.symbol} STRATEGY RESULTS =====")
+        print(f"Current {self.symbol} Price: ${self.spot_price}")
+        print(f"Expiry Date: {snapshot.expiry_date or 'Unknown'}")
+        print(f"Days to Expiry: {snapshot.days_to_expiry}")
         
-        # Display Greeks if available
-        if 'greeks' in put:
-            greeks = put['greeks']
-            print("\nGreeks:")
-            print(f"  Delta: {greeks.get('delta', 'N/A')}")
-            print(f"  Gamma: {greeks.get('gamma', 'N/A')}")
-            print(f"  Theta: {greeks.get('theta', 'N/A')}")
-            print(f"  Vega: {greeks.get('vega', 'N/A')}")
-            print(f"  IV: {greeks.get('iv', 'N/A')}")
+        self._display_option("CALL", snapshot.call)
+        self._display_option("PUT", snapshot.put)
             
         print("\nSTRADDLE OPTION:")
-        print(f"Symbol: {straddle.get('symbol', 'N/A')}")
-        print(f"Strike Price: ${straddle.get('strike_price', 'N/A')}")
-        print(f"Last Price: ${straddle.get('last_price', 'N/A')}")
-        print(f"Bid: ${straddle.get('bid', 'N/A')}")
-        print(f"Ask: ${straddle.get('ask', 'N/A')}")
-        print(f"Break Even Lower: ${straddle.get('break_even_lower', 'N/A')}")
-        print(f"Break Even Upper: ${straddle.get('break_even_upper', 'N/A')}")
-        print(f"Break Even Distance: ${straddle.get('break_even_distance', 'N/A')}")
+        print(f"Symbol: {straddle.symbol}")
+        print(f"Strike Price: ${fmt(straddle.strike_price)}")
+        print(f"Last Price: ${fmt(straddle.last_price)}")
+        print(f"Bid: ${fmt(straddle.bid)}")
+        print(f"Ask: ${fmt(straddle.ask)}")
+        print(f"Break Even Lower: ${fmt(straddle.break_even_lower)}")
+        print(f"Break Even Upper: ${fmt(straddle.break_even_upper)}")
+        print(f"Break Even Distance: ${fmt(straddle.break_even_distance)}")
         
-        print("================================")
\ No newline at end of file
+        print("================================")
+
+
+class SpyStrategy(StraddleStrategy):
+    """
+    A class to implement the SPY options strategy
+    """
+
+    def __init__(self, client):
+        """
+        Initialize the SPY strategy with the E*TRADE client
+        """
+        super().__init__(client, symbol='SPY', strike_increment=1.0)  # SPY lists $1 strikes around the money
@@ -1,34 +1,224 @@
 """
 This module implements a web UI for the SPY strategy using Flask.
-It displays call and put option metrics, and straddle details with auto-refresh.
+It displays call and put option metrics, and straddle details with auto-refresh,
+or one row per underlier when driven by a MultiUnderlierRunner, and an
+optional panel of open orders with a live feed of fills, cancels and new orders.
+With serve(), this process only produces: every snapshot is published to
+shared memory and any number of worker processes (see wsgi.py) answer reads.
 """
 
+import asyncio
+import multiprocessing
+import socket
 import threading
 import time
 import webbrowser
 import json
-from flask import Flask, render_template, jsonify
+from flask import Flask, Response, render_template, jsonify, request
 from flask_cors import CORS
 
+import metrics
+from history_store import history_to_json
+from option_models import ChainSnapshot
+from order_monitor import POLL_INTERVAL
+from request_executor import is_unavailable
+from scheduler import RefreshScheduler
+from shared_snapshot import SnapshotPublisher
+from wire_format import JSON, IDENTITY, PayloadVersions, compress, content_encodings, encode_history, media_types
+
+# Seconds between keep-alive comments on idle event streams
+STREAM_KEEPALIVE = 15
+# Window of the pre-serialized history published for workers
+HISTORY_WINDOW = 24 * 60 * 60
+
+CONNECTION_GAUGE = metrics.REGISTRY.gauge('etrade_connections', 'Keep-alive pool counters of the client')
+CACHE_GAUGE = metrics.REGISTRY.gauge('etrade_cache', 'Response cache counters of the client')
+UI_TICKS = metrics.REGISTRY.counter('etrade_ui_ticks_total', 'Dashboard update ticks by outcome')
+REFRESH_INTERVAL_GAUGE = metrics.REGISTRY.gauge('etrade_refresh_interval_seconds',
+                                                'Current adaptive interval of each scheduled refresh job')
+
+
+def conditional_response(payload, etag, mimetype='application/json', encoding=None, current=False):
+    """
+    Answer 304 when the request's If-None-Match holds the current ETag, else send the payload
+
+    Args:
+        payload: The serialized response body (unused for a 304)
+        etag: The unquoted entity tag of the payload (a content version), or None to skip validation
+        mimetype: The response content type
+        encoding: The Content-Encoding applied to the payload when it was negotiated (adds Vary)
+        current: Whether the client showed it holds this version some other way (?since=)
+    """
+    if etag is not None and (current or etag in request.if_none_match):
+        response = Response(status=304)
+    else:
+        response = Response(payload, mimetype=mimetype)
+        if encoding not in (None, IDENTITY):
+            response.headers['Content-Encoding'] = encoding
+    if encoding is not None:
+        response.vary.update(('Accept', 'Accept-Encoding'))
+    if etag is not None:
+        response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _negotiate(columns=False):
+    """
+    Pick the response format and compression from the request's Accept and Accept-Encoding headers
+    """
+    media_type = request.accept_mimetypes.best_match(media_types(columns), default=JSON)
+    encoding = request.accept_encodings.best_match(content_encodings(), default=IDENTITY)
+    return media_type, encoding
+
+
+def versioned_response(versions, version):
+    """
+    Answer a snapshot endpoint from its recorded versions: 304 when the client holds the
+    current version (If-None-Match or ?since=), a delta against ?since= when that version
+    is still known, else the whole snapshot, in the negotiated format and compression
+
+    Args:
+        versions: The endpoint's PayloadVersions
+        version: The current version
+    """
+    etag = str(version)
+    since = request.args.get('since', type=int)
+    media_type, encoding = _negotiate()
+    if since == version or etag in request.if_none_match:
+        return conditional_response(None, etag, media_type, encoding, current=True)
+    body, encoding = versions.body(version, media_type, encoding, since)
+    return conditional_response(body, etag, media_type, encoding)
+
+
+def history_response(window, bodies=None, version=None):
+    """
+    Answer a history request in the negotiated format (JSON, MessagePack or packed columns) and compression
+
+    Args:
+        window: Returns (start, end, columns) of the requested window; only called when the body is not cached
+        bodies: Optional EncodedBodies caching the encoded window per version
+        version: Version of a published window (required with bodies)
+    """
+    etag = None if version is None else str(version)
+    media_type, encoding = _negotiate(columns=True)
+    if etag is not None and etag in request.if_none_match:
+        return conditional_response(None, etag, media_type, encoding)
+
+    def build():
+        start, end, columns = window()
+        return compress(encode_history(columns, start, end, media_type, history_to_json), encoding)
+    if bodies is None:
+        body, encoding = build()
+    else:
+        body, encoding = bodies.get(('history', version, media_type, encoding), build)
+    return conditional_response(body, etag, media_type, encoding)
+
+
+def snapshot_event(versions, known_version, version, payload):
+    """
+    Build the SSE message moving a browser from known_version to version
+    """
+    delta = versions.delta_json(known_version, version)
+    if delta is not None:
+        return f"id: {version}\nevent: delta\ndata: {delta}\n\n"
+    if isinstance(payload, bytes):
+        payload = payload.decode('utf-8')
+    return f"id: {version}\nevent: snapshot\ndata: {payload}\n\n"
+
+
+class SnapshotBroadcaster:
+    """
+    Holds the latest snapshot serialized once and wakes every stream subscriber when a tick arrives
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._content = None
+        self.sequence = 0  # bumped on every tick
+        self.version = 0  # bumped only when the snapshot content changes
+        self.timestamp = None
+        self.payload = None
+        self.versions = PayloadVersions()  # recent versions, served whole or as deltas
+
+    def publish(self, data):
+        """
+        Publish a snapshot; ticks whose content is unchanged only advance the sequence
+
+        Args:
+            data: The JSON-ready snapshot dict
+
+        Returns:
+            True if the content changed and a new version was serialized
+        """
+        content = {key: value for key, value in data.items() if key != 'timestamp'}
+        with self._condition:
+            changed = content != self._content
+            if changed:
+                self._content = content
+                self.version += 1
+                document = dict(data, version=self.version)
+                self.payload = json.dumps(document, separators=(',', ':'))
+                self.versions.record(self.version, document, self.payload)
+            self.sequence += 1
+            self.timestamp = data.get('timestamp')
+            self._condition.notify_all()
+        return changed
+
+    def current(self):
+        """
+        Get the latest (sequence, version, timestamp, payload)
+        """
+        with self._condition:
+            return self.sequence, self.version, self.timestamp, self.payload
+
+    def wait_for_tick(self, last_sequence, timeout=STREAM_KEEPALIVE):
+        """
+        Wait until a tick newer than last_sequence is published
+
+        Returns:
+            (sequence, version, timestamp, payload), or None on timeout
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.sequence > last_sequence, timeout=timeout)
+            if self.sequence <= last_sequence:
+                return None
+            return self.sequence, self.version, self.timestamp, self.payload
+
+
 class StrategyWebUI:
     """
     A class to implement the web UI for displaying SPY strategy results
     """
     
-    def __init__(self, spy_strategy):
+    def __init__(self, spy_strategy, history_store=None, scheduler=None, order_monitor=None, publisher=None,
+                 alert_engine=None):
         """
         Initialize the web UI with the SPY strategy
         
         Args:
-            spy_strategy: An instance of SpyStrategy
+            spy_strategy: An instance of SpyStrategy (any StraddleStrategy) or MultiUnderlierRunner
+            history_store: Optional HistoryStore that records every snapshot
+            scheduler: Optional shared RefreshScheduler (one is created if omitted)
+            order_monitor: Optional OrderMonitor polled for the orders panel
+            publisher: Optional SnapshotPublisher that shares every snapshot with worker processes
+            alert_engine: Optional AlertEngine evaluated on every tick
         """
         self.spy_strategy = spy_strategy
+        self.history_store = history_store
+        self.order_monitor = order_monitor
+        self.publisher = publisher
+        self.alert_engine = alert_engine
+        self._history_version = 0
         self.app = Flask(__name__, template_folder='templates')
         CORS(self.app)
         self.data_lock = threading.Lock()
         self.latest_data = None
+        self.broadcaster = SnapshotBroadcaster()
         self.running = False
-        self.refresh_interval = 10  # seconds
+        self.refresh_interval = 10  # base seconds between ticks while the market is open
+        self.scheduler = scheduler or RefreshScheduler()
+        self._loop = None
         
         # Register routes
         self._register_routes()
@@ -44,48 +234,257 @@ class StrategyWebUI:
         @self.app.route('/api/strategy-data')
         def get_strategy_data():
             """API endpoint to get the latest strategy data"""
-            with self.data_lock:
-                if self.latest_data:
-                    return jsonify(self.latest_data)
-                return jsonify({"status": "initializing"})
+            _, version, _, payload = self.broadcaster.current()
+            if payload:
+                return versioned_response(self.broadcaster.versions, version)
+            return jsonify({"status": "initializing"})
+
+        @self.app.route('/api/stream')
+        def stream_strategy_data():
+            """Server-Sent Events endpoint pushing each new snapshot to the browser"""
+            last_event_id = request.headers.get('Last-Event-ID', '')
+            known_version = int(last_event_id) if last_event_id.isdigit() else 0
+            return Response(self._stream_events(known_version), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+        @self.app.route('/api/history')
+        def get_history():
+            """API endpoint to get recorded snapshots between ?from= and ?to= (Unix seconds)"""
+            if self.history_store is None:
+                return jsonify({"status": "error", "message": "History is not enabled"}), 404
+            now = time.time()
+            start = request.args.get('from', type=float, default=now - 24 * 60 * 60)
+            end = request.args.get('to', type=float, default=now)
+            return history_response(lambda: (start, end, self.history_store.read(start, end)))
+
+        @self.app.route('/api/orders')
+        def get_orders():
+            """API endpoint to get the open orders and the recent order events"""
+            if self.order_monitor is None:
+                return jsonify({"status": "error", "message": "Order monitoring is not enabled"}), 404
+            snapshot = self.order_monitor.snapshot()
+            return conditional_response(json.dumps(snapshot, separators=(',', ':')), str(snapshot['revision']))
+
+        @self.app.route('/api/orders/stream')
+        def stream_orders():
+            """Server-Sent Events endpoint pushing each fill, cancel and new order after ?after= (a sequence number)"""
+            if self.order_monitor is None:
+                return jsonify({"status": "error", "message": "Order monitoring is not enabled"}), 404
+            last_event_id = request.headers.get('Last-Event-ID', '')
+            if last_event_id.isdigit():
+                sequence = int(last_event_id)
+            else:
+                sequence = request.args.get('after', type=int, default=self.order_monitor.sequence)
+            return Response(self._stream_order_events(sequence), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+        @self.app.route('/api/connection-stats')
+        def get_connection_stats():
+            """API endpoint to check keep-alive connection reuse of the client"""
+            return jsonify(self.spy_strategy.client.connection_stats())
+
+        @self.app.route('/api/cache-stats')
+        def get_cache_stats():
+            """API endpoint to check the client response cache counters"""
+            return jsonify(self.spy_strategy.client.cache.stats())
+
+        @self.app.route('/metrics')
+        def get_metrics():
+            """Prometheus scrape endpoint for the hot-path spans, counters and gauges"""
+            client = self.spy_strategy.client
+            for name, value in client.connection_stats().items():
+                CONNECTION_GAUGE.set(value, stat=name)
+            for name, value in client.cache.stats().items():
+                CACHE_GAUGE.set(value, stat=name)
+            for name, job in self.scheduler.stats().items():
+                REFRESH_INTERVAL_GAUGE.set(job['interval'], job=name)
+            return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+        @self.app.route('/debug/profiler', methods=['GET', 'POST'])
+        def profiler():
+            """Read the sampling profiler's folded stacks (GET), or start or stop it (POST ?action=start|stop)"""
+            if request.method == 'GET':
+                if 'action' in request.args:
+                    return jsonify({"status": "error", "message": "Use POST to start or stop the profiler"}), 405
+                return Response(metrics.PROFILER.folded(request.args.get('top', type=int)), mimetype='text/plain')
+            action = request.values.get('action')
+            if action == 'start':
+                metrics.PROFILER.reset()
+                metrics.PROFILER.start()
+            elif action == 'stop':
+                metrics.PROFILER.stop()
+            else:
+                return jsonify({"status": "error", "message": f"Unknown action: {action}"}), 400
+            return jsonify({"running": metrics.PROFILER.running, "samples": metrics.PROFILER.samples})
     
+    def _stream_events(self, known_version):
+        """
+        Generate SSE messages: a delta against the version the browser holds when
+        its version changes (the full snapshot if that version is gone), otherwise
+        a tiny "unchanged" event carrying the version and tick time
+        """
+        sequence, version, _, payload = self.broadcaster.current()
+        if payload and version != known_version:
+            yield snapshot_event(self.broadcaster.versions, known_version, version, payload)
+            known_version = version
+
+        while True:
+            tick = self.broadcaster.wait_for_tick(sequence)
+            if tick is None:
+                yield ": keepalive\n\n"
+                continue
+
+            sequence, version, timestamp, payload = tick
+            if version != known_version:
+                yield snapshot_event(self.broadcaster.versions, known_version, version, payload)
+                known_version = version
+            else:
+                yield f"event: unchanged\ndata: {json.dumps({'version': version, 'timestamp': timestamp})}\n\n"
+
+    def _stream_order_events(self, sequence):
+        """
+        Generate one SSE message per order event after a sequence number
+        """
+        while True:
+            events = self.order_monitor.wait_for_events(sequence, STREAM_KEEPALIVE)
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            for event in events:
+                sequence = event.sequence
+                yield f"id: {sequence}\nevent: order\ndata: {json.dumps(event.to_dict(), separators=(',', ':'))}\n\n"
+
     def _update_strategy_data(self):
-        """Update strategy data at regular intervals"""
-        while self.running:
-            try:
-                # Run the strategy to get fresh data
-                data = self.spy_strategy.run_strategy()
-                
-                # Convert to a JSON-serializable format
+        """
+        Run one strategy tick and publish it; the refresh scheduler calls this
+        and backs off when it raises or returns None
+        """
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        try:
+            # Run the strategy to get fresh data
+            data = self._loop.run_until_complete(self.spy_strategy.run_strategy_async())
+
+            # Convert to a JSON-serializable format
+            with metrics.span('ui.format'):
                 formatted_data = self._format_data_for_json(data)
-                
-                # Update the latest data
-                with self.data_lock:
-                    self.latest_data = formatted_data
-            except Exception as e:
-                print(f"Error updating strategy data: {e}")
-            
-            # Wait for the next update
-            time.sleep(self.refresh_interval)
+                stale = self._staleness()
+                if stale and data:
+                    formatted_data['stale'] = stale
+
+            # Update the latest data
+            lock_started = time.perf_counter()
+            with self.data_lock:
+                metrics.SPAN_SECONDS.observe(time.perf_counter() - lock_started, span='ui.lock_wait')
+                self.latest_data = formatted_data
+
+            # Serialize once and push to every connected browser
+            with metrics.span('ui.publish'):
+                self.broadcaster.publish(formatted_data)
+
+            # The history store holds one underlier; basket ticks are not recorded
+            recorded = isinstance(data, ChainSnapshot) and self.history_store is not None
+            if recorded:
+                with metrics.span('ui.history_append'):
+                    self.history_store.append(data)
+            if self.publisher is not None:
+                with metrics.span('ui.share'):
+                    self._share(recorded)
+            if self.alert_engine is not None:
+                self.alert_engine.evaluate(data)
+            UI_TICKS.inc(outcome='ok' if data else 'empty')
+            return data
+        except Exception as e:
+            UI_TICKS.inc(outcome='error')
+            if is_unavailable(e):
+                self._publish_stale()
+            raise
+
+    def _staleness(self):
+        """
+        Describe the cached responses standing in for an unavailable API, or None when every response is fresh
+        """
+        cache = getattr(self.spy_strategy.client, 'cache', None)
+        stale = cache.stale_endpoints() if cache is not None else {}
+        if not stale:
+            return None
+        return {'since': min(stale.values()), 'endpoints': sorted(stale)}
+
+    def _publish_stale(self):
+        """
+        Keep serving the last good snapshot while the API is unavailable, marked stale
+        """
+        with self.data_lock:
+            latest = self.latest_data
+            if not latest or latest.get('status') == 'error':
+                return
+            if 'stale' not in latest:
+                latest = {**latest, 'stale': {'since': time.time(), 'endpoints': []}}
+                self.latest_data = latest
+        self.broadcaster.publish(latest)
+        if self.publisher is not None:
+            self._share(False)
     
+    def _share(self, recorded):
+        """
+        Publish the serialized snapshot (and the history window after an append) to the worker processes
+        """
+        _, version, timestamp, payload = self.broadcaster.current()
+        if payload:
+            self.publisher.publish('strategy', payload, version, timestamp or 0.0)
+        if self.history_store is not None and (recorded or not self._history_version):
+            now = time.time()
+            history = self.history_store.read(now - HISTORY_WINDOW, now)
+            self._history_version += 1
+            payload = json.dumps({"from": now - HISTORY_WINDOW, "to": now, "columns": history_to_json(history)},
+                                 separators=(',', ':'))
+            self.publisher.publish('history', payload, self._history_version, now)
+
+    def _poll_orders(self):
+        """
+        Poll the order monitor and share its snapshot with the worker processes
+        """
+        events = self.order_monitor.poll()
+        if self.publisher is not None:
+            snapshot = self.order_monitor.snapshot()
+            self.publisher.publish('orders', json.dumps(snapshot, separators=(',', ':')), snapshot['revision'], time.time())
+        return events
+
     def _format_data_for_json(self, data):
         """Format strategy data for JSON serialization"""
         if not data:
             return {"status": "error", "message": "No data available"}
         
-        # Create a deep copy to avoid modifying the original data
-        formatted = {
-            "timestamp": int(time.time()),
-            "spy_price": self.spy_strategy.spy_price,
-            "expiry_date": data.get("expiry_date", "Unknown"),
-            "days_to_expiry": data.get("days_to_expiry", "Unknown"),
-            "call": data.get("call", {}),
-            "put": data.get("put", {}),
-            "straddle": data.get("straddle", {})
-        }
-        
-        return formatted
+        return data.to_dict()
     
+    def _start_jobs(self):
+        """
+        Start the token renewal and the scheduled refresh jobs
+
+        Returns:
+            The client's TokenManager, if it has one
+        """
+        self.running = True
+
+        # Keep the OAuth tokens active while the dashboard idles (e.g. overnight at the slow closed-market rate)
+        tokens = getattr(self.spy_strategy.client, 'tokens', None)
+        if tokens is not None:
+            tokens.start()
+        
+        # Tick at a fixed rate during market hours (faster near the close); the first tick runs immediately
+        self.scheduler.register('dashboard', self._update_strategy_data, interval=self.refresh_interval)
+        if self.order_monitor is not None:
+            # One list_orders page per account per poll, plus a page of open orders
+            self.scheduler.register('orders', self._poll_orders, interval=POLL_INTERVAL, requests_per_run=2.0)
+        self.scheduler.start()
+        return tokens
+
+    def _stop_jobs(self, tokens):
+        self.running = False
+        self.scheduler.stop()
+        if tokens is not None:
+            tokens.stop()
+
     def start(self, port=5000):
         """
         Start the web UI server
@@ -93,12 +492,7 @@ class StrategyWebUI:
         Args:
             port: The port to run the server on
         """
-        self.running = True
-        
-        # Start the data update thread
-        update_thread = threading.Thread(target=self._update_strategy_data)
-        update_thread.daemon = True
-        update_thread.start()
+        tokens = self._start_jobs()
         
         # Open the browser
         webbrowser.open(f"http://localhost:{port}/")
@@ -107,4 +501,56 @@ class StrategyWebUI:
         try:
             self.app.run(debug=False, host='localhost', port=port)
         finally:
-            self.running = False
\ No newline at end of file
+            self._stop_jobs(tokens)
+
+    def serve(self, port=5000, workers=2):
+        """
+        Run the strategy in this process only and serve the web UI from worker processes.
+        Workers read the snapshots this process publishes to shared memory, so
+        adding workers scales reads without adding E*TRADE requests.
+
+        Args:
+            port: The port the workers share
+            workers: Number of worker processes; 0 only publishes, for an external
+                     WSGI server running wsgi:create_app()
+        """
+        from wsgi import run_worker
+
+        if self.publisher is None:
+            self.publisher = SnapshotPublisher()
+        history_dir = self.history_store.base_dir if self.history_store is not None else None
+        tokens = self._start_jobs()
+        context = multiprocessing.get_context('spawn')
+        processes = []
+        listener = None
+        try:
+            if workers:
+                listener = socket.create_server(('localhost', port))
+                processes = [context.Process(target=run_worker, args=(listener, self.publisher.directory, history_dir),
+                                             name=f"web-worker-{index}", daemon=True)
+                             for index in range(workers)]
+                for process in processes:
+                    process.start()
+                print(f"Serving on http://localhost:{port}/ with {workers} worker processes")
+                webbrowser.open(f"http://localhost:{port}/")
+            else:
+                print(f"Publishing snapshots to {self.publisher.directory}")
+            while True:
+                time.sleep(1)
+                for index, process in enumerate(processes):
+                    if not process.is_alive():
+                        print(f"{process.name} exited with code {process.exitcode}; restarting it")
+                        processes[index] = context.Process(target=run_worker, name=process.name, daemon=True,
+                                                           args=(listener, self.publisher.directory, history_dir))
+                        processes[index].start()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
+            if listener is not None:
+                listener.close()
+            self._stop_jobs(tokens)
+            self.publisher.close()
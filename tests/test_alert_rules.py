@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from alert_rules import AlertEngine, FileSink, load_engine
+from option_models import BasketSnapshot, ChainSnapshot, OptionQuote, Straddle
+
+
+def make_snapshot(spot, call_bid=2.0, call_ask=2.2, underlier='SPY'):
+    call = OptionQuote.from_api({'strikePrice': 590, 'bid': call_bid, 'ask': call_ask, 'lastPrice': 2.1})
+    put = OptionQuote.from_api({'strikePrice': 590, 'bid': 1.0, 'ask': 1.2, 'lastPrice': 1.1})
+    return ChainSnapshot(underlier, spot, None, None, 0.0, call, put, Straddle.from_quotes(underlier, call, put))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def fired(engine, data):
+    return [alert.rule for alert in engine.evaluate(data)]
+
+
+def test_crosses_of_break_evens_and_thresholds_fire_once_per_crossing():
+    engine = AlertEngine([
+        {'name': 'upper', 'kind': 'cross', 'field': 'spot_price', 'other': 'straddle.break_even_upper',
+         'direction': 'above'},
+        {'name': 'lower', 'kind': 'cross', 'field': 'spot_price', 'other': 'straddle.break_even_lower',
+         'direction': 'below'},
+        {'name': 'level', 'kind': 'threshold', 'field': 'spot_price', 'op': '>=', 'value': 592},
+    ])
+
+    assert fired(engine, make_snapshot(590.0)) == []
+    assert fired(engine, make_snapshot(592.0)) == ['level']
+    assert fired(engine, make_snapshot(593.5)) == ['upper']
+    assert fired(engine, make_snapshot(594.0)) == []
+    assert fired(engine, make_snapshot(586.0)) == ['lower']
+    assert fired(engine, make_snapshot(593.0)) == ['level']
+
+
+def test_spread_and_rate_rules_use_derived_fields_and_windows():
+    clock = FakeClock()
+    engine = AlertEngine([
+        {'name': 'wide', 'kind': 'spread', 'option': 'call', 'max_percent': 20},
+        {'name': 'jump', 'kind': 'rate', 'field': 'spot_price', 'window': 60, 'change': 2},
+        # A longer window on the same field keeps older samples around
+        {'name': 'drift', 'kind': 'rate', 'field': 'spot_price', 'window': 600, 'change': 50},
+    ], clock=clock)
+
+    assert fired(engine, make_snapshot(590.0)) == []
+    clock.now += 30
+    assert fired(engine, make_snapshot(591.0, call_bid=1.5, call_ask=2.5)) == ['wide']
+    clock.now += 20
+    assert fired(engine, make_snapshot(592.5)) == ['jump']
+    # The window now starts at the 591 sample taken exactly 60s ago: 1.6 is under the change, so jump re-arms
+    clock.now += 40
+    assert fired(engine, make_snapshot(592.6)) == []
+    # Starts at the 592.5 sample exactly 60s ago (1.5), not the older 591 (3.0)
+    clock.now += 20
+    assert fired(engine, make_snapshot(594.0)) == []
+    clock.now += 20
+    assert fired(engine, make_snapshot(595.0)) == ['jump']
+
+
+def test_only_rules_on_changed_fields_run_and_underliers_are_separate(tmp_path):
+    rules = [{'kind': 'threshold', 'field': 'spot_price', 'op': '>', 'value': 500 + i * 0.1} for i in range(2000)]
+    rules.append({'name': 'qqq', 'kind': 'threshold', 'underlier': 'QQQ', 'field': 'call.bid', 'op': '<', 'value': 1})
+    engine = AlertEngine(rules, sinks=[FileSink(str(tmp_path / 'alerts.jsonl'))])
+
+    assert len(engine.evaluate(make_snapshot(550.0))) == 500
+    # Only the rules between the old and the new spot are visited
+    assert len(engine.evaluate(make_snapshot(560.0))) == 100
+    assert engine.evaluate(make_snapshot(560.0)) == []
+
+    basket = BasketSnapshot(0.0, (make_snapshot(560.0, call_bid=0.5), make_snapshot(480.0, call_bid=0.5,
+                                                                                   underlier='QQQ')), ())
+    assert [alert.underlier for alert in engine.evaluate(basket)] == ['QQQ']
+    lines = (tmp_path / 'alerts.jsonl').read_text().splitlines()
+    assert len(lines) == 500 + 100 + 1
+    assert json.loads(lines[-1])['rule'] == 'qqq'
+
+
+def test_load_engine_rejects_unknown_fields(tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps({'rules': [{'kind': 'threshold', 'field': 'spot', 'value': 1}]}))
+    with pytest.raises(ValueError, match='spot'):
+        load_engine(str(path))
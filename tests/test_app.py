@@ -0,0 +1,135 @@
+import functools
+import os
+import stat
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import app
+import daemon
+from app import CommandContext, serve_command, translate_legacy_args
+from tests.test_quote_service import FakeClient
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Cumulative microseconds `import app` may take (it loads argparse and little else)
+IMPORT_BUDGET_US = 50_000
+HEAVY_MODULES = {'flask', 'flask_cors', 'pyetrade', 'requests', 'numpy', 'client', 'spy_strategy', 'strategy_ui'}
+
+
+def imported_modules(*args):
+    result = subprocess.run([sys.executable, '-X', 'importtime', *args], cwd=ROOT, capture_output=True, text=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                modules[name.strip()] = int(cumulative)
+    return modules
+
+
+@pytest.mark.parametrize('argv', [['app.py', '--help'], ['app.py', 'token', '--help'], ['app.py', 'daemon', 'status']])
+def test_cli_does_not_import_heavy_modules(argv):
+    assert not HEAVY_MODULES & set(imported_modules(*argv))
+
+
+def test_import_time_budget():
+    assert imported_modules('-c', 'import app')['app'] < IMPORT_BUDGET_US
+
+
+@pytest.mark.parametrize('legacy, subcommand', [
+    (['--spy-strat'], ['spy']),
+    (['--new-token'], ['token', 'new']),
+    (['--record', 'recordings', '--strategy-ui', '--basket', 'SPY,QQQ'],
+     ['--record', 'recordings', 'ui', '--history-dir', 'history', '--basket', 'SPY,QQQ']),
+    (['--full-chain', '25'], ['chain', '25']),
+    (['--scan-expiries'], ['scan', 'SPY']),
+    (['--portfolio', '--watch', '15'], ['portfolio', '--watch', '15']),
+    (['--replay', 'recordings', '--replay-speed', '10'], ['replay', 'recordings', '--speed', '10']),
+    (['quotes', 'SPY'], ['quotes', 'SPY']),
+])
+def test_legacy_flags_translate_to_subcommands(legacy, subcommand):
+    assert translate_legacy_args(legacy) == subcommand
+
+
+def test_served_commands_reuse_the_warm_context():
+    context = CommandContext(persistent=True)
+    context._client = FakeClient()
+    context._env_stamp = context._stamp()
+
+    first = serve_command(['quotes', 'SPY,QQQ'], context)
+    service = context._objects['quotes']
+    second = serve_command(['quotes', 'SPY'], context)
+    assert context._objects['quotes'] is service
+    refused = serve_command(['ui'], context)
+    context.close()
+
+    assert first['status'] == 0
+    assert 'QQQ' in first['output'] and 'Upstream quote requests: 1' in first['output']
+    # The warm QuoteService coalesces the repeat within its window
+    assert second['status'] == 0 and 'Upstream quote requests: 0' in second['output']
+    assert context._client.calls == [['SPY', 'QQQ']]
+    assert refused['status'] == 1 and "does not run 'ui'" in refused['output']
+
+
+def test_daemon_round_trip(tmp_path):
+    path = str(tmp_path / 'daemon.json')
+    server = daemon.DaemonServer(lambda argv: {'status': 0, 'output': ' '.join(argv)}, path=path)
+    thread = threading.Thread(target=server.serve, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while daemon.read_state(path) is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert daemon.request({'argv': ['spy']}, path=path) == {'status': 0, 'output': 'spy'}
+
+    forged = dict(daemon.read_state(path), authkey='00' * 32)
+    forged_path = str(tmp_path / 'forged.json')
+    daemon.write_state(forged, forged_path)
+    assert daemon.request({'argv': ['spy']}, path=forged_path) is None
+
+    assert 'command(s) served' in daemon.request({'command': 'status'}, path=path)['output']
+    assert daemon.request({'command': 'stop'}, path=path)['output'] == "Daemon stopped\n"
+    thread.join(5)
+    assert not thread.is_alive()
+    assert not os.path.exists(path)
+
+
+def test_busy_daemon_is_reported_instead_of_rerun(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    release = threading.Event()
+    handled = []
+
+    def handler(argv):
+        handled.append(argv)
+        release.wait(5)
+        return {'status': 0, 'output': 'done'}
+
+    server = daemon.DaemonServer(handler)
+    thread = threading.Thread(target=server.serve, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while daemon.read_state() is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    started = time.monotonic()
+    with pytest.raises(daemon.DaemonReplyError):
+        daemon.request({'argv': ['slow']}, timeout=0.2)
+    assert time.monotonic() - started < 1
+
+    # While 'slow' runs, a forwarded command is refused without running, and not rerun in-process
+    ran = []
+    monkeypatch.setattr(daemon, 'request', functools.partial(daemon.request, timeout=0.2))
+    monkeypatch.setitem(app.COMMANDS, 'spy', lambda args, context: ran.append(args))
+    started = time.monotonic()
+    assert app.main(['spy']) == 1
+    assert time.monotonic() - started < 1
+    assert ran == []
+
+    release.set()
+    assert daemon.request({'command': 'stop'}, timeout=5)['output'] == "Daemon stopped\n"
+    thread.join(5)
+    assert handled == [['slow']]
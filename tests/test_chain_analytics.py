@@ -0,0 +1,36 @@
+import numpy as np
+
+from chain_analytics import atm_index, compute_straddles, load_chain_arrays
+
+
+def make_chain(strikes):
+    return {'OptionChainResponse': {'OptionPair': [
+        {
+            'Call': {'strikePrice': strike, 'bid': 2.0, 'ask': 2.2, 'lastPrice': 2.1,
+                     'OptionGreeks': {'delta': 0.5, 'iv': 0.2}},
+            'Put': {'strikePrice': strike, 'bid': 1.0, 'ask': 1.2, 'lastPrice': 'N/A'},
+        }
+        for strike in strikes
+    ]}}
+
+
+def test_load_chain_arrays_sorts_and_fills_missing_with_nan():
+    chain = load_chain_arrays(make_chain([592, 590, 591]))
+
+    assert chain['strike'].tolist() == [590, 591, 592]
+    assert chain['call_delta'].tolist() == [0.5, 0.5, 0.5]
+    assert np.isnan(chain['put_delta']).all()
+    assert np.isnan(chain['put_last']).all()
+
+
+def test_compute_straddles_is_vectorized_over_all_strikes():
+    strikes = list(range(500, 650))
+    chain = load_chain_arrays(make_chain(strikes))
+
+    straddles = compute_straddles(chain, spot=590.0)
+
+    assert straddles['straddle_mid'].shape == (150,)
+    assert np.allclose(straddles['straddle_bid'], 3.0)
+    assert np.allclose(straddles['straddle_spread'], 0.4)
+    assert np.allclose(straddles['parity_residual'], 1.0 - (590.0 - chain['strike']))
+    assert atm_index(chain, 590.4) == 90
@@ -1,7 +1,62 @@
+import time
+
+import pyetrade
 import pytest
-from client import main
 
-@pytest.mark.skip(reason="Not implemented")
-def test_main():
-    # Assuming main function returns a status code
-    main()
\ No newline at end of file
+from client import Client, ResponseCache
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('ENV_TYPE', 'sandbox')
+    monkeypatch.setenv('SANDBOX_CONSUMER_KEY', 'key')
+    monkeypatch.setenv('SANDBOX_CONSUMER_SECRET', 'secret')
+    return Client(skip_tokens=True)
+
+
+def test_services_are_pooled_until_reset(client):
+    market = client._get_service(pyetrade.ETradeMarket)
+
+    assert client._get_service(pyetrade.ETradeMarket) is market
+    client.reset_sessions()
+    assert client._get_service(pyetrade.ETradeMarket) is not market
+
+
+def test_option_chains_are_cached_per_strike(client, monkeypatch):
+    calls = []
+    market = client._get_service(pyetrade.ETradeMarket)
+    monkeypatch.setattr(market, 'get_option_chains', lambda **params: calls.append(params) or {'n': len(calls)})
+
+    first = client.get_option_chains('SPY', strike_price=590)
+    second = client.get_option_chains('SPY', strike_price=590)
+    client.get_option_chains('SPY', strike_price=591)
+
+    assert first is second
+    assert len(calls) == 2
+    assert client.cache.stats()['hits'] == 1
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2, ttls={'quote': 60})
+    cache.get_or_fetch('quote', ('A',), lambda: 'a')
+    cache.get_or_fetch('quote', ('B',), lambda: 'b')
+    cache.get_or_fetch('quote', ('A',), lambda: 'a2')
+    cache.get_or_fetch('quote', ('C',), lambda: 'c')
+
+    assert cache.get_or_fetch('quote', ('A',), lambda: 'a3') == 'a'
+    assert cache.get_or_fetch('quote', ('B',), lambda: 'b2') == 'b2'
+    assert cache.stats()['evictions'] == 2
+
+
+def test_cache_serves_stale_while_revalidating():
+    cache = ResponseCache(ttls={'quote': 0.01}, stale_while_revalidate=60)
+    cache.get_or_fetch('quote', ('A',), lambda: 'old')
+    time.sleep(0.02)
+
+    assert cache.get_or_fetch('quote', ('A',), lambda: 'new') == 'old'
+    for _ in range(100):
+        if cache.get_or_fetch('quote', ('A',), lambda: 'newer') == 'new':
+            break
+        time.sleep(0.01)
+    assert cache.stats()['stale_hits'] >= 1
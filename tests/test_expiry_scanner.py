@@ -0,0 +1,56 @@
+import datetime
+import time
+
+from expiry_scanner import ExpiryScannerStrategy
+
+
+class FakeClient:
+    def __init__(self, expiries, latency=0.05, spot=590.0):
+        self.expiries = expiries
+        self.latency = latency
+        self.spot = spot
+        self.strikes = set()
+
+    def get_market_quote(self, symbols, resp_format='xml'):
+        return {'QuoteResponse': {'QuoteData': [{'Product': {'symbol': 'SPY'}, 'All': {'lastTrade': self.spot}}]}}
+
+    def get_option_expire_dates(self, symbol):
+        return [(expiry, 'WEEKLY') for expiry in self.expiries]
+
+    def get_option_chains(self, symbol, strike_price=None, expiry_date=None, no_of_strikes=1):
+        time.sleep(self.latency)
+        self.strikes.add(strike_price)
+        width = (expiry_date - self.expiries[0]).days + 1
+        return {'OptionChainResponse': {'OptionPair': [{
+            'Call': {'strikePrice': 590, 'bid': width, 'ask': width, 'lastPrice': width,
+                     'OptionGreeks': {'iv': 0.2}},
+            'Put': {'strikePrice': 590, 'bid': width, 'ask': width, 'lastPrice': width,
+                    'OptionGreeks': {'iv': 0.1}},
+        }]}}
+
+
+def test_scan_fetches_expiries_concurrently():
+    start = datetime.date.today()
+    expiries = [start + datetime.timedelta(days=i) for i in range(30)]
+    scanner = ExpiryScannerStrategy(FakeClient(expiries), max_workers=10)
+
+    started = time.perf_counter()
+    rows = scanner.run_strategy()
+    elapsed = time.perf_counter() - started
+
+    assert [row['expiry_date'] for row in rows] == expiries
+    assert elapsed < 30 * 0.05 / 2
+    assert rows[0]['straddle_mid'] == 2
+    assert rows[0]['days_to_expiry'] == 0
+    assert abs(rows[-1]['implied_move_percent'] - 60 / 590 * 100) < 1e-9
+    assert abs(rows[0]['iv'] - 0.15) < 1e-9
+
+
+def test_scan_requests_the_listed_strike_nearest_the_money():
+    expiries = [datetime.date.today() + datetime.timedelta(days=i) for i in range(3)]
+    client = FakeClient(expiries, latency=0)
+    for spot in (590.12, 589.87, 590.3):
+        client.spot = spot
+        ExpiryScannerStrategy(client).run_strategy()
+    # Every tick near 590 sends the same cacheable request
+    assert client.strikes == {590.0}
@@ -0,0 +1,44 @@
+import time
+
+import numpy as np
+
+from history_store import HistoryStore
+from option_models import ChainSnapshot, OptionQuote, Straddle
+
+
+def make_snapshot(timestamp, spot):
+    call = OptionQuote.from_api({'strikePrice': 590, 'bid': 2.0, 'ask': 2.2, 'lastPrice': 2.1})
+    put = OptionQuote.from_api({'strikePrice': 590, 'bid': 1.0, 'ask': 1.2, 'lastPrice': 1.1})
+    return ChainSnapshot('SPY', spot, None, None, timestamp, call, put, Straddle.from_quotes('SPY', call, put))
+
+
+def test_append_and_read_time_range(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    start = time.time() - 100
+    for i in range(10):
+        store.append(make_snapshot(start + i, 590.0 + i))
+    store.close()
+
+    history = HistoryStore(str(tmp_path)).read(start + 2, start + 5)
+
+    assert history['spot'].tolist() == [592.0, 593.0, 594.0, 595.0]
+    assert isinstance(history['spot'], np.memmap)
+    assert np.allclose(history['straddle_last'], 3.2)
+    assert np.isnan(history['call_delta']).all()
+
+
+def test_torn_rows_are_truncated_on_reopen(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    now = time.time()
+    store.append(make_snapshot(now, 590.0))
+    # Simulate a crash after writing only the first column of a second row
+    store._files['timestamp'].write(np.float64(now + 1).tobytes())
+    store.close()
+
+    store = HistoryStore(str(tmp_path))
+    store.append(make_snapshot(now + 2, 591.0))
+    store.close()
+
+    history = store.read(now - 1, now + 3)
+    assert history['timestamp'].tolist() == [now, now + 2]
+    assert history['spot'].tolist() == [590.0, 591.0]
@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+import metrics
+from mock_etrade import MockETradeServer
+from benchmark import make_client
+from spy_strategy import SpyStrategy
+from strategy_ui import StrategyWebUI
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = metrics.MetricsRegistry()
+    histogram = registry.histogram('test_seconds', 'Test durations', buckets=(0.1, 1.0))
+    histogram.observe(0.05, span='a')
+    histogram.observe(0.5, span='a')
+    histogram.observe(5.0, span='a')
+
+    text = registry.render()
+
+    assert '# TYPE test_seconds histogram' in text
+    assert 'test_seconds_bucket{span="a",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{span="a",le="1.0"} 2' in text
+    assert 'test_seconds_bucket{span="a",le="+Inf"} 3' in text
+    assert 'test_seconds_count{span="a"} 3' in text
+
+
+def test_large_and_non_finite_values_render_exactly():
+    registry = metrics.MetricsRegistry()
+    registry.counter('test_total', 'Test counter').inc(1234567)
+    gauge = registry.gauge('test_gauge', 'Test gauge')
+    gauge.set(1760000123.456, kind='timestamp')
+    gauge.set(float('inf'), kind='inf')
+    gauge.set(float('nan'), kind='nan')
+
+    text = registry.render()
+
+    assert 'test_total 1234567\n' in text
+    assert 'test_gauge{kind="timestamp"} 1760000123.456\n' in text
+    assert 'test_gauge{kind="inf"} +Inf\n' in text
+    assert 'test_gauge{kind="nan"} NaN\n' in text
+
+
+def test_span_counts_errors_and_reraises():
+    before = metrics.SPAN_ERRORS.value(span='test.fail', error='ValueError')
+
+    with pytest.raises(ValueError):
+        with metrics.span('test.fail'):
+            raise ValueError('boom')
+
+    assert metrics.SPAN_ERRORS.value(span='test.fail', error='ValueError') == before + 1
+    assert metrics.SPAN_SECONDS.count(span='test.fail') >= 1
+
+
+def test_profiler_collects_folded_stacks():
+    profiler = metrics.SamplingProfiler(interval=0.001)
+    profiler.start()
+    deadline = time.monotonic() + 2
+    while profiler.samples < 5 and time.monotonic() < deadline:
+        sum(range(1000))
+    profiler.stop()
+
+    assert profiler.samples >= 5
+    assert 'test_profiler_collects_folded_stacks' in profiler.folded()
+
+
+def test_metrics_route_exposes_client_and_strategy_spans():
+    server = MockETradeServer(max_strikes=10, seed=1).start()
+    try:
+        client = make_client(server, cache=False)
+        strategy = SpyStrategy(client)
+        strategy.run_strategy()
+
+        response = StrategyWebUI(strategy).app.test_client().get('/metrics')
+    finally:
+        server.stop()
+
+    text = response.get_data(as_text=True)
+    assert response.status_code == 200
+    for name in ('span="strategy.tick"', 'span="upstream.option_chains"', 'span="http.quote"',
+                 'etrade_rate_limit_headroom{group="market"}', 'etrade_connections{stat="reuse_ratio"}'):
+        assert name in text
+
+
+def test_profiler_only_changes_state_on_post():
+    client = StrategyWebUI(None).app.test_client()
+
+    assert client.get('/debug/profiler?action=start').status_code == 405
+    assert not metrics.PROFILER.running
+    assert client.post('/debug/profiler?action=start').get_json()['running']
+    assert client.get('/debug/profiler').status_code == 200
+    assert not client.post('/debug/profiler', data={'action': 'stop'}).get_json()['running']
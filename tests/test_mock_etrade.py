@@ -0,0 +1,52 @@
+import contextlib
+import io
+
+import pytest
+import requests
+
+from benchmark import make_client
+from mock_etrade import MockETradeServer
+from spy_strategy import SpyStrategy
+from token_manager import TokenExpiredError
+
+
+@pytest.fixture
+def server():
+    server = MockETradeServer(max_strikes=20, seed=1).start()
+    yield server
+    server.stop()
+
+
+def test_client_talks_to_mock_server(server):
+    client = make_client(server, cache=False)
+
+    quote = client.get_market_quote(['SPY'], resp_format='json')
+    expiries = client.get_option_expire_dates('SPY')
+
+    assert quote['QuoteResponse']['QuoteData'][0]['Product']['symbol'] == 'SPY'
+    assert len(expiries) == server.expiries
+    assert server.request_counts['/v1/market/quote'] == 1
+
+
+def test_strategy_tick_reuses_connections(server):
+    client = make_client(server, cache=False)
+    strategy = SpyStrategy(client)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        snapshots = [strategy.run_strategy() for _ in range(3)]
+
+    assert all(snapshot is not None for snapshot in snapshots)
+    assert server.request_counts['/v1/market/optionchains'] == 3
+    stats = client.connection_stats()
+    assert stats['connections'] < stats['requests']
+
+
+def test_rejected_token_gets_401(server):
+    client = make_client(server, cache=False)
+    server.rejected_tokens.add(client.oauth_token)
+
+    # The client renews once on a 401; the renewal is rejected too
+    with pytest.raises(TokenExpiredError) as excinfo:
+        client.get_market_quote(['SPY'], resp_format='json')
+    error = excinfo.value.__cause__
+    assert isinstance(error, requests.HTTPError) and error.response.status_code == 401
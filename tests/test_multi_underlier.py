@@ -0,0 +1,46 @@
+import contextlib
+import io
+
+import pytest
+
+from benchmark import make_client
+from mock_etrade import MockETradeServer
+from multi_underlier import MultiUnderlierRunner
+from strategy_ui import StrategyWebUI
+
+SYMBOLS = ['SPY', 'QQQ', 'IWM'] + [f"T{i:02d}" for i in range(27)]
+
+
+@pytest.fixture
+def server():
+    server = MockETradeServer(max_strikes=5, seed=1).start()
+    yield server
+    server.stop()
+
+
+def test_basket_batches_quotes_and_fetches_every_chain(server):
+    runner = MultiUnderlierRunner(make_client(server, cache=False), SYMBOLS)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        basket = runner.run_strategy()
+    runner.close()
+
+    assert [snapshot.underlier for snapshot in basket.snapshots] == SYMBOLS
+    assert basket.failed == ()
+    assert server.request_counts['/v1/market/quote'] == 2  # 30 symbols in chunks of 25
+    assert server.request_counts['/v1/market/optionchains'] == len(SYMBOLS)
+    qqq = basket.get('QQQ')
+    assert abs(qqq.straddle.strike_price - qqq.spot_price) <= 1
+
+
+def test_basket_is_served_as_one_snapshot(server):
+    runner = MultiUnderlierRunner(make_client(server, cache=False), ['SPY', 'QQQ'])
+    web_ui = StrategyWebUI(runner)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        web_ui._update_strategy_data()
+    runner.close()
+
+    data = web_ui.app.test_client().get('/api/strategy-data').get_json()
+    assert [item['underlier'] for item in data['underliers']] == ['SPY', 'QQQ']
+    assert 'timestamp' not in data['underliers'][0]
@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+from benchmark import make_client
+from mock_etrade import MockETradeServer
+from order_monitor import OrderBook, OrderMonitor, OrderRecord
+from strategy_ui import StrategyWebUI
+
+KEY = 'mockAccountKey'
+DAY = 24 * 60 * 60
+
+
+def record(order_id, status='OPEN', filled=0.0, ordered=10.0):
+    return OrderRecord('111', order_id, 'SPY', 'BUY', status, ordered, filled, 1.0, 0.0)
+
+
+@pytest.fixture
+def server():
+    server = MockETradeServer(max_strikes=5, seed=1).start()
+    server.accounts.append({'accountId': '87654321', 'accountIdKey': 'otherKey', 'accountType': 'IRA',
+                            'accountDesc': 'Mock IRA', 'accountStatus': 'ACTIVE'})
+    yield server
+    server.stop()
+
+
+def order_requests(server):
+    return sum(count for path, count in server.request_counts.items() if path.endswith('/orders'))
+
+
+def test_order_book_publishes_only_fills_cancels_and_new_orders():
+    book = OrderBook()
+    assert book.apply(record('1'), announce_new=False) == []
+    assert book.apply(record('1'), announce_new=True) == []
+    assert book.apply(record('1', 'PARTIAL', 4.0), announce_new=True) == [('fill', 4.0)]
+    assert book.apply(record('1', 'CANCELLED', 4.0), announce_new=True) == [('cancel', 0.0)]
+    assert book.apply(record('2', 'EXECUTED', 10.0), announce_new=True) == [('new', 0.0), ('fill', 10.0)]
+    assert book.open_orders('111') == []
+
+
+def test_quiet_accounts_cost_two_requests_per_poll(server):
+    now = time.time()
+    for i in range(350):
+        server.add_order(KEY, 'SPY', 1, status='EXECUTED', placed_time=now - DAY * (1 + i // 100))
+    client = make_client(server, cache=False)
+    monitor = OrderMonitor(client, backfill_pages=2)
+
+    # The head page, then two backfill pages per poll, all without events
+    assert monitor.poll() == []
+    assert len(monitor.book) == 300
+    assert monitor.poll() == []
+    assert len(monitor.book) == 350
+
+    before = order_requests(server)
+    assert monitor.poll() == []
+    # Head page and open orders for each of the two accounts
+    assert order_requests(server) - before == 4
+    monitor.close()
+
+
+def test_poll_diffs_fills_cancels_and_new_orders(server):
+    client = make_client(server, cache=False)
+    resting = server.add_order(KEY, 'QQQ', 10, status='OPEN', placed_time=time.time() - 3 * DAY)
+    for _ in range(150):
+        server.add_order(KEY, 'SPY', 1, status='EXECUTED')
+    monitor = OrderMonitor(client, page_size=100, backfill_pages=0)
+    monitor.poll()
+    assert [order.order_id for order in monitor.book.open_orders('12345678')] == [resting]
+
+    server.update_order(KEY, resting, status='PARTIAL', filled=4)
+    placed = server.add_order('otherKey', 'IWM', 5)
+    events = monitor.poll()
+    assert {(event.kind, event.order.order_id, event.filled_delta) for event in events} == {
+        ('fill', resting, 4.0), ('new', placed, 0.0)}
+
+    # The cancelled order left the OPEN listing and sits far below the head page; its placed day is re-read
+    server.update_order(KEY, resting, status='CANCELLED')
+    events = monitor.poll()
+    assert [(event.kind, event.order.order_id) for event in events] == [('cancel', resting)]
+    assert monitor.book.open_orders('12345678') == []
+    assert [event.sequence for event in monitor.events_since(0)] == [1, 2, 3]
+    monitor.close()
+
+
+def test_events_wake_waiters_and_reach_the_web_ui(server):
+    client = make_client(server, cache=False)
+    monitor = OrderMonitor(client)
+    monitor.poll()
+    received = []
+    waiter = threading.Thread(target=lambda: received.extend(monitor.wait_for_events(monitor.sequence, 5)))
+    waiter.start()
+    server.add_order(KEY, 'SPY', 3)
+    monitor.poll()
+    waiter.join(5)
+
+    assert [event.kind for event in received] == ['new']
+    data = StrategyWebUI(None, order_monitor=monitor).app.test_client().get('/api/orders').get_json()
+    assert data['sequence'] == 1
+    assert [order['symbol'] for order in data['open']] == ['SPY']
+    assert StrategyWebUI(None).app.test_client().get('/api/orders').status_code == 404
+    monitor.close()
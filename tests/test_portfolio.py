@@ -0,0 +1,138 @@
+import contextlib
+import datetime
+import io
+import threading
+
+import pytest
+
+import pricing
+from portfolio import PortfolioRiskAggregator, Position
+
+NOW = datetime.datetime(2025, 5, 1, 11, 0, tzinfo=datetime.timezone.utc).timestamp()
+
+
+def option(symbol, call_put, strike, quantity, price_paid, last, position_type='LONG'):
+    return {
+        'symbolDescription': f"{symbol} Jun 20 '25 ${strike} {call_put.title()}",
+        'quantity': quantity,
+        'positionType': position_type,
+        'pricePaid': price_paid,
+        'Product': {'symbol': symbol, 'securityType': 'OPTN', 'callPut': call_put, 'strikePrice': strike,
+                    'expiryYear': 2025, 'expiryMonth': 6, 'expiryDay': 20},
+        'Quick': {'lastTrade': last},
+    }
+
+
+def stock(symbol, quantity, price_paid, last):
+    return {'symbolDescription': symbol, 'quantity': quantity, 'positionType': 'LONG', 'pricePaid': price_paid,
+            'Product': {'symbol': symbol, 'securityType': 'EQ'}, 'Quick': {'lastTrade': last}}
+
+
+class FakeClient:
+    def __init__(self):
+        self.spots = {'SPY': 590.0, 'QQQ': 500.0}
+        self.pages = {
+            'key1': [[stock('SPY', 100, 550.0, 590.0), option('SPY', 'CALL', 600, 2, 8.0, 9.5)],
+                     [option('QQQ', 'PUT', 480, 3, 6.0, 5.0, 'SHORT')]],
+            'key2': [[stock('QQQ', 50, 510.0, 500.0)]],
+        }
+        self.position_calls = []
+        self.lock = threading.Lock()
+
+    def get_account(self):
+        return [
+            {'accountId': '111', 'accountIdKey': 'key1', 'accountDesc': 'Margin', 'accountStatus': 'ACTIVE'},
+            {'accountId': '222', 'accountIdKey': 'key2', 'accountDesc': 'IRA', 'accountStatus': 'ACTIVE'},
+            {'accountId': '333', 'accountIdKey': 'key3', 'accountDesc': 'Old', 'accountStatus': 'CLOSED'},
+        ]
+
+    def get_account_balance_details(self, account_id_key, account_type=None):
+        if account_id_key == 'key1':
+            return {'Computed': {'marginBuyingPower': 20000.0, 'cashBuyingPower': 10000.0}}
+        return {'Computed': {'cashBuyingPower': 5000.0}}
+
+    def get_positions(self, account_id_key, page_number=None):
+        with self.lock:
+            self.position_calls.append((account_id_key, page_number))
+        pages = self.pages[account_id_key]
+        return {'PortfolioResponse': {'AccountPortfolio': [{
+            'accountId': account_id_key, 'totalPages': len(pages), 'Position': pages[(page_number or 1) - 1]}]}}
+
+    def get_market_quote(self, symbols, resp_format='xml'):
+        return {'QuoteResponse': {'QuoteData': [
+            {'Product': {'symbol': symbol}, 'All': {'lastTrade': self.spots[symbol]}} for symbol in symbols]}}
+
+
+@pytest.fixture
+def aggregator():
+    aggregator = PortfolioRiskAggregator(FakeClient())
+    aggregator.clock = lambda: NOW
+    yield aggregator
+    aggregator.close()
+
+
+def test_position_from_api_signs_short_options():
+    position = Position.from_api('111', option('QQQ', 'PUT', 480, 3, 6.0, 5.0, 'SHORT'))
+    assert position.quantity == -3
+    assert position.multiplier == 100
+    assert position.cost == -1800.0
+    assert position.expiry == datetime.date(2025, 6, 20)
+    assert position.is_call is False
+
+
+def test_loads_every_page_of_every_open_account(aggregator):
+    snapshot = aggregator.refresh()
+
+    assert set(aggregator.client.position_calls) == {('key1', None), ('key1', 2), ('key2', None)}
+    assert snapshot.positions == 4
+    assert [row['underlier'] for row in snapshot.underliers] == ['QQQ', 'SPY']
+    assert snapshot.buying_power == 25000.0
+    assert snapshot.repriced == 4
+
+
+def test_net_greeks_and_pnl(aggregator):
+    snapshot = aggregator.refresh()
+
+    years = pricing.years_to_expiry(datetime.date(2025, 6, 20), NOW)
+    call_iv = pricing.implied_volatility(9.5, 590.0, 600.0, years, True)
+    call = pricing.bs_greeks(590.0, 600.0, years, call_iv, True)
+    put_iv = pricing.implied_volatility(5.0, 500.0, 480.0, years, False)
+    put = pricing.bs_greeks(500.0, 480.0, years, put_iv, False)
+
+    spy = next(row for row in snapshot.underliers if row['underlier'] == 'SPY')
+    assert spy['delta'] == pytest.approx(100 + 200 * float(call['delta']))
+    assert spy['pnl'] == pytest.approx(100 * 40.0 + 200 * (9.5 - 8.0), abs=1e-4)
+    totals = snapshot.totals
+    assert totals['delta'] == pytest.approx(150 + 200 * float(call['delta']) - 300 * float(put['delta']))
+    assert totals['vega'] == pytest.approx(200 * float(call['vega']) - 300 * float(put['vega']))
+    assert totals['pnl'] == pytest.approx(4000 + 300 - 500 + 300, abs=1e-3)
+    assert snapshot.unpriced == 0
+
+
+def test_only_moved_underliers_are_repriced(aggregator):
+    first = aggregator.refresh()
+    qqq_before = next(row for row in first.underliers if row['underlier'] == 'QQQ')
+
+    aggregator.client.spots['SPY'] = 595.0
+    second = aggregator.refresh()
+
+    assert second.repriced == 2  # the SPY stock and call only
+    assert len(aggregator.client.position_calls) == 3  # positions are not refetched between reloads
+    spy = next(row for row in second.underliers if row['underlier'] == 'SPY')
+    assert spy['spot'] == 595.0
+    assert next(row for row in second.underliers if row['underlier'] == 'QQQ') == qqq_before
+    assert second.totals['delta'] > first.totals['delta']
+
+    assert aggregator.refresh().repriced == 0
+
+
+def test_display_and_json(aggregator):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        snapshot = aggregator.run_strategy()
+
+    assert 'Total buying power: $25,000.00' in output.getvalue()
+    data = snapshot.to_dict()
+    assert data['buying_power'] == 25000.0
+    assert data['accounts'][1]['description'] == 'IRA'
+    assert snapshot.to_json().startswith('{"timestamp"')
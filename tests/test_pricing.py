@@ -0,0 +1,70 @@
+import datetime
+import math
+import time
+
+import numpy as np
+
+import pricing
+from history_store import MARKET_TIMEZONE
+from option_models import OptionQuote
+
+
+def test_price_and_greeks_match_reference_values():
+    # S=100, K=100, T=1, r=5%, vol=20%: call 10.4506, put 5.5735, call delta 0.6368
+    greeks = pricing.bs_greeks(100.0, 100.0, 1.0, 0.2, np.array([True, False]), rate=0.05)
+
+    assert np.allclose(greeks['price'], [10.4506, 5.5735], atol=1e-4)
+    assert np.allclose(greeks['delta'], [0.6368, -0.3632], atol=1e-4)
+    assert math.isclose(greeks['gamma'][0], 0.018762, abs_tol=1e-6)
+    assert math.isclose(greeks['vega'][0], 0.37524, abs_tol=1e-5)
+
+
+def test_implied_volatility_round_trips_a_0dte_chain():
+    strikes = np.arange(560.0, 621.0)
+    years = 45 * 60 / pricing.SECONDS_PER_YEAR  # 45 minutes to the close
+    vols = 0.12 + 0.002 * np.abs(strikes - 590)
+    is_call = strikes >= 590
+    prices = pricing.bs_price(590.0, strikes, years, vols, is_call)
+
+    solved = pricing.implied_volatility(prices, 590.0, strikes, years, is_call)
+
+    meaningful = pricing.bs_greeks(590.0, strikes, years, vols, is_call)['vega'] > 1e-4
+    assert np.allclose(solved[meaningful], vols[meaningful], atol=1e-6)
+
+
+def test_prices_outside_arbitrage_bounds_have_no_volatility():
+    solved = pricing.implied_volatility([0.5, np.nan, 700.0], 590.0, [580.0, 590.0, 590.0], 0.01, True)
+
+    assert np.isnan(solved).all()
+
+
+def test_years_to_expiry_counts_to_the_close():
+    expiry = datetime.date(2025, 5, 16)
+    noon = datetime.datetime(2025, 5, 16, 12, 0, tzinfo=MARKET_TIMEZONE).timestamp()
+
+    assert math.isclose(pricing.years_to_expiry(expiry, noon) * 365 * 24, 4.0)
+    assert pricing.years_to_expiry(expiry, noon + 86400) == pricing.MIN_YEARS
+
+
+def test_missing_greeks_are_filled_and_api_values_kept():
+    option = OptionQuote.from_api({'strikePrice': 590, 'bid': 1.9, 'ask': 2.1, 'lastPrice': 2.0,
+                                   'OptionGreeks': {'delta': 0.55}})
+
+    filled = pricing.fill_option_greeks(option, 590.0, 2 / (365 * 24), is_call=True)
+
+    assert filled.delta == 0.55
+    assert 0 < filled.iv < 1 and filled.gamma > 0 and filled.theta < 0 and filled.vega > 0
+
+
+def test_thousands_of_contracts_price_in_milliseconds():
+    rng = np.random.default_rng(1)
+    strikes = rng.uniform(500, 680, 4000)
+    is_call = rng.random(4000) < 0.5
+    prices = np.round(pricing.bs_price(590.0, strikes, 0.002, rng.uniform(0.1, 0.5, 4000), is_call), 2)
+
+    started = time.perf_counter()
+    solved = pricing.implied_volatility(prices, 590.0, strikes, 0.002, is_call)
+    pricing.bs_greeks(590.0, strikes, 0.002, solved, is_call)
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.25  # ~5 ms on a laptop; generous for slow CI machines
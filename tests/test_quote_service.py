@@ -0,0 +1,76 @@
+import threading
+import time
+
+from quote_service import QuoteService, chunk_symbols, parse_quote_response
+
+
+class FakeClient:
+    def __init__(self, delay_event=None):
+        self.calls = []
+        self.delay_event = delay_event
+        self.lock = threading.Lock()
+
+    def get_market_quote(self, symbols, resp_format='xml'):
+        with self.lock:
+            self.calls.append(list(symbols))
+        if self.delay_event:
+            self.delay_event.wait(2)
+        return {'QuoteResponse': {'QuoteData': [
+            {'Product': {'symbol': symbol}, 'All': {'lastTrade': 100 + i, 'bid': '99.5', 'ask': 100.5}}
+            for i, symbol in enumerate(symbols)
+        ]}}
+
+
+def test_chunk_symbols_respects_limit():
+    symbols = [f"S{i}" for i in range(60)]
+    chunks = chunk_symbols(symbols)
+    assert [len(chunk) for chunk in chunks] == [25, 25, 10]
+
+
+def test_parse_quote_response_handles_single_object():
+    response = {'QuoteResponse': {'QuoteData': {'Product': {'symbol': 'spy'}, 'Intraday': {'lastTrade': '590.1'}}}}
+    quotes = parse_quote_response(response)
+    assert quotes['SPY']['last_price'] == 590.1
+
+
+def test_get_quotes_batches_symbols():
+    client = FakeClient()
+    service = QuoteService(client, coalesce_window=0)
+    symbols = [f"S{i}" for i in range(200)]
+
+    quotes = service.get_quotes(symbols)
+
+    assert len(quotes) == 200
+    assert len(client.calls) == 8
+    assert quotes['S30']['bid'] == 99.5
+    service.shutdown()
+
+
+def test_concurrent_callers_are_coalesced():
+    release = threading.Event()
+    client = FakeClient(delay_event=release)
+    service = QuoteService(client)
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(service.get_quotes(['SPY', 'QQQ'])))
+               for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(client.calls) == 1
+    assert all(set(result) == {'SPY', 'QQQ'} for result in results)
+    service.shutdown()
+
+
+def test_finished_requests_are_dropped_after_the_coalesce_window():
+    service = QuoteService(FakeClient(), coalesce_window=0.05)
+    service.get_quotes([f"S{i}" for i in range(200)])
+    assert len(service._requests) == 200
+
+    time.sleep(0.06)
+    service.get_quotes(['SPY'])
+    assert set(service._requests) == {'SPY'}
+    service.shutdown()
@@ -0,0 +1,31 @@
+from replay import Backtester, RecordingClient, ReplayClient
+from tests.test_spy_strategy import FakeClient
+
+
+def test_recorded_session_replays_through_backtester(tmp_path):
+    recorder = RecordingClient(FakeClient([590.2, 590.4, 592.1]), str(tmp_path))
+    for _ in range(3):
+        recorder.get_market_quote(['SPY'])
+        recorder.get_option_chains('SPY', strike_price=590)
+
+    replay_client = ReplayClient(str(tmp_path))
+    backtester = Backtester(replay_client)
+    snapshots = backtester.run()
+
+    assert [snapshot.spot_price for snapshot in snapshots] == [590.2, 590.4, 592.1]
+    assert backtester.summary(snapshots)['ticks'] == 3
+    assert snapshots[-1].timestamp == replay_client.now()
+
+
+def test_replay_uses_last_chain_of_each_tick(tmp_path):
+    recorder = RecordingClient(FakeClient([590.2, 592.1]), str(tmp_path))
+    recorder.get_market_quote(['SPY'])
+    recorder.get_option_chains('SPY', strike_price=590)
+    # A prefetched chain for the old strike followed by the re-request
+    recorder.get_market_quote(['SPY'])
+    recorder.get_option_chains('SPY', strike_price=590)
+    recorder.get_option_chains('SPY', strike_price=592)
+
+    snapshots = Backtester(ReplayClient(str(tmp_path))).run()
+
+    assert [snapshot.straddle.strike_price for snapshot in snapshots] == [590, 592]
@@ -0,0 +1,165 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from benchmark import make_client
+from client import RATE_LIMITS
+from mock_etrade import MockETradeServer
+from request_executor import CircuitOpenError, RequestExecutor
+from spy_strategy import SpyStrategy
+from strategy_ui import StrategyWebUI
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status} error", response=response)
+
+
+def flaky(failures, error=requests.ConnectionError):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error() if isinstance(error, type) else error
+        return 'ok'
+    return fetch, calls
+
+
+def test_only_transient_failures_of_idempotent_requests_are_retried():
+    sleeps = []
+    executor = RequestExecutor({'market': 1000}, sleep=sleeps.append, jitter=lambda: 0.5)
+
+    fetch, calls = flaky(2)
+    assert executor.execute('market', fetch) == 'ok'
+    assert len(calls) == 3
+    # Full jitter over 0.2 * 2 ** attempt
+    assert sleeps == pytest.approx([0.2, 0.4])
+
+    fetch, calls = flaky(1)
+    with pytest.raises(requests.ConnectionError):
+        executor.execute('market', fetch, idempotent=False)
+    fetch, calls = flaky(1, http_error(400))
+    with pytest.raises(requests.HTTPError):
+        executor.execute('market', fetch)
+    assert len(calls) == 1
+
+
+def test_retries_are_capped_by_the_retry_budget():
+    executor = RequestExecutor({'market': 1000}, sleep=lambda seconds: None, failure_threshold=1000)
+    fetch, calls = flaky(10 ** 6, http_error(503))
+    for _ in range(20):
+        with pytest.raises(requests.HTTPError):
+            executor.execute('market', fetch)
+    # 20 first attempts; retries only from the saved-up burst and 0.2 per request
+    assert 20 < len(calls) <= 20 + 5 + 4
+
+
+def test_breaker_fails_fast_then_probes():
+    now = [0.0]
+    executor = RequestExecutor({'market': 1000}, max_attempts=1, failure_threshold=2, reset_timeout=30,
+                               clock=lambda: now[0])
+    fetch, calls = flaky(3, http_error(502))
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            executor.execute('market', fetch)
+    with pytest.raises(CircuitOpenError):
+        executor.execute('market', fetch)
+    assert len(calls) == 2 and executor.degraded() == {'market': 'open'}
+
+    # A failed probe reopens the breaker; a successful one closes it
+    now[0] = 30.0
+    with pytest.raises(requests.HTTPError):
+        executor.execute('market', fetch)
+    now[0] = 60.0
+    assert executor.execute('market', fetch) == 'ok'
+    assert executor.degraded() == {}
+
+
+def test_half_open_callers_wait_for_the_probe():
+    executor = RequestExecutor({'market': 1000}, max_attempts=1, failure_threshold=1, reset_timeout=0.05)
+    with pytest.raises(requests.HTTPError):
+        executor.execute('market', flaky(1, http_error(503))[0])
+    time.sleep(0.1)
+
+    release = threading.Event()
+    probe = threading.Thread(target=executor.execute, args=('market', lambda: release.wait(5)))
+    probe.start()
+    time.sleep(0.05)
+    threading.Timer(0.1, release.set).start()
+    # Admitted once the probe closes the breaker instead of failing fast
+    assert executor.execute('market', lambda: 'ok') == 'ok'
+    probe.join()
+    assert executor.degraded() == {}
+
+
+def test_slow_requests_are_hedged():
+    executor = RequestExecutor({'market': 1000}, hedge_delay=0.05)
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(5)
+            return 'slow'
+        return 'hedge'
+
+    started = time.monotonic()
+    assert executor.execute('market', fetch, hedge=True) == 'hedge'
+    assert time.monotonic() - started < 1
+    release.set()
+
+
+def test_concurrent_hedged_requests_do_not_queue_or_hedge_early():
+    executor = RequestExecutor({'market': 1000}, hedge_delay=0.3)
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'ok'
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=executor.execute, args=('market', fetch), kwargs={'hedge': True})
+               for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Every primary starts at once and finishes inside the hedge delay
+    assert len(calls) == 16
+    assert time.monotonic() - started < 0.5
+
+
+def test_dashboard_serves_the_last_good_snapshot_marked_stale():
+    server = MockETradeServer(max_strikes=5, seed=1).start()
+    client = make_client(server, cache=True)
+    client.executor = RequestExecutor(dict.fromkeys(RATE_LIMITS, 1000.0), reset_timeout=0.05)
+    # Entries expire at once but stay cached as the last good responses
+    client.cache.ttls = {'quote': 1e-6, 'option_chains': 1e-6}
+    web_ui = StrategyWebUI(SpyStrategy(client))
+
+    assert web_ui._update_strategy_data() is not None
+    assert 'stale' not in web_ui.latest_data
+
+    server.outage = True
+    assert web_ui._update_strategy_data() is not None
+    assert web_ui.latest_data['stale']['endpoints'] == ['option_chains', 'quote']
+
+    # Nothing cached to stand in: the tick fails, the last snapshot stays published as stale
+    client.cache.clear()
+    web_ui.latest_data.pop('stale')
+    with pytest.raises((CircuitOpenError, requests.HTTPError)):
+        web_ui._update_strategy_data()
+    assert 'stale' in web_ui.latest_data
+
+    # The half-open breaker lets one probe through; the tick's concurrent requests wait for its result
+    server.outage = False
+    time.sleep(0.1)
+    assert web_ui._update_strategy_data() is not None
+    assert 'stale' not in web_ui.latest_data
+    server.stop()
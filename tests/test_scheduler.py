@@ -0,0 +1,110 @@
+import datetime
+import time
+
+import requests
+
+from history_store import MARKET_TIMEZONE
+from scheduler import MarketCalendar, RefreshScheduler, RequestBudget
+
+
+def ts(year, month, day, hour, minute=0):
+    return datetime.datetime(year, month, day, hour, minute, tzinfo=MARKET_TIMEZONE).timestamp()
+
+
+class AlwaysOpen:
+    def seconds_to_close(self, timestamp):
+        return 6 * 60 * 60
+
+    def is_open(self, timestamp):
+        return True
+
+    def next_open(self, timestamp):
+        return timestamp
+
+
+def test_calendar_knows_holidays_and_early_closes():
+    calendar = MarketCalendar()
+
+    assert calendar.is_open(ts(2025, 7, 2, 10))
+    assert not calendar.is_open(ts(2025, 7, 4, 10))                  # Independence Day
+    assert not calendar.is_open(ts(2025, 4, 18, 10))                 # Good Friday
+    assert not calendar.is_open(ts(2025, 7, 5, 10))                  # Saturday
+    assert not calendar.is_open(ts(2025, 7, 2, 9, 15))               # before the open
+    assert calendar.seconds_to_close(ts(2025, 11, 28, 12)) == 3600   # day after Thanksgiving closes at 1 p.m.
+    assert calendar.next_open(ts(2025, 7, 3, 18)) == ts(2025, 7, 7, 9, 30)
+
+
+def test_interval_tightens_near_close_and_waits_for_open():
+    scheduler = RefreshScheduler()
+    job = scheduler.register('spy', lambda: None, interval=10)
+
+    assert scheduler.next_interval(job, ts(2025, 7, 2, 11)) == 10
+    assert scheduler.next_interval(job, ts(2025, 7, 2, 15, 40)) == 5
+    assert scheduler.next_interval(job, ts(2025, 7, 2, 15, 58)) == 2.5
+    assert scheduler.next_interval(job, ts(2025, 7, 2, 17)) == ts(2025, 7, 3, 9, 30) - ts(2025, 7, 2, 17)
+
+    job.failures = 3
+    assert scheduler.next_interval(job, ts(2025, 7, 2, 11)) == 80
+
+
+def test_budget_is_shared_and_paused_by_rate_limits():
+    budget = RequestBudget(rate=1, burst=2)
+
+    assert budget.try_acquire(2)
+    assert not budget.try_acquire(1)
+    assert 0 < budget.wait_time(1) <= 1
+
+    budget.penalize(30)
+    assert budget.wait_time(1) > 29
+    assert not budget.acquire(1, timeout=0.01)
+
+
+def test_acquire_waits_for_the_refill():
+    budget = RequestBudget(rate=50, burst=1)
+    started = time.monotonic()
+    assert all(budget.acquire() for _ in range(4))
+    assert time.monotonic() - started >= 0.05
+
+
+def make_scheduler():
+    return RefreshScheduler(budget=RequestBudget(rate=1000, burst=1000), calendar=AlwaysOpen())
+
+
+def test_jobs_tick_at_fixed_rate_despite_run_time():
+    scheduler = make_scheduler()
+    ticks = []
+
+    def slow_job():
+        ticks.append(time.monotonic())
+        time.sleep(0.02)  # run time must not stretch the period
+        return 'ok'
+
+    scheduler.register('slow', slow_job, interval=0.05, min_interval=0.01)
+    scheduler.start()
+    time.sleep(0.5)
+    scheduler.stop()
+
+    periods = [b - a for a, b in zip(ticks, ticks[1:])]
+    assert len(ticks) >= 5
+    assert abs(sum(periods) / len(periods) - 0.05) < 0.015
+
+
+def test_rate_limit_response_pauses_every_job():
+    scheduler = make_scheduler()
+    other_runs = []
+
+    def limited_job():
+        response = requests.Response()
+        response.status_code = 429
+        raise requests.HTTPError('429 Too Many Requests', response=response)
+
+    limited = scheduler.register('limited', limited_job, interval=0.05, min_interval=0.01)
+    scheduler.start()
+    time.sleep(0.1)
+    scheduler.register('other', lambda: other_runs.append(1) or 'ok', interval=0.05, min_interval=0.01)
+    time.sleep(0.2)
+    scheduler.stop()
+
+    assert limited.runs == 1 and limited.failures == 1
+    assert other_runs == []
+    assert scheduler.budget.wait_time(1) > 20
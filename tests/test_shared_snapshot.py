@@ -0,0 +1,79 @@
+import json
+import multiprocessing
+
+from shared_snapshot import SnapshotPublisher, SnapshotReader, channel_path
+from wsgi import create_app
+
+
+def read_torn_payloads(path, count, queue):
+    reader = SnapshotReader(path)
+    torn = 0
+    seen = set()
+    while len(seen) < count:
+        snapshot = reader.read()
+        if snapshot is None:
+            continue
+        if len(set(snapshot.payload)) != 1 or snapshot.payload[0] != snapshot.version % 26 + 65:
+            torn += 1
+        seen.add(snapshot.version)
+        if snapshot.version == count - 1:
+            break
+    queue.put(torn)
+
+
+def test_reader_copies_only_changed_payloads(tmp_path):
+    publisher = SnapshotPublisher(str(tmp_path / 'snapshots'), capacity=16)
+    reader = SnapshotReader(channel_path(publisher.directory, 'strategy'))
+    assert reader.read() is None
+
+    publisher.publish('strategy', 'first', version=1, timestamp=10.0)
+    first = reader.read()
+    assert (first.version, first.timestamp, first.payload) == (1, 10.0, b'first')
+    assert reader.read() is first
+
+    # Outgrowing the mapping moves the channel to a larger file; the reader follows it
+    publisher.publish('strategy', 'x' * 100, version=2)
+    assert reader.read().payload == b'x' * 100
+    assert reader.sequence() % 2 == 0
+
+    publisher.close()
+    assert not (tmp_path / 'snapshots').exists()
+
+
+def test_readers_in_other_processes_never_see_torn_writes(tmp_path):
+    publisher = SnapshotPublisher(str(tmp_path / 'snapshots'), capacity=1 << 16)
+    path = channel_path(publisher.directory, 'strategy')
+    publisher.publish('strategy', b'A', version=0)
+    count = 3000
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    readers = [context.Process(target=read_torn_payloads, args=(path, count, queue)) for _ in range(2)]
+    for process in readers:
+        process.start()
+
+    for version in range(count):
+        publisher.publish('strategy', bytes([version % 26 + 65]) * (1000 + version * 7 % 30000), version)
+    torn = [queue.get(timeout=30) for _ in readers]
+    for process in readers:
+        process.join(10)
+    publisher.close()
+
+    assert torn == [0, 0]
+
+
+def test_workers_answer_conditional_requests_from_the_channels(tmp_path):
+    publisher = SnapshotPublisher(str(tmp_path / 'snapshots'))
+    client = create_app(publisher.directory).test_client()
+    assert client.get('/api/strategy-data').get_json() == {'status': 'initializing'}
+    assert client.get('/api/orders').status_code == 404
+
+    publisher.publish('strategy', json.dumps({'spot_price': 590.0, 'version': 3}), version=3, timestamp=1.0)
+    response = client.get('/api/strategy-data')
+    assert response.get_json()['spot_price'] == 590.0
+    assert response.headers['ETag'] == '"3"'
+    assert client.get('/api/strategy-data', headers={'If-None-Match': '"3"'}).status_code == 304
+
+    publisher.publish('strategy', json.dumps({'spot_price': 591.0, 'version': 4}), version=4, timestamp=2.0)
+    assert client.get('/api/strategy-data', headers={'If-None-Match': '"3"'}).get_json()['spot_price'] == 591.0
+    publisher.close()
+
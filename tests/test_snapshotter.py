@@ -0,0 +1,64 @@
+import datetime
+import json
+import os
+
+import numpy as np
+import pytest
+
+from benchmark import make_client
+from history_store import MARKET_TIMEZONE
+from mock_etrade import MockETradeServer
+from snapshotter import CHECKPOINT_FILE, ChainSnapshotter, read_partition
+
+ROUND = datetime.datetime(2025, 5, 1, 10, 31, tzinfo=MARKET_TIMEZONE).timestamp()
+
+
+@pytest.fixture
+def server():
+    server = MockETradeServer(max_strikes=30, expiries=3, seed=1).start()
+    yield server
+    server.stop()
+
+
+def chain_requests(server):
+    return server.request_counts['/v1/market/optionchains']
+
+
+def test_round_archives_every_expiry_by_partition(server, tmp_path):
+    client = make_client(server, cache=False)
+    snapshotter = ChainSnapshotter(client, ['SPY', 'QQQ'], base_dir=str(tmp_path), rate=1000, parse_workers=2)
+    try:
+        stats = snapshotter.run_round(ROUND)
+    finally:
+        snapshotter.close()
+
+    assert (stats['chains'], stats['strikes'], stats['errors']) == (6, 180, 0)
+    assert chain_requests(server) == 6
+    expiries = [expiry for expiry, _ in client.get_option_expire_dates('SPY')]
+    assert sorted(os.listdir(tmp_path / '2025-05-01' / 'QQQ')) == [expiry.isoformat() for expiry in expiries]
+
+    columns = read_partition(str(tmp_path), datetime.date(2025, 5, 1), 'SPY', expiries[0])
+    assert os.listdir(tmp_path / '2025-05-01' / 'SPY' / expiries[0].isoformat()) == ['103100.npz']
+    assert len(columns['strike']) == 30 and np.all(np.diff(columns['strike']) > 0)
+    assert np.all(columns['timestamp'] == ROUND)
+    assert np.all(columns['spot'] > 0)
+    assert np.isfinite(columns['call_bid']).all()
+
+
+def test_restart_resumes_the_checkpointed_round(server, tmp_path):
+    client = make_client(server, cache=False)
+    expiries = [expiry for expiry, _ in client.get_option_expire_dates('SPY')]
+    # A previous run archived the first expiry of the round before stopping
+    (tmp_path / CHECKPOINT_FILE).write_text(json.dumps({'round': ROUND, 'done': [f"SPY/{expiries[0].isoformat()}"]}))
+
+    snapshotter = ChainSnapshotter(client, ['SPY'], base_dir=str(tmp_path), rate=1000, parse_workers=1)
+    try:
+        resumed = snapshotter.run_round(ROUND)
+        fresh = snapshotter.run_round(ROUND + 60)
+    finally:
+        snapshotter.close()
+
+    assert (resumed['resumed'], resumed['skipped'], resumed['chains']) == (True, 1, 2)
+    assert (fresh['resumed'], fresh['skipped'], fresh['chains']) == (False, 0, 3)
+    assert chain_requests(server) == 5
+    assert json.loads((tmp_path / CHECKPOINT_FILE).read_text())['round'] == ROUND + 60
@@ -0,0 +1,139 @@
+import asyncio
+import gc
+import time
+
+import pytest
+
+import metrics
+from request_executor import CircuitOpenError
+from spy_strategy import SpyStrategy
+
+
+def make_chain(strike):
+    return {'OptionChainResponse': {
+        'SelectedED': {'year': 2025, 'month': 5, 'day': 16},
+        'OptionPair': [{
+            'Call': {'symbol': 'SPY', 'displaySymbol': f"SPY ${strike} Call", 'strikePrice': strike,
+                     'lastPrice': 2.5, 'bid': 2.4, 'ask': 2.6},
+            'Put': {'symbol': 'SPY', 'displaySymbol': f"SPY ${strike} Put", 'strikePrice': strike,
+                    'lastPrice': 1.5, 'bid': 1.4, 'ask': 1.6},
+        }],
+    }}
+
+
+class FakeClient:
+    def __init__(self, prices):
+        self.prices = list(prices)
+        self.chain_requests = []
+
+    def get_market_quote(self, symbols, resp_format='xml'):
+        return {'QuoteResponse': {'QuoteData': [{'All': {'lastTrade': self.prices.pop(0)}}]}}
+
+    def get_option_chains(self, symbol, strike_price=None, expiry_date=None, no_of_strikes=1):
+        self.chain_requests.append(strike_price)
+        return make_chain(round(strike_price))
+
+
+def test_run_strategy_builds_straddle():
+    strategy = SpyStrategy(FakeClient([590.2]))
+    data = strategy.run_strategy()
+    assert data.straddle.last_price == 4.0
+    assert data.straddle.break_even_lower == 586.0
+    assert data.straddle.break_even_upper == 594.0
+
+
+class FakeAsyncClient:
+    """
+    Answers on the event loop itself, so prefetch and quote tasks run in a fixed order
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    async def get_market_quote(self, symbols, resp_format='xml'):
+        return self.client.get_market_quote(symbols)
+
+    async def get_option_chains(self, symbol, strike_price=None, expiry_date=None, no_of_strikes=1):
+        return self.client.get_option_chains(symbol, strike_price=strike_price)
+
+
+def test_sync_run_propagates_an_unavailable_chain():
+    class UnavailableClient(FakeClient):
+        def get_option_chains(self, symbol, strike_price=None, expiry_date=None, no_of_strikes=1):
+            raise CircuitOpenError('market', 30.0)
+
+    strategy = SpyStrategy(UnavailableClient([590.2]))
+    with pytest.raises(CircuitOpenError):
+        strategy.run_strategy()
+    assert strategy.option_data is None
+
+
+def test_async_run_reuses_prefetched_chain_in_same_bucket():
+    client = FakeClient([590.2, 590.4, 592.1])
+    strategy = SpyStrategy(client)
+    async_client = FakeAsyncClient(client)
+
+    async def run_ticks():
+        await strategy.run_strategy_async(async_client)
+        await strategy.run_strategy_async(async_client)
+        return await strategy.run_strategy_async(async_client)
+
+    data = asyncio.run(run_ticks())
+
+    # First tick has no prefetch, second reuses its 590 prefetch,
+    # third prefetched 590 but moved bucket and re-requests 592
+    assert client.chain_requests == [590, 590, 590, 592]
+    assert data.straddle.strike_price == 592
+
+
+def test_unparseable_quotes_are_counted_on_the_parse_span(capsys):
+    strategy = SpyStrategy(FakeClient([]))
+    before = {error: metrics.SPAN_ERRORS.value(span='strategy.parse_quote', error=error)
+              for error in ('missing_price', 'unexpected_structure')}
+
+    strategy._parse_current_price({'QuoteResponse': {'QuoteData': {'All': {'bid': 590.0}}}})
+    strategy._parse_current_price({'Messages': {}})
+
+    for error, count in before.items():
+        assert metrics.SPAN_ERRORS.value(span='strategy.parse_quote', error=error) == count + 1
+    assert strategy.spot_price is None
+    assert capsys.readouterr().out == ''
+
+
+def test_failed_tick_retrieves_its_prefetch():
+    class FailingClient(FakeClient):
+        def get_market_quote(self, symbols, resp_format='xml'):
+            time.sleep(0.05)  # the prefetch fails first
+            raise ConnectionError('quote failed')
+
+        def get_option_chains(self, symbol, strike_price=None, expiry_date=None, no_of_strikes=1):
+            raise ConnectionError('chain failed')
+
+    strategy = SpyStrategy(FailingClient([]))
+    strategy.spot_price = 590.0
+    unhandled, failures = [], []
+
+    async def run_tick():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: unhandled.append(context))
+        try:
+            await strategy.run_strategy_async()
+        except ConnectionError as e:
+            failures.append(str(e))  # not the exception itself: its traceback would keep the tick's tasks alive
+
+    asyncio.run(run_tick())
+    gc.collect()
+    assert failures == ['quote failed']
+    assert unhandled == []
+
+
+def test_snapshot_serializes_missing_values_as_null():
+    strategy = SpyStrategy(FakeClient([590.2]))
+    chain = make_chain(590)
+    del chain['OptionChainResponse']['OptionPair'][0]['Put']['lastPrice']
+
+    snapshot = strategy._process_option_chain(chain).to_dict()
+
+    assert snapshot['put']['last_price'] is None
+    assert snapshot['straddle']['last_price'] is None
+    assert snapshot['call']['greeks'] is None
+    assert snapshot['expiry_date'] == '2025-05-16'
@@ -0,0 +1,60 @@
+from shared_snapshot import SnapshotPublisher, SnapshotReader, channel_path
+from strategy_ui import SnapshotBroadcaster, StrategyWebUI
+
+
+def test_broadcaster_only_versions_changed_content():
+    broadcaster = SnapshotBroadcaster()
+
+    assert broadcaster.publish({'timestamp': 1, 'spot_price': 590.0})
+    assert not broadcaster.publish({'timestamp': 2, 'spot_price': 590.0})
+    assert broadcaster.publish({'timestamp': 3, 'spot_price': 591.0})
+
+    sequence, version, timestamp, payload = broadcaster.current()
+    assert (sequence, version, timestamp) == (3, 2, 3)
+    assert payload == '{"timestamp":3,"spot_price":591.0,"version":2}'
+
+
+def test_wait_for_tick_times_out_without_new_ticks():
+    broadcaster = SnapshotBroadcaster()
+    broadcaster.publish({'timestamp': 1})
+
+    assert broadcaster.wait_for_tick(1, timeout=0.01) is None
+    assert broadcaster.wait_for_tick(0, timeout=0.01)[0] == 1
+
+
+class FakeSnapshot:
+    def __init__(self, spot_price):
+        self.spot_price = spot_price
+
+    def to_dict(self):
+        return {'timestamp': 1.0, 'spot_price': self.spot_price}
+
+
+class FakeStrategy:
+    client = None
+
+    def __init__(self):
+        self.spots = iter([590.0, 590.0, 591.0])
+
+    async def run_strategy_async(self):
+        return FakeSnapshot(next(self.spots))
+
+
+def test_ticks_are_shared_with_workers_and_etagged(tmp_path):
+    publisher = SnapshotPublisher(str(tmp_path / 'snapshots'))
+    web_ui = StrategyWebUI(FakeStrategy(), publisher=publisher)
+    reader = SnapshotReader(channel_path(publisher.directory, 'strategy'))
+    client = web_ui.app.test_client()
+
+    web_ui._update_strategy_data()
+    assert reader.read().payload.decode() == web_ui.broadcaster.payload
+    assert client.get('/api/strategy-data').headers['ETag'] == '"1"'
+
+    web_ui._update_strategy_data()
+    assert client.get('/api/strategy-data', headers={'If-None-Match': '"1"'}).status_code == 304
+    assert reader.read().version == 1
+
+    web_ui._update_strategy_data()
+    assert client.get('/api/strategy-data', headers={'If-None-Match': '"1"'}).status_code == 200
+    assert reader.read().version == 2
+    publisher.close()
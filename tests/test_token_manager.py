@@ -0,0 +1,145 @@
+import datetime
+import os
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from benchmark import make_client
+from mock_etrade import MockETradeServer
+from token_manager import TokenExpiredError, TokenManager, next_midnight, update_env_file
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status} error", response=response)
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def server():
+    server = MockETradeServer(max_strikes=5, seed=1).start()
+    yield server
+    server.stop()
+
+
+def test_update_env_file_replaces_exact_keys_atomically(tmp_path):
+    path = tmp_path / '.env'
+    path.write_text("# tokens\nOAUTH_TOKEN=old\nOAUTH_TOKEN_SECRET=old-secret\nexport OTHER=1\nOAUTH_TOKEN=dup\n")
+    os.chmod(path, 0o640)
+
+    update_env_file(str(path), {'OAUTH_TOKEN': 'new', 'OAUTH_TOKEN_ISSUED': 123})
+
+    assert path.read_text() == ("# tokens\nOAUTH_TOKEN=new\nOAUTH_TOKEN_SECRET=old-secret\nexport OTHER=1\n"
+                                "OAUTH_TOKEN_ISSUED=123\n")
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+    assert [name for name in os.listdir(tmp_path) if name != '.env'] == []
+
+
+def test_concurrent_401s_share_one_renewal():
+    renewals = []
+
+    def renew():
+        renewals.append(1)
+        time.sleep(0.05)
+
+    manager = TokenManager(renew)
+    renewed = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        if not renewed.is_set() and not renewals:
+            raise http_error(401)
+        renewed.set()
+        return 'ok'
+
+    barrier = threading.Barrier(8)
+
+    def request():
+        generation = manager.generation
+        barrier.wait()
+        try:
+            raise http_error(401)
+        except requests.HTTPError:
+            manager.renew(generation, reason='unauthorized')
+        return fetch()
+
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda _: request(), range(8)))
+
+    assert results == ['ok'] * 8
+    assert len(renewals) == 1
+    assert manager.generation == 1
+
+
+def test_call_renews_and_retries_once():
+    renewals = []
+    manager = TokenManager(lambda: renewals.append(1))
+    responses = iter([http_error(401), 'quote'])
+
+    def fetch():
+        response = next(responses)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    assert manager.call(fetch) == 'quote'
+    assert renewals == [1]
+
+    with pytest.raises(requests.HTTPError):
+        manager.call(lambda: (_ for _ in ()).throw(http_error(500)))
+    assert renewals == [1]
+
+
+def test_rejected_renewal_marks_tokens_expired():
+    def renew():
+        raise http_error(401)
+
+    manager = TokenManager(renew)
+    with pytest.raises(TokenExpiredError):
+        manager.call(lambda: (_ for _ in ()).throw(http_error(401)))
+    assert manager.is_expired()
+
+
+def test_idle_renewal_and_midnight_expiry():
+    issued = datetime.datetime(2025, 5, 1, 9, 0, tzinfo=datetime.timezone.utc).timestamp()
+    clock = Clock(issued)
+    renewals = []
+    manager = TokenManager(lambda: renewals.append(clock.now), issued_at=issued, clock=clock)
+
+    clock.now += 60 * 60
+    assert not manager.needs_renewal()
+    clock.now += 50 * 60
+    assert manager.needs_renewal()
+    manager.renew(reason='idle')
+    assert not manager.needs_renewal()
+
+    assert manager.expires_at == next_midnight(issued)
+    clock.now = manager.expires_at
+    with pytest.raises(TokenExpiredError):
+        manager.renew()
+    assert len(renewals) == 1
+
+
+def test_inactive_token_recovers_in_one_round_trip(server):
+    client = make_client(server, cache=False)
+    server.inactive_tokens.add(client.oauth_token)
+
+    with ThreadPoolExecutor(6) as executor:
+        quotes = list(executor.map(lambda _: client.get_market_quote(['SPY'], resp_format='json'), range(6)))
+
+    assert all(quote['QuoteResponse']['QuoteData'] for quote in quotes)
+    assert server.request_counts['/oauth/renew_access_token'] == 1
+    assert client.tokens.renewals == 1
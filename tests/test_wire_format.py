@@ -0,0 +1,104 @@
+import gzip
+import json
+import time
+
+import numpy as np
+import pytest
+
+from history_store import HistoryStore
+from shared_snapshot import SnapshotPublisher
+from strategy_ui import StrategyWebUI
+from tests.test_history_store import make_snapshot
+from wire_format import COLUMNS, MSGPACK, PayloadVersions, apply_delta, unpack_columns
+from wsgi import create_app
+
+
+def basket(timestamp, *spots):
+    return {'timestamp': timestamp, 'failed': [],
+            'underliers': [make_snapshot(timestamp, spot).to_dict() for spot in spots]}
+
+
+def test_deltas_rebuild_every_version_and_bodies_are_cached():
+    versions = PayloadVersions(keep=3)
+    documents = [basket(1, 590.0, 480.0), basket(2, 590.5), basket(3, 590.5, 481.0, 200.0)]
+    for version, document in enumerate(documents, 1):
+        versions.record(version, document)
+
+    for base in (1, 2):
+        delta = versions.delta(base, 3)
+        assert apply_delta(documents[base - 1], delta) == documents[2]
+    # Unchanged leaves of the first underlier are not resent
+    changed = versions.delta(2, 3)['set']
+    assert changed['underliers.#'] == 3
+    assert not any(path.startswith('underliers.0.') and path != 'underliers.0.timestamp' for path in changed)
+    assert versions.delta(1, 2)['unset'] and versions.delta(4, 3) is None
+
+    first = versions.body(3, encoding='gzip', since=1)
+    assert versions.body(3, encoding='gzip', since=1) is first
+    assert versions.bodies.hits == 1
+    assert json.loads(gzip.decompress(first[0]))['base'] == 1
+
+    versions.record(4, basket(4, 1.0))
+    assert versions.body(4, since=1)[0] == json.dumps(basket(4, 1.0), separators=(',', ':')).encode()
+
+
+def test_strategy_data_negotiates_format_compression_and_deltas():
+    web_ui = StrategyWebUI(None)
+    client = web_ui.app.test_client()
+    web_ui.broadcaster.publish(make_snapshot(1.0, 590.0).to_dict())
+    full = client.get('/api/strategy-data', headers={'Accept-Encoding': 'gzip'})
+    assert full.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(full.data))['spot_price'] == 590.0
+
+    web_ui.broadcaster.publish(make_snapshot(2.0, 590.25).to_dict())
+    delta = client.get('/api/strategy-data?since=1').get_json()
+    assert delta['set'] == {'timestamp': 2, 'spot_price': 590.25, 'version': 2}
+    assert client.get('/api/strategy-data?since=2').status_code == 304
+    assert 'Accept-Encoding' in full.headers['Vary']
+    assert len(client.get('/api/strategy-data?since=1').data) * 5 < len(client.get('/api/strategy-data').data)
+
+
+def test_msgpack_is_served_when_installed():
+    msgpack = pytest.importorskip('msgpack')
+    web_ui = StrategyWebUI(None)
+    client = web_ui.app.test_client()
+    web_ui.broadcaster.publish(make_snapshot(1.0, 590.0).to_dict())
+    web_ui.broadcaster.publish(make_snapshot(2.0, 590.25).to_dict())
+
+    packed = client.get('/api/strategy-data', headers={'Accept': MSGPACK})
+    assert packed.mimetype == MSGPACK and msgpack.unpackb(packed.data)['version'] == 2
+    delta = client.get('/api/strategy-data?since=1', headers={'Accept': MSGPACK})
+    assert msgpack.unpackb(delta.data)['set']['spot_price'] == 590.25
+
+
+def test_history_is_served_as_packed_columns(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history'))
+    now = time.time()
+    for i in range(5):
+        store.append(make_snapshot(now - 10 + i, 590.0 + i))
+    client = StrategyWebUI(None, history_store=store).app.test_client()
+
+    response = client.get(f"/api/history?from={now - 60}", headers={'Accept': COLUMNS})
+    header, columns = unpack_columns(response.data)
+    assert header['rows'] == 5 and header['from'] == now - 60
+    assert columns['spot'].tolist() == [590.0, 591.0, 592.0, 593.0, 594.0]
+    assert np.isnan(columns['call_delta']).all()
+    assert client.get(f"/api/history?from={now - 60}").get_json()['columns']['spot'][0] == 590.0
+    store.close()
+
+
+def test_workers_serve_deltas_and_cached_history_bodies(tmp_path):
+    publisher = SnapshotPublisher(str(tmp_path / 'snapshots'))
+    client = create_app(publisher.directory, str(tmp_path / 'history')).test_client()
+    for version, spot in ((1, 590.0), (2, 591.0)):
+        publisher.publish('strategy', json.dumps(dict(make_snapshot(version, spot).to_dict(), version=version)),
+                          version)
+        client.get('/api/strategy-data')
+    assert client.get('/api/strategy-data?since=1').get_json()['set']['spot_price'] == 591.0
+
+    publisher.publish('history', json.dumps({'from': 0.0, 'to': 1.0, 'columns': {'spot': [590.0, None]}}), 7)
+    response = client.get('/api/history', headers={'Accept': COLUMNS, 'Accept-Encoding': 'gzip'})
+    assert response.headers['ETag'] == '"7"'
+    assert unpack_columns(response.data)[1]['spot'].tolist()[0] == 590.0
+    assert client.get('/api/history', headers={'If-None-Match': '"7"'}).status_code == 304
+    publisher.close()
@@ -0,0 +1,266 @@
+"""
+This module implements the OAuth token lifecycle of the client.
+E*TRADE access tokens go inactive after two hours without a request and
+expire at midnight US Eastern time. The manager tracks token age and activity,
+renews idle tokens in the background before the timeout, and turns a 401
+into one renewal shared by every request in flight followed by a single retry.
+Tokens are persisted to .env with an atomic rewrite.
+"""
+
+import datetime
+import os
+import stat
+import tempfile
+import threading
+import time
+from typing import Dict, Any, Callable, Optional
+
+import metrics
+from history_store import MARKET_TIMEZONE
+
+# E*TRADE deactivates a token after two hours without requests
+IDLE_TIMEOUT = 2 * 60 * 60
+# Renew this long before the idle timeout
+RENEW_MARGIN = 15 * 60
+# Seconds between background checks
+CHECK_INTERVAL = 60
+
+TOKEN_RENEWALS = metrics.REGISTRY.counter('etrade_token_renewals_total', 'OAuth access token renewals by reason')
+
+
+class TokenExpiredError(Exception):
+    """
+    Raised when the tokens can no longer be renewed and must be authorized again
+    """
+
+    def __init__(self, message: str = "OAuth tokens have expired; run `python app.py token new` to authorize again"):
+        super().__init__(message)
+
+
+def is_unauthorized(error: BaseException) -> bool:
+    """
+    Check whether an exception came from an HTTP 401 response
+    """
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None) == 401
+
+
+def next_midnight(timestamp: float) -> float:
+    """
+    Get the first midnight US Eastern after a Unix timestamp
+    """
+    day = datetime.datetime.fromtimestamp(timestamp, MARKET_TIMEZONE).date() + datetime.timedelta(days=1)
+    return datetime.datetime.combine(day, datetime.time(0, 0), MARKET_TIMEZONE).timestamp()
+
+
+def update_env_file(path: str, values: Dict[str, Any]):
+    """
+    Set keys in a .env file, replacing exact key matches and appending new keys.
+    The new content is written to a temporary file in the same directory and
+    renamed over the original, so readers never see a partial file.
+
+    Args:
+        path: The .env file (created if missing)
+        values: Keys and values to set
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as env_file:
+            lines = env_file.read().splitlines()
+    except FileNotFoundError:
+        lines = []
+
+    remaining = dict(values)
+    output = []
+    for line in lines:
+        name = line.split('=', 1)[0].strip()
+        if name.startswith('export '):
+            name = name[len('export '):].strip()
+        if '=' in line and not line.lstrip().startswith('#') and name in values:
+            # First occurrence is replaced in place; duplicates are dropped
+            if name in remaining:
+                output.append(f"{name}={remaining.pop(name)}")
+            continue
+        output.append(line)
+    output.extend(f"{name}={value}" for name, value in remaining.items())
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.env.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as env_file:
+            env_file.write('\n'.join(output) + '\n')
+            env_file.flush()
+            os.fsync(env_file.fileno())
+        try:
+            os.chmod(temp_path, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            pass  # a new file keeps mkstemp's owner-only mode
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class TokenManager:
+    """
+    Tracks the age and activity of the client's OAuth tokens and renews them
+    """
+
+    def __init__(self, renew: Callable[[], Any], issued_at: Optional[float] = None,
+                 idle_timeout: float = IDLE_TIMEOUT, renew_margin: float = RENEW_MARGIN,
+                 check_interval: float = CHECK_INTERVAL, clock: Callable[[], float] = time.time):
+        """
+        Initialize the manager
+
+        Args:
+            renew: Sends the renew_access_token request (raises on failure)
+            issued_at: Unix time the tokens were authorized, if known (they expire the following midnight ET)
+            idle_timeout: Seconds without requests before E*TRADE deactivates the tokens
+            renew_margin: Renew this many seconds before the idle timeout
+            check_interval: Seconds between background checks
+            clock: Time source
+        """
+        self._renew = renew
+        self.issued_at = issued_at
+        self.idle_timeout = idle_timeout
+        self.renew_margin = renew_margin
+        self.check_interval = check_interval
+        self.clock = clock
+        self.last_activity = clock()
+        self.generation = 0  # bumped by every successful renewal
+        self.renewals = 0
+        self.expired = False
+        self._lock = threading.Lock()  # held for the whole renewal, so concurrent callers wait on one
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def expires_at(self) -> Optional[float]:
+        return next_midnight(self.issued_at) if self.issued_at else None
+
+    def is_expired(self, now: Optional[float] = None) -> bool:
+        """
+        Check whether the tokens are past their midnight expiry (or were rejected by a renewal)
+        """
+        now = self.clock() if now is None else now
+        expires_at = self.expires_at
+        return self.expired or (expires_at is not None and now >= expires_at)
+
+    def needs_renewal(self, now: Optional[float] = None) -> bool:
+        """
+        Check whether the tokens have been idle long enough to renew them
+        """
+        now = self.clock() if now is None else now
+        return not self.is_expired(now) and now - self.last_activity >= self.idle_timeout - self.renew_margin
+
+    def touch(self):
+        """
+        Record that a request succeeded with the current tokens
+        """
+        self.last_activity = self.clock()
+
+    def reset(self, issued_at: float):
+        """
+        Start tracking newly authorized tokens
+        """
+        with self._lock:
+            self.issued_at = issued_at
+            self.last_activity = issued_at
+            self.expired = False
+            self.generation += 1
+
+    def renew(self, seen_generation: Optional[int] = None, reason: str = 'manual') -> int:
+        """
+        Renew the tokens once for every caller.
+
+        A caller whose request failed passes the generation it started under;
+        if another caller's renewal finished in the meantime it returns at
+        once instead of renewing again.
+
+        Returns:
+            The generation after the renewal
+
+        Raises:
+            TokenExpiredError: If the tokens are past midnight ET or the renewal itself was rejected
+        """
+        with self._lock:
+            if seen_generation is not None and seen_generation != self.generation:
+                return self.generation
+            if self.is_expired():
+                self.expired = True
+                raise TokenExpiredError()
+            try:
+                self._renew()
+            except Exception as e:
+                if is_unauthorized(e):
+                    self.expired = True
+                    raise TokenExpiredError() from e
+                raise
+            self.generation += 1
+            self.renewals += 1
+            self.last_activity = self.clock()
+            TOKEN_RENEWALS.inc(reason=reason)
+            return self.generation
+
+    def call(self, fetch: Callable[[], Any]) -> Any:
+        """
+        Run a request, renewing and retrying it once if it fails with 401
+        """
+        generation = self.generation
+        try:
+            result = fetch()
+        except Exception as e:
+            if not is_unauthorized(e):
+                raise
+            self.renew(generation, reason='unauthorized')
+            result = fetch()
+        self.touch()
+        return result
+
+    def start(self):
+        """
+        Renew idle tokens in a background thread (no-op when already running)
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='token-manager', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            if self.is_expired():
+                print("OAuth tokens expired at midnight ET; run `python app.py token new` to authorize again")
+                return
+            if not self.needs_renewal():
+                continue
+            try:
+                self.renew(self.generation, reason='idle')
+            except TokenExpiredError as e:
+                print(e)
+                return
+            except Exception as e:
+                print(f"Error renewing OAuth tokens: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the token age, idle time and renewal counters
+        """
+        now = self.clock()
+        expires_at = self.expires_at
+        return {
+            'age': now - self.issued_at if self.issued_at else None,
+            'idle': now - self.last_activity,
+            'expires_in': expires_at - now if expires_at else None,
+            'renewals': self.renewals,
+            'expired': self.is_expired(now),
+        }
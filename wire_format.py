@@ -0,0 +1,319 @@
+"""
+This module implements the compact wire formats of the dashboard's data endpoints.
+Clients pick a format and a compression through content negotiation:
+
+    Accept: application/json               verbose JSON (the default)
+    Accept: application/x-msgpack          MessagePack (when the msgpack package is installed)
+    Accept: application/x-etrade-columns   packed little-endian float64 columns (history only)
+    Accept-Encoding: br, gzip              brotli (when the brotli package is installed) or gzip
+
+A client sending ?since=<version> with the snapshot version it holds gets a
+delta over the dotted paths of the snapshot instead of the whole document:
+
+    {"version": 7, "base": 6, "set": {"spot_price": 590.1, "call.bid": 2.05}, "unset": []}
+
+Encoded and compressed bodies are built once per (version, base, format,
+encoding) and cached, so repeated polls of a version cost a dictionary lookup.
+"""
+
+import gzip
+import json
+import struct
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # optional: JSON only
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+JSON = 'application/json'
+MSGPACK = 'application/x-msgpack'
+COLUMNS = 'application/x-etrade-columns'
+IDENTITY = 'identity'
+
+# Snapshot versions kept as delta bases
+KEEP_VERSIONS = 32
+# Encoded bodies kept per cache
+CACHE_ENTRIES = 256
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 256
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Path segment holding the length of a list of objects, so deltas can shrink it
+LENGTH_KEY = '#'
+
+COLUMN_DTYPE = np.dtype('<f8')
+COLUMN_HEADER = struct.Struct('<I')
+
+
+def media_types(columns: bool = False) -> List[str]:
+    """
+    Get the formats an endpoint offers, JSON first
+    """
+    offered = [JSON]
+    if columns:
+        offered.append(COLUMNS)
+    if msgpack is not None:
+        offered.append(MSGPACK)
+    return offered
+
+
+def content_encodings() -> List[str]:
+    """
+    Get the compressions offered, best first
+    """
+    return (['br'] if brotli is not None else []) + ['gzip']
+
+
+def flatten(document: Any, prefix: str = '', flat: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Flatten nested dicts (and lists of dicts) into {dotted path: leaf value}
+    """
+    if flat is None:
+        flat = {}
+    if isinstance(document, dict) and document:
+        for key, value in document.items():
+            flatten(value, f"{prefix}{key}.", flat)
+    elif isinstance(document, list) and document and all(isinstance(item, dict) for item in document):
+        flat[prefix + LENGTH_KEY] = len(document)
+        for index, item in enumerate(document):
+            flatten(item, f"{prefix}{index}.", flat)
+    else:
+        flat[prefix[:-1]] = document
+    return flat
+
+
+def unflatten(flat: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rebuild the nested document from its flattened paths
+    """
+    root = {}
+    for path, value in flat.items():
+        node = root
+        *parents, leaf = path.split('.')
+        for key in parents:
+            node = node.setdefault(key, {})
+        if leaf != LENGTH_KEY:
+            node[leaf] = value
+
+    def lists(node):
+        if not isinstance(node, dict):
+            return node
+        if node and all(key.isdigit() for key in node):
+            return [lists(node[str(index)]) for index in range(len(node))]
+        return {key: lists(value) for key, value in node.items()}
+    return lists(root)
+
+
+def apply_delta(document: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Apply a delta to the document of its base version (what the dashboard does in JavaScript)
+    """
+    flat = flatten(document)
+    for path in delta['unset']:
+        flat.pop(path, None)
+    flat.update(delta['set'])
+    return unflatten(flat)
+
+
+def encode(document: Any, media_type: str) -> bytes:
+    """
+    Serialize a document as compact JSON or MessagePack
+    """
+    if media_type == MSGPACK:
+        return msgpack.packb(document, use_bin_type=True)
+    return json.dumps(document, separators=(',', ':')).encode('utf-8')
+
+
+def compress(body: bytes, encoding: str) -> Tuple[bytes, str]:
+    """
+    Compress a body
+
+    Returns:
+        The body and the encoding actually applied (identity for small bodies)
+    """
+    if encoding == IDENTITY or len(body) < MIN_COMPRESS_BYTES:
+        return body, IDENTITY
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY), encoding
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), 'gzip'
+
+
+def pack_columns(columns: Dict[str, np.ndarray], **header) -> bytes:
+    """
+    Pack float64 columns of equal length into one typed-array body:
+    a uint32 header length, a JSON header padded to 8 bytes ({"rows", "columns", **header}),
+    then each column as little-endian float64 in header order
+    """
+    names = list(columns)
+    rows = len(columns[names[0]]) if names else 0
+    header = json.dumps({**header, 'rows': rows, 'columns': names}, separators=(',', ':')).encode('utf-8')
+    header += b' ' * (-(COLUMN_HEADER.size + len(header)) % COLUMN_DTYPE.itemsize)
+    parts = [COLUMN_HEADER.pack(len(header)), header]
+    parts.extend(np.ascontiguousarray(columns[name], dtype=COLUMN_DTYPE).tobytes() for name in names)
+    return b''.join(parts)
+
+
+def unpack_columns(body: bytes) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """
+    Read a packed columns body back into its header and zero-copy column views
+    """
+    length = COLUMN_HEADER.unpack_from(body)[0]
+    header = json.loads(body[COLUMN_HEADER.size:COLUMN_HEADER.size + length])
+    offset = COLUMN_HEADER.size + length
+    rows = header['rows']
+    columns = {name: np.frombuffer(body, COLUMN_DTYPE, rows, offset + index * rows * COLUMN_DTYPE.itemsize)
+               for index, name in enumerate(header['columns'])}
+    return header, columns
+
+
+def columns_from_json(json_columns: Dict[str, list]) -> Dict[str, np.ndarray]:
+    """
+    Convert JSON history columns (None for missing values) back to float64 arrays
+    """
+    return {name: np.array([np.nan if value is None else value for value in values], dtype=COLUMN_DTYPE)
+            for name, values in json_columns.items()}
+
+
+def encode_history(columns: Dict[str, np.ndarray], start: float, end: float, media_type: str,
+                   to_json: Callable[[Dict[str, np.ndarray]], Dict[str, list]]) -> bytes:
+    """
+    Serialize a history window in the negotiated format
+
+    Args:
+        columns: History columns
+        start, end: The window (Unix seconds)
+        media_type: JSON, MSGPACK or COLUMNS
+        to_json: Converts columns to JSON-ready lists (history_store.history_to_json)
+    """
+    if media_type == COLUMNS:
+        return pack_columns(columns, **{'from': start, 'to': end})
+    if media_type == MSGPACK:
+        return encode({'from': start, 'to': end,
+                       'columns': {name: np.ascontiguousarray(column, dtype=COLUMN_DTYPE).tobytes()
+                                   for name, column in columns.items()}}, MSGPACK)
+    return encode({'from': start, 'to': end, 'columns': to_json(columns)}, JSON)
+
+
+class EncodedBodies:
+    """
+    A bounded LRU of encoded, compressed bodies
+    """
+
+    def __init__(self, max_entries: int = CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build: Callable[[], Tuple[bytes, str]]) -> Tuple[bytes, str]:
+        """
+        Get a cached (body, encoding) or build and cache it
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry
+            self.misses += 1
+        entry = build()
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+
+class PayloadVersions:
+    """
+    The recent versions of a snapshot, served whole or as deltas in any format and encoding
+    """
+
+    def __init__(self, keep: int = KEEP_VERSIONS, max_entries: int = CACHE_ENTRIES):
+        self.keep = keep
+        self.bodies = EncodedBodies(max_entries)
+        self._versions = OrderedDict()  # version -> (document, flattened document, JSON payload)
+        self._lock = threading.Lock()
+
+    def record(self, version: int, document: Optional[Dict[str, Any]] = None, payload=None):
+        """
+        Record a version from its document, its JSON payload, or both (no-op if already recorded)
+        """
+        with self._lock:
+            if version in self._versions:
+                return
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        if document is None:
+            document = json.loads(payload)
+        if payload is None:
+            payload = encode(document, JSON)
+        entry = (document, flatten(document), payload)
+        with self._lock:
+            self._versions[version] = entry
+            while len(self._versions) > self.keep:
+                self._versions.popitem(last=False)
+
+    def __contains__(self, version) -> bool:
+        with self._lock:
+            return version in self._versions
+
+    def delta(self, base: int, version: int) -> Optional[Dict[str, Any]]:
+        """
+        Get the delta from base to version, or None when either was not recorded
+        """
+        with self._lock:
+            old, new = self._versions.get(base), self._versions.get(version)
+        if old is None or new is None:
+            return None
+        old_flat, new_flat = old[1], new[1]
+        changed = {path: value for path, value in new_flat.items()
+                   if path not in old_flat or old_flat[path] != value}
+        removed = [path for path in old_flat if path not in new_flat]
+        return {'version': version, 'base': base, 'set': changed, 'unset': removed}
+
+    def delta_json(self, base: int, version: int) -> Optional[str]:
+        """
+        Get the JSON delta from base to version (cached), or None when it cannot be built
+        """
+        if base not in self or version not in self:
+            return None
+        body, _ = self.bodies.get(('delta', base, version, JSON, IDENTITY),
+                                  lambda: (encode(self.delta(base, version), JSON), IDENTITY))
+        return body.decode('utf-8')
+
+    def body(self, version: int, media_type: str = JSON, encoding: str = IDENTITY,
+             since: Optional[int] = None) -> Optional[Tuple[bytes, str]]:
+        """
+        Get the body of a version: a delta against `since` when that version is known, else the whole document
+
+        Returns:
+            (body, applied encoding), or None when the version was not recorded
+        """
+        with self._lock:
+            entry = self._versions.get(version)
+            base_known = since is not None and since != version and since in self._versions
+        if entry is None:
+            return None
+        base = since if base_known else None
+
+        def build():
+            if base is not None:
+                body = encode(self.delta(base, version), media_type)
+            elif media_type == JSON:
+                body = entry[2]
+            else:
+                body = encode(entry[0], media_type)
+            return compress(body, encoding)
+        return self.bodies.get((version, base, media_type, encoding), build)
@@ -0,0 +1,183 @@
+"""
+This module implements the read-only web UI served by worker processes.
+A producer (StrategyWebUI.serve, or `python app.py ui --workers N`) runs the
+strategy and publishes each serialized snapshot to shared memory; the Flask
+app built here answers every read from those snapshots without locks or
+E*TRADE requests, with ETag/304, deltas and the compact formats of
+wire_format.py. Run it under any WSGI server, e.g.
+
+    python app.py ui --workers 0
+    gunicorn -w 4 'wsgi:create_app()'
+"""
+
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+from flask import Flask, Response, render_template, jsonify, request
+from flask_cors import CORS
+
+from history_store import HistoryStore
+from shared_snapshot import SnapshotReader, channel_path, default_directory
+from strategy_ui import STREAM_KEEPALIVE, conditional_response, history_response, snapshot_event, versioned_response
+from wire_format import EncodedBodies, PayloadVersions, columns_from_json
+
+# Seconds between checks of a channel's sequence by open event streams
+STREAM_POLL_INTERVAL = 0.25
+# Environment variable naming the history directory of the producer
+HISTORY_DIR_ENV = 'ETRADE_HISTORY_DIR'
+
+TEMPLATE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+
+def _watch(reader, sequence):
+    """
+    Yield each snapshot published after a sequence number, or None after STREAM_KEEPALIVE idle seconds
+    """
+    idle_since = time.monotonic()
+    while True:
+        current = reader.sequence()
+        if current is not None and current != sequence and not current & 1:
+            snapshot = reader.read()
+            if snapshot is not None:
+                sequence = snapshot.sequence
+                idle_since = time.monotonic()
+                yield snapshot
+                continue
+        if time.monotonic() - idle_since >= STREAM_KEEPALIVE:
+            idle_since = time.monotonic()
+            yield None
+        time.sleep(STREAM_POLL_INTERVAL)
+
+
+def create_app(snapshot_dir=None, history_dir=None):
+    """
+    Build the read-only Flask app
+
+    Args:
+        snapshot_dir: Directory of the producer's channels (ETRADE_SNAPSHOT_DIR or the default if omitted)
+        history_dir: The producer's history directory for custom ranges (ETRADE_HISTORY_DIR if omitted)
+
+    Returns:
+        The Flask app
+    """
+    snapshot_dir = snapshot_dir or default_directory()
+    history_dir = history_dir or os.environ.get(HISTORY_DIR_ENV)
+    history_store = HistoryStore(history_dir) if history_dir else None
+    readers = {name: SnapshotReader(channel_path(snapshot_dir, name)) for name in ('strategy', 'history', 'orders')}
+    # Decoded once per version in this process; encoded bodies are cached per format and compression
+    strategy_versions = PayloadVersions()
+    history_bodies = EncodedBodies()
+
+    def read_strategy():
+        snapshot = readers['strategy'].read()
+        if snapshot is not None:
+            strategy_versions.record(snapshot.version, payload=snapshot.payload)
+        return snapshot
+
+    app = Flask(__name__, template_folder=TEMPLATE_FOLDER)
+    CORS(app)
+
+    @app.route('/')
+    def index():
+        """Render the main UI page"""
+        return render_template('spy_strategy.html')
+
+    @app.route('/api/strategy-data')
+    def get_strategy_data():
+        """API endpoint to get the latest strategy data"""
+        snapshot = read_strategy()
+        if snapshot is None:
+            return jsonify({"status": "initializing"})
+        return versioned_response(strategy_versions, snapshot.version)
+
+    @app.route('/api/stream')
+    def stream_strategy_data():
+        """Server-Sent Events endpoint pushing each new snapshot to the browser"""
+        last_event_id = request.headers.get('Last-Event-ID', '')
+        known_version = int(last_event_id) if last_event_id.isdigit() else 0
+
+        def events(known_version):
+            for snapshot in _watch(readers['strategy'], None):
+                if snapshot is None:
+                    yield ": keepalive\n\n"
+                elif snapshot.version != known_version:
+                    strategy_versions.record(snapshot.version, payload=snapshot.payload)
+                    yield snapshot_event(strategy_versions, known_version, snapshot.version, snapshot.payload)
+                    known_version = snapshot.version
+                else:
+                    tick = json.dumps({'version': snapshot.version, 'timestamp': snapshot.timestamp})
+                    yield f"event: unchanged\ndata: {tick}\n\n"
+
+        return Response(events(known_version), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    @app.route('/api/history')
+    def get_history():
+        """API endpoint to get recorded snapshots between ?from= and ?to= (Unix seconds)"""
+        if history_store is None:
+            return jsonify({"status": "error", "message": "History is not enabled"}), 404
+        if 'from' not in request.args and 'to' not in request.args:
+            snapshot = readers['history'].read()
+            if snapshot is not None:
+                def window():
+                    document = json.loads(snapshot.payload)
+                    return document['from'], document['to'], columns_from_json(document['columns'])
+                return history_response(window, history_bodies, snapshot.version)
+        now = time.time()
+        start = request.args.get('from', type=float, default=now - 24 * 60 * 60)
+        end = request.args.get('to', type=float, default=now)
+        return history_response(lambda: (start, end, history_store.read(start, end)))
+
+    @app.route('/api/orders')
+    def get_orders():
+        """API endpoint to get the open orders and the recent order events"""
+        snapshot = readers['orders'].read()
+        if snapshot is None:
+            return jsonify({"status": "error", "message": "Order monitoring is not enabled"}), 404
+        return conditional_response(snapshot.payload, snapshot.etag)
+
+    @app.route('/api/orders/stream')
+    def stream_orders():
+        """Server-Sent Events endpoint pushing each fill, cancel and new order after ?after= (a sequence number)"""
+        snapshot = readers['orders'].read()
+        if snapshot is None:
+            return jsonify({"status": "error", "message": "Order monitoring is not enabled"}), 404
+        last_event_id = request.headers.get('Last-Event-ID', '')
+        if last_event_id.isdigit():
+            after = int(last_event_id)
+        else:
+            after = request.args.get('after', type=int, default=json.loads(snapshot.payload)['sequence'])
+
+        def events(after):
+            for snapshot in _watch(readers['orders'], None):
+                if snapshot is None:
+                    yield ": keepalive\n\n"
+                    continue
+                for event in json.loads(snapshot.payload)['events']:
+                    if event['sequence'] > after:
+                        after = event['sequence']
+                        yield f"id: {after}\nevent: order\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+        return Response(events(after), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    return app
+
+
+def run_worker(listener, snapshot_dir, history_dir=None):
+    """
+    Serve create_app() on a socket inherited from the producer (one worker process)
+    """
+    from werkzeug.serving import make_server
+
+    # Exit with the producer, even when it is killed without terminating its workers
+    producer = multiprocessing.parent_process()
+    if producer is not None:
+        threading.Thread(target=lambda: (producer.join(), os._exit(0)), daemon=True).start()
+
+    host, port = listener.getsockname()[:2]
+    server = make_server(host, port, create_app(snapshot_dir, history_dir), threaded=True, fd=listener.fileno())
+    server.serve_forever()